@@ -1,146 +1,274 @@
-import os
-import subprocess
-from yaspin import yaspin
-from InquirerPy import inquirer
-from InquirerPy.separator import Separator
-from utils.downloader import get_gutenberg_metadata_epub
-from utils.ebook_parser import extract_chapters_from_epub
-from utils.audio_converter import process_texts_to_audio, process_introduction_audio, format_name
-from utils.audio_merger import merge_audio_files
-from utils.subtitle_generator import merge_srt_files
-from utils.video_generator import (
-    merge_video_files,
-    generate_intro_video,
-    process_chapters_from_directory,
-)
-
-supported_audios = [
-    Separator(f"-- Female Voices --"),
-    "af_heart",
-    "af_bella",
-    "af_nicole",
-    "af_aoede",
-    Separator(f"-- Male Voices --"),
-    "am_adam",
-    "am_fenrir",
-    "am_michael",
-    "am_puck",
-]
-
-confirm = False
-while not confirm:
-    command = "cls" if os.name == "nt" else "clear"
-    subprocess.run(command, shell=True)
-    ebookLoc = inquirer.select(
-        message="Where is the eBook located:",
-        choices=["Project Gutenberg", "Local Device"],
-    ).execute()
-    link = None
-    loc = None
-    if ebookLoc == "Project Gutenberg":
-        link = inquirer.text(message="Paste Link to eBook Page:").execute()
-    else:
-        loc = inquirer.text(
-            message="Paste location to eBook (.epub file only):"
-        ).execute()
-
-    confirm = inquirer.confirm(message="Confirm?").execute()
-    if not confirm:
-        continue
-    print("Starting Ebook Parsing....")
-    if ebookLoc == "Project Gutenberg":
-        print("Downloading eBook from Project Gutenberg...")
-        metadata = None
-        ebook = None
-        cover_path = None
-        try:
-            metadata, ebook, cover_path = get_gutenberg_metadata_epub(link, "./ebooks/")
-        except:
-            raise ValueError("Downloading failed, please ensure link is accurate.")
-
-        chapters = extract_chapters_from_epub(
-            ebook, output_dir=f"{metadata['Title']}/chapters/"
-        )
-
-        confirm = inquirer.confirm(
-            message="Proceed with Audiobook Conversion?"
-        ).execute()
-        if not confirm:
-            break
-
-        voice_choice = inquirer.select(
-            message="Select a voice for audiobook generation:",
-            choices=supported_audios,
-        ).execute()
-
-        print(voice_choice)
-
-        full_audiobook = inquirer.confirm(
-            message="Do you want Full Audiobook? (Default: Separated audiobook for each chapter) (Y/N)"
-        ).execute()
-
-        print("Starting AudioBook Generation")
-
-        with yaspin(text="🎙️ Generating Introduction...", color="cyan") as spinner:
-            intro_audio_path, intro_srt_path = process_introduction_audio(
-                metadata, output_dir=f"{metadata['Title']}/audio/", voice=voice_choice
-            )
-            spinner.ok("✅")
-
-        with yaspin(text="🎧 Generating Chapter Audio... ", color="cyan") as spinner:
-            chapter_audio_paths, chapter_srt_paths = process_texts_to_audio(
-                input_dir=f"{metadata['Title']}/chapters/",
-                output_dir=f"{metadata['Title']}/audio/",
-                voice=voice_choice,
-            )
-            spinner.ok("✅")
-
-        with yaspin(
-            text="🎧 Generating Introduction Video... ", color="cyan"
-        ) as spinner:
-            generate_intro_video(
-                book_title=metadata["Title"],
-                book_author=format_name(metadata["Author"]),
-                book_image=cover_path,
-                audio_path=intro_audio_path,
-            )
-            spinner.ok("✅")
-
-        with yaspin(text="🎥 Generating Chapter Videos... ", color="cyan") as spinner:
-            process_chapters_from_directory(
-                input_dir=f"{metadata['Title']}/chapters/",
-                audio_dir=f"{metadata['Title']}/audio/",
-                cover_path=cover_path,
-                book_title=metadata["Title"],
-                book_author=format_name(metadata["Author"]),
-                num_images=3
-            )
-            spinner.ok("✅")
-
-        if full_audiobook:
-            with yaspin(text="🔊 Merging Audio Files...", color="cyan") as spinner:
-                merge_audio_files(
-                    intro_path=intro_audio_path,
-                    folder_path=None,
-                    output_file=f"{metadata['Title']}/audiobook.wav",
-                    audio_files=[intro_audio_path] + chapter_audio_paths,
-                )
-                spinner.ok("✅")
-
-            with yaspin(text="📝 Merging Subtitle Files...", color="cyan") as spinner:
-                final_srt_path = f"{metadata['Title']}/audiobook.srt"
-                merge_srt_files(
-                    srt_paths=[intro_srt_path] + chapter_srt_paths,
-                    audio_paths=[intro_audio_path] + chapter_audio_paths,
-                    output_path=final_srt_path,
-                )
-                spinner.ok("✅")
-            with yaspin(text="🎬 Merging Video Files...", color="cyan") as spinner:
-                video_paths = [intro_audio_path.replace(".wav", ".mp4")] + [
-                    path.replace(".wav", ".mp4") for path in chapter_audio_paths
-                ]
-                merged_video_path = f"{metadata['Title']}/audiobook.mp4"
-                merge_video_files(video_paths, output_path=merged_video_path)
-                spinner.ok("✅")
-    if not confirm:
-        continue
+import os
+import subprocess
+from yaspin import yaspin
+from InquirerPy import inquirer
+from InquirerPy.separator import Separator
+from utils.downloader import get_gutenberg_metadata_epub
+from utils.catalog import search_books
+from utils.ebook_parser import extract_chapters_from_epub
+from utils.audio_converter import process_texts_to_audio, process_introduction_audio, format_name
+from utils.audio_merger import merge_audio_files
+from utils.tts_cache import default_cache_dir
+from utils.chapter_index import build_chapter_index
+from utils.youtube_export import export_youtube_chapters
+from utils.progress import follow, serve_status, set_status_path
+from utils.subtitle_generator import merge_srt_files
+from utils.video_generator import (
+    merge_video_files,
+    generate_intro_video,
+    process_chapters_from_directory,
+    placeholder_cover,
+    PREVIEW_PROFILE,
+)
+
+supported_audios = [
+    Separator(f"-- Female Voices --"),
+    "af_heart",
+    "af_bella",
+    "af_nicole",
+    "af_aoede",
+    Separator(f"-- Male Voices --"),
+    "am_adam",
+    "am_fenrir",
+    "am_michael",
+    "am_puck",
+]
+
+TARGET_LUFS = -16.0
+CHUNK_PAUSE = 0.15
+PARAGRAPH_PAUSE = 0.6
+CHAPTER_PAUSE = 1.5
+GUTENBERG_MIRROR = os.getenv("NARRATO_GUTENBERG_MIRROR")
+GUTENBERG_CATALOG = os.getenv("NARRATO_GUTENBERG_CATALOG")
+RENDER_MEMORY_LIMIT_MB = int(os.getenv("NARRATO_RENDER_MEMORY_MB", "0")) or None
+MIN_IMAGES_PER_CHAPTER = 1
+MAX_IMAGES_PER_CHAPTER = 12
+IMAGE_BUDGET = int(os.getenv("NARRATO_IMAGE_BUDGET", "60"))
+BURN_CAPTIONS = os.getenv("NARRATO_BURN_CAPTIONS") == "1"
+
+confirm = False
+while not confirm:
+    command = "cls" if os.name == "nt" else "clear"
+    subprocess.run(command, shell=True)
+    locations = ["Project Gutenberg", "Local Device"]
+    if GUTENBERG_CATALOG:
+        locations.insert(1, "Search Local Catalog")
+    ebookLoc = inquirer.select(
+        message="Where is the eBook located:",
+        choices=locations,
+    ).execute()
+    link = None
+    loc = None
+    if ebookLoc == "Search Local Catalog":
+        results = search_books(
+            GUTENBERG_CATALOG, inquirer.text(message="Search title or author:").execute()
+        )
+        if not results:
+            print("No matching books found in the catalog.")
+            continue
+        book_id = inquirer.select(
+            message="Select a book:",
+            choices=[
+                {"name": f"{book['Title']} — {book['Author']}", "value": book["id"]}
+                for book in results
+            ],
+        ).execute()
+        link = f"https://www.gutenberg.org/ebooks/{book_id}"
+        ebookLoc = "Project Gutenberg"
+    elif ebookLoc == "Project Gutenberg":
+        link = inquirer.text(message="Paste Link to eBook Page:").execute()
+    else:
+        loc = inquirer.text(
+            message="Paste location to eBook (.epub file only):"
+        ).execute()
+
+    confirm = inquirer.confirm(message="Confirm?").execute()
+    if not confirm:
+        continue
+    print("Starting Ebook Parsing....")
+    if ebookLoc == "Project Gutenberg":
+        print("Downloading eBook from Project Gutenberg...")
+        metadata = None
+        ebook = None
+        cover_path = None
+        try:
+            metadata, ebook, cover_path = get_gutenberg_metadata_epub(
+                link,
+                "./ebooks/",
+                mirror_dir=GUTENBERG_MIRROR,
+                catalog_path=GUTENBERG_CATALOG,
+            )
+        except:
+            raise ValueError("Downloading failed, please ensure link is accurate.")
+
+        chapters = extract_chapters_from_epub(
+            ebook, output_dir=f"{metadata['Title']}/chapters/"
+        )
+
+        confirm = inquirer.confirm(
+            message="Proceed with Audiobook Conversion?"
+        ).execute()
+        if not confirm:
+            break
+
+        voice_choice = inquirer.select(
+            message="Select a voice for audiobook generation:",
+            choices=supported_audios,
+        ).execute()
+
+        print(voice_choice)
+
+        dialogue_voices = None
+        if inquirer.confirm(
+            message="Use separate voices for quoted dialogue? (Y/N)"
+        ).execute():
+            dialogue_voices = [
+                v for v in supported_audios if isinstance(v, str) and v != voice_choice
+            ]
+
+        full_audiobook = inquirer.confirm(
+            message="Do you want Full Audiobook? (Default: Separated audiobook for each chapter) (Y/N)"
+        ).execute()
+
+        music_path = inquirer.text(
+            message="Path to background music .wav (leave empty for none):"
+        ).execute().strip() or None
+
+        print("Starting AudioBook Generation")
+        set_status_path(f"{metadata['Title']}/status.json")
+        serve_status()
+
+        with yaspin(text="🎙️ Generating Introduction...", color="cyan") as spinner:
+            intro_audio_path, intro_srt_path = process_introduction_audio(
+                metadata,
+                output_dir=f"{metadata['Title']}/audio/",
+                voice=voice_choice,
+                cache_dir=default_cache_dir(metadata["Title"]),
+            )
+            spinner.ok("✅")
+
+        with yaspin(text="🎧 Generating Chapter Audio... ", color="cyan") as spinner:
+            follow(spinner, "🎧 Generating Chapter Audio...", "tts")
+            chapter_audio_paths, chapter_srt_paths = process_texts_to_audio(
+                input_dir=f"{metadata['Title']}/chapters/",
+                output_dir=f"{metadata['Title']}/audio/",
+                voice=voice_choice,
+                chunk_pause=CHUNK_PAUSE,
+                paragraph_pause=PARAGRAPH_PAUSE,
+                chapter_pause=CHAPTER_PAUSE,
+                target_lufs=TARGET_LUFS,
+                dialogue_voices=dialogue_voices,
+                cache_dir=default_cache_dir(metadata["Title"]),
+            )
+            chapter_index = build_chapter_index(metadata["Title"])
+            spinner.ok("✅")
+
+        # The cover download may have failed.
+        cover_path = cover_path or placeholder_cover(
+            metadata["Title"], f"{metadata['Title']}/cover.png"
+        )
+        render_video = True
+        if inquirer.confirm(
+            message="Render a quick low-resolution preview of the whole book first? (Y/N)"
+        ).execute():
+            with yaspin(text="👀 Rendering Preview... ", color="cyan") as spinner:
+                preview_dir = f"{metadata['Title']}/preview/"
+                intro_preview = generate_intro_video(
+                    book_title=metadata["Title"],
+                    book_author=format_name(metadata["Author"]),
+                    book_image=cover_path,
+                    audio_path=intro_audio_path,
+                    output_path=os.path.join(preview_dir, "introduction.mp4"),
+                    profile=PREVIEW_PROFILE,
+                )
+                chapter_previews = process_chapters_from_directory(
+                    input_dir=f"{metadata['Title']}/chapters/",
+                    audio_dir=f"{metadata['Title']}/audio/",
+                    cover_path=cover_path,
+                    book_title=metadata["Title"],
+                    book_author=format_name(metadata["Author"]),
+                    min_images=MIN_IMAGES_PER_CHAPTER,
+                    max_images=MAX_IMAGES_PER_CHAPTER,
+                    image_budget=IMAGE_BUDGET,
+                    profile=PREVIEW_PROFILE,
+                    video_dir=preview_dir,
+                    captions=BURN_CAPTIONS,
+                )
+                merge_video_files(
+                    [intro_preview] + chapter_previews,
+                    output_path=f"{metadata['Title']}/preview.mp4",
+                    profile=PREVIEW_PROFILE,
+                )
+                spinner.ok("✅")
+            render_video = inquirer.confirm(
+                message=f"Preview saved to {metadata['Title']}/preview.mp4. Continue with the full video render?"
+            ).execute()
+
+        if render_video:
+            with yaspin(
+                text="🎧 Generating Introduction Video... ", color="cyan"
+            ) as spinner:
+                generate_intro_video(
+                    book_title=metadata["Title"],
+                    book_author=format_name(metadata["Author"]),
+                    book_image=cover_path,
+                    audio_path=intro_audio_path,
+                )
+                spinner.ok("✅")
+
+            with yaspin(text="🎥 Generating Chapter Videos... ", color="cyan") as spinner:
+                follow(spinner, "🎥 Generating Chapter Videos...", "frames")
+                process_chapters_from_directory(
+                    input_dir=f"{metadata['Title']}/chapters/",
+                    audio_dir=f"{metadata['Title']}/audio/",
+                    cover_path=cover_path,
+                    book_title=metadata["Title"],
+                    book_author=format_name(metadata["Author"]),
+                    min_images=MIN_IMAGES_PER_CHAPTER,
+                    max_images=MAX_IMAGES_PER_CHAPTER,
+                    image_budget=IMAGE_BUDGET,
+                    memory_limit_mb=RENDER_MEMORY_LIMIT_MB,
+                    captions=BURN_CAPTIONS,
+                )
+                spinner.ok("✅")
+
+        if full_audiobook:
+            with yaspin(text="🔊 Merging Audio Files...", color="cyan") as spinner:
+                merge_audio_files(
+                    output_file=f"{metadata['Title']}/audiobook.wav",
+                    audio_files=[entry.audio for entry in chapter_index],
+                    target_lufs=TARGET_LUFS,
+                    music_path=music_path,
+                )
+                spinner.ok("✅")
+
+            with yaspin(text="📝 Merging Subtitle Files...", color="cyan") as spinner:
+                final_srt_path = f"{metadata['Title']}/audiobook.srt"
+                merge_srt_files(
+                    srt_paths=[entry.srt for entry in chapter_index],
+                    audio_paths=[entry.audio for entry in chapter_index],
+                    output_path=final_srt_path,
+                    vtt_path=f"{metadata['Title']}/audiobook.vtt",
+                    durations=[entry.duration for entry in chapter_index],
+                )
+                spinner.ok("✅")
+            if render_video:
+                with yaspin(text="🎬 Merging Video Files...", color="cyan") as spinner:
+                    merged_video_path = f"{metadata['Title']}/audiobook.mp4"
+                    video_chapters = [
+                        entry for entry in chapter_index if os.path.exists(entry.video)
+                    ]
+                    _, chapters_metadata = export_youtube_chapters(
+                        video_chapters,
+                        metadata["Title"],
+                        metadata["Title"],
+                        format_name(metadata["Author"]),
+                    )
+                    merge_video_files(
+                        [entry.video for entry in video_chapters],
+                        output_path=merged_video_path,
+                        chapters_metadata=chapters_metadata,
+                    )
+                    spinner.ok("✅")
+    if not confirm:
+        continue
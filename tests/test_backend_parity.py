@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("kokoro")
+pytest.importorskip("onnxruntime")
+
+from utils.tts_backends import OnnxBackend, TorchBackend, parity  # noqa: E402
+
+TEXT = "The quick brown fox jumps over the lazy dog. It was the best of times, it was the worst of times."
+VOICE = "af_heart"
+
+
+@pytest.fixture(scope="module")
+def reference():
+    backend = TorchBackend()
+    backend.load_voice(VOICE)
+    return backend.synthesize(TEXT, VOICE)
+
+
+@pytest.mark.parametrize("precision, min_correlation", [("fp32", 0.98), ("fp16", 0.95), ("int8", 0.8)])
+def test_onnx_matches_torch(reference, precision, min_correlation):
+    # Same phonemes, voice and durations model: lengths agree to within 2%
+    # and waveforms stay strongly correlated.
+    backend = OnnxBackend(precision)
+    backend.load_voice(VOICE)
+    audio = backend.synthesize(TEXT, VOICE)
+    length, correlation = parity(reference, audio)
+    assert abs(length) <= 0.02 * len(reference)
+    assert correlation >= min_correlation
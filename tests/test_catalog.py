@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from utils.catalog import build_catalog, lookup_book, search_books
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "pg_catalog.csv")
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    assert build_catalog(FIXTURE, path) == 7
+    return path
+
+
+def test_lookup_by_id(catalog):
+    book = lookup_book(catalog, "1342")
+    assert book["Title"] == "Pride and Prejudice"
+    assert book["Author"] == "Austen, Jane, 1775-1817"
+    assert book["Translator"] == "None"
+    assert book["epub_url"] == "https://www.gutenberg.org/ebooks/1342.epub.noimages"
+    assert book["cover_url"].endswith("/cache/epub/1342/pg1342.cover.medium.jpg")
+    assert lookup_book(catalog, 999999) is None
+
+
+def test_translator_and_author_are_split(catalog):
+    book = lookup_book(catalog, 2600)
+    # First author and first translator win; the role tag is dropped.
+    assert book["Author"] == "Tolstoy, Leo, graf, 1828-1910"
+    assert book["Translator"] == "Maude, Aylmer, 1858-1938"
+    assert lookup_book(catalog, 1399)["Translator"] == "Garnett, Constance, 1861-1946"
+
+
+def test_non_text_entries_are_skipped_and_titles_collapsed(catalog):
+    assert lookup_book(catalog, 4452) is None
+    assert lookup_book(catalog, 64317)["Title"] == "The Great Gatsby"
+
+
+def test_search_ranks_title_matches_first(catalog):
+    # "war" is in one title and no author; "peace" narrows nothing further.
+    assert [b["id"] for b in search_books(catalog, "war and peace")] == [2600]
+    # Both Tolstoy books match on author; the title match ranks above.
+    assert [b["id"] for b in search_books(catalog, "tolstoy anna")] == [1399]
+    # Title hits weigh twice author hits in bm25.
+    assert [b["id"] for b in search_books(catalog, "tolstoy")][0] == 38965
+    assert {b["id"] for b in search_books(catalog, "tolstoy")} == {38965, 2600, 1399}
+    assert [b["id"] for b in search_books(catalog, "tolstoy", limit=1)] == [38965]
+
+
+def test_search_prefix_diacritics_and_fallback(catalog):
+    assert [b["id"] for b in search_books(catalog, "prej")] == [1342]
+    assert [b["id"] for b in search_books(catalog, "miserables")] == [17489]
+    # No book matches every term, so any-term matches are returned.
+    assert {b["id"] for b in search_books(catalog, "gatsby austen")} == {64317, 1342}
+    assert search_books(catalog, "!!") == []
@@ -0,0 +1,133 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from utils import audio_converter
+from utils.audio_converter import (
+    benchmark_dialogue,
+    chunk_plan,
+    convert_chunks_to_audio,
+    open_cache,
+    synthesize_segments,
+)
+from utils.tts_backends import SAMPLE_RATE, TTSBackend
+from utils.tts_cache import words_path
+
+WORD_SECONDS = 0.25
+
+
+class TimedToneBackend(TTSBackend):
+    # A quarter second of tone per word with exact word timings, after a
+    # short lead-in of silence; synthesis costs a fixed time per word and
+    # per change of voice.
+    name = "tone"
+    lead_in = 0.1
+
+    def __init__(self, cost_per_word=0.0, cost_per_switch=0.0):
+        self.calls = []
+        self.switches = 0
+        self.cost_per_word = cost_per_word
+        self.cost_per_switch = cost_per_switch
+
+    def synthesize_words(self, text, voice):
+        if self.calls and self.calls[-1][0] != voice:
+            self.switches += 1
+            time.sleep(self.cost_per_switch)
+        self.calls.append((voice, text))
+        n = len(text.split())
+        time.sleep(self.cost_per_word * n)
+        lead = np.zeros(int(self.lead_in * SAMPLE_RATE), dtype=np.float32)
+        tone = (0.3 * np.sin(np.arange(int(WORD_SECONDS * SAMPLE_RATE) * n) / 4)).astype(np.float32)
+        spans = [(self.lead_in + i * WORD_SECONDS, self.lead_in + (i + 1) * WORD_SECONDS) for i in range(n)]
+        return np.concatenate([lead, tone]), spans
+
+    def synthesize(self, text, voice):
+        return self.synthesize_words(text, voice)[0]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = TimedToneBackend()
+    monkeypatch.setattr(audio_converter, "get_backend", lambda *a: backend)
+    monkeypatch.setattr(audio_converter.tts_daemon, "get_client", lambda: None)
+    return backend
+
+
+CHUNKS = [
+    "“Where are you going?” asked Anna.",
+    "The train was late.",
+    "“Where are you going?” asked Anna.",
+]
+
+
+def test_segments_are_timed_on_one_timeline(backend):
+    audio, words = synthesize_segments([("a", "one two"), ("b", "three")])
+    first = TimedToneBackend.lead_in + 2 * WORD_SECONDS
+    assert len(audio) == int(first * SAMPLE_RATE) + int(TimedToneBackend.lead_in * SAMPLE_RATE) + int(
+        WORD_SECONDS * SAMPLE_RATE
+    )
+    assert words.shape == (3, 2)
+    assert words[2, 0] == pytest.approx(first + TimedToneBackend.lead_in, abs=1e-4)
+
+
+def test_dialogue_chunks_are_cached_deduplicated_and_timed(backend, tmp_path):
+    cache = open_cache(str(tmp_path / "cache"))
+    plan = chunk_plan(CHUNKS, "narrator", ["stranger", "character"])
+    assert plan[0] == [("character", "Where are you going?"), ("narrator", "asked Anna.")]
+
+    out = tmp_path / "out"
+    out.mkdir()
+    results = list(convert_chunks_to_audio(CHUNKS, plan, str(out), cache))
+    # The repeated exchange points at the first rendering.
+    assert [reused for _, _, reused in results] == [False, False, True]
+    assert results[2][0] == results[0][0]
+    assert len(backend.calls) == 3
+    # Only finished chunks and their word timings are written.
+    assert sorted(os.listdir(out)) == ["000000.wav", "000000.words.npy", "000001.wav", "000001.words.npy"]
+
+    words = np.load(words_path(results[0][0]))
+    assert len(words) == 6
+    # Trimming removed most of the lead-in; the quote starts near zero and
+    # the narration after the quote's length plus its own lead-in.
+    quote_end = 4 * WORD_SECONDS
+    assert words[0, 0] < TimedToneBackend.lead_in
+    assert words[4, 0] - words[0, 0] == pytest.approx(quote_end + TimedToneBackend.lead_in, abs=1e-3)
+
+    # A second render is served entirely from the cache, word timings included.
+    backend.calls.clear()
+    again = tmp_path / "again"
+    again.mkdir()
+    list(convert_chunks_to_audio(CHUNKS, plan, str(again), cache))
+    assert backend.calls == []
+    assert np.allclose(np.load(words_path(str(again / "000000.wav"))), words)
+
+
+def exchange(n):
+    return (
+        f"“I will take the {n} o'clock train,” said Levin. He looked at the clock. "
+        f"“Then we shall meet at {n},” replied Kitty, smiling at him."
+    )
+
+
+def test_segments_are_synthesized_grouped_by_voice(backend, tmp_path):
+    chunks = [exchange(n) for n in range(1, 11)]
+    plan = chunk_plan(chunks, "narrator", ["stranger", "levin", "kitty"])
+    voices = {voice for segments in plan for voice, _ in segments}
+    assert len(voices) == 3
+
+    paths = [path for path, _, _ in convert_chunks_to_audio(chunks, plan, str(tmp_path), batch_chunks=32)]
+    assert len(paths) == 10
+    # One switch between each voice, not one at every quote.
+    assert backend.switches == len(voices) - 1
+
+
+def test_dialogue_throughput_is_close_to_single_voice(backend, tmp_path):
+    # Switching voices is made expensive: speaking the segments in reading
+    # order switches at every quote and misses the 10% margin.
+    backend.cost_per_word = 0.004
+    backend.cost_per_switch = 0.02
+    chapter = tmp_path / "chapter.txt"
+    chapter.write_text("\n\n".join(exchange(n) for n in range(1, 25)), encoding="utf-8")
+    assert benchmark_dialogue(str(chapter), "narrator", ["stranger", "character"]) >= 0.9
@@ -0,0 +1,122 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.downloader import download_file
+
+PAYLOAD = bytes(range(256)) * 4000
+
+
+class BookHandler(BaseHTTPRequestHandler):
+    # Serves self.server.body with an ETag, honouring If-None-Match and
+    # If-Range requests the way Gutenberg's servers do.
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        body, etag = server.body, server.etag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (None, etag):
+            start = int(range_header.split("=")[1].rstrip("-"))
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        data = body[start:]
+        if server.cut_after is not None:
+            # Drop the connection part way through the body.
+            self.wfile.write(data[: server.cut_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BookHandler)
+    server.body, server.etag, server.cut_after, server.requests = PAYLOAD, '"v1"', None, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/pg1.epub"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_unchanged_file_is_skipped_with_304(server, tmp_path):
+    path = str(tmp_path / "book.epub")
+    session = requests.Session()
+
+    assert download_file(server.url, path, session) == (path, True)
+    assert open(path, "rb").read() == PAYLOAD
+    assert json.load(open(f"{path}.meta.json"))["etag"] == '"v1"'
+
+    assert download_file(server.url, path, session) == (path, False)
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert open(path, "rb").read() == PAYLOAD
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    path = str(tmp_path / "book.epub")
+    session = requests.Session()
+    download_file(server.url, path, session)
+
+    server.body, server.etag = PAYLOAD[::-1], '"v2"'
+    assert download_file(server.url, path, session) == (path, True)
+    assert open(path, "rb").read() == PAYLOAD[::-1]
+
+
+def test_interrupted_download_keeps_the_old_file_and_resumes(server, tmp_path):
+    path = tmp_path / "book.epub"
+    part = tmp_path / "book.epub.part"
+    session = requests.Session()
+
+    server.cut_after = 300000
+    with pytest.raises(requests.RequestException):
+        download_file(server.url, str(path), session)
+    # Only the .part file holds the partial body; nothing is published.
+    assert not path.exists()
+    received = part.read_bytes()
+    assert 0 < len(received) <= 300000
+    assert received == PAYLOAD[: len(received)]
+
+    server.cut_after = None
+    assert download_file(server.url, str(path), session) == (str(path), True)
+    assert server.requests[-1]["Range"] == f"bytes={len(received)}-"
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert path.read_bytes() == PAYLOAD
+    assert not part.exists()
+
+
+def test_resume_restarts_when_the_file_changed(server, tmp_path):
+    path = tmp_path / "book.epub"
+    session = requests.Session()
+
+    server.cut_after = 300000
+    with pytest.raises(requests.RequestException):
+        download_file(server.url, str(path), session)
+    assert (tmp_path / "book.epub.part").stat().st_size > 0
+
+    # If-Range no longer matches, so the server sends the whole new file
+    # and the stale partial bytes are discarded rather than appended to.
+    server.cut_after, server.body, server.etag = None, PAYLOAD[::-1], '"v2"'
+    assert download_file(server.url, str(path), session) == (str(path), True)
+    assert path.read_bytes() == PAYLOAD[::-1]
+    assert not (tmp_path / "book.epub.part").exists()
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils import image_assets
+from utils.image_assets import ByteLRU, clear_image_cache, load_image
+
+
+def test_rewrite_with_same_mtime_is_not_served_stale(tmp_path):
+    clear_image_cache()
+    path = str(tmp_path / "scene.png")
+    Image.new("RGB", (32, 16), "red").save(path)
+    stat = os.stat(path)
+    assert tuple(load_image(path, (16, 8))[0, 0]) == (255, 0, 0)
+
+    Image.new("RGB", (32, 16), "blue").save(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert tuple(load_image(path, (16, 8))[0, 0]) == (0, 0, 255)
+
+
+def test_scaled_images_are_bounded_by_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_assets, "_scaled_cache", ByteLRU(3 * 100 * 100 * 3))
+    for n in range(6):
+        path = str(tmp_path / f"{n}.png")
+        Image.new("RGB", (50, 50), (n, 0, 0)).save(path)
+        assert load_image(path, (100, 100)).shape == (100, 100, 3)
+    assert len(image_assets._scaled_cache) == 3
+    assert image_assets._scaled_cache.nbytes <= 3 * 100 * 100 * 3
+
+
+def test_byte_lru_evicts_least_recently_used():
+    cache = ByteLRU(10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 4)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.put("huge", np.zeros(1), 11) is not None and cache.get("huge") is None
+    assert cache.nbytes == 8
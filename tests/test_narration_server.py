@@ -0,0 +1,121 @@
+import http.client
+import threading
+
+import numpy as np
+import pytest
+
+from utils import audio_converter, narration_server
+from utils.narration_server import NarrationServer
+from utils.tts_backends import SAMPLE_RATE, TTSBackend
+
+
+class ToneBackend(TTSBackend):
+    # A quarter second of tone per word, so output length follows the text.
+    name = "tone"
+
+    def __init__(self):
+        self.calls = []
+
+    def synthesize(self, text, voice):
+        if voice == "broken":
+            raise RuntimeError("synthesis failed")
+        self.calls.append(text)
+        samples = int(0.25 * SAMPLE_RATE) * len(text.split())
+        return (0.3 * np.sin(np.arange(samples) / 4)).astype(np.float32)
+
+    def load_voice(self, voice):
+        if voice == "missing":
+            raise FileNotFoundError(voice)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    backend = ToneBackend()
+    monkeypatch.setattr(audio_converter, "get_backend", lambda *a: backend)
+    monkeypatch.setattr(narration_server, "get_backend", lambda *a: backend)
+    chapters = tmp_path / "library" / "Book" / "chapters"
+    chapters.mkdir(parents=True)
+    (chapters / "01_Chapter_1.txt").write_text(
+        "Chapter 1\n\n......\n\nFirst sentence here. Second sentence follows. Third one ends it.\n\n"
+        "A new paragraph starts.\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "library" / "secret").mkdir()
+    server = NarrationServer(("127.0.0.1", 0), str(tmp_path / "library"), "af_heart")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.backend = backend
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    try:
+        return response.status, response.read()
+    except http.client.IncompleteRead:
+        return response.status, None
+
+
+def test_stream_caches_every_chunk_once(server):
+    # Chunk 0 is the chapter heading; start at the first paragraph.
+    status, body = get(server, "/stream?book=Book&chapter=01_Chapter_1&start=1")
+    assert status == 200
+    assert body[:4] == b"RIFF"
+    cache = server.cache_for("Book")
+    assert cache.misses == 2 and cache.hits == 0
+
+    # The first chunk went out sentence by sentence, then was synthesized
+    # whole for the cache once the rest had been sent.
+    first = [text for text in server.backend.calls if "First sentence" in text]
+    assert first == [
+        "First sentence here.",
+        "First sentence here. Second sentence follows. Third one ends it.",
+    ]
+    assert server.backend.calls[-1] == first[-1]
+    calls = len(server.backend.calls)
+    status, again = get(server, "/stream?book=Book&chapter=01_Chapter_1&start=1")
+    assert status == 200
+    assert len(server.backend.calls) == calls
+    assert cache.hits == 2 and cache.misses == 2
+
+
+def test_sentences_of_the_first_chunk_are_separated_by_a_pause(server):
+    stream = list(
+        narration_server.narrate(
+            narration_server.chapter_path(server.library_dir, "Book", "01_Chapter_1"),
+            "af_heart",
+            None,
+            start=1,
+        )
+    )
+    pause = int(narration_server.CHUNK_PAUSE * SAMPLE_RATE)
+    silent = [len(block) for block in stream if len(block) and not np.any(block)]
+    assert silent[:2] == [pause, pause]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/stream?book=..&chapter=01_Chapter_1",
+        "/stream?book=../library/Book/chapters&chapter=01_Chapter_1",
+        "/stream?book=secret&chapter=01_Chapter_1",
+        "/stream?book=Book&chapter=../../secret",
+        "/stream?book=Book&chapter=02_Missing",
+        "/stream?book=Book",
+        "/chapters?book=..",
+        "/stream?book=Book&chapter=01_Chapter_1&voice=missing",
+    ],
+)
+def test_bad_requests_are_refused_before_streaming(server, path):
+    status, body = get(server, path)
+    assert status == 404
+    assert b"error" in body
+
+
+def test_failure_after_headers_truncates_the_stream(server):
+    status, body = get(server, "/stream?book=Book&chapter=01_Chapter_1&voice=broken")
+    assert status == 200
+    assert body is None
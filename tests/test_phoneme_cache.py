@@ -0,0 +1,16 @@
+import sqlite3
+
+from utils import sqlite_journal
+from utils.phoneme_cache import PhonemeCache
+
+
+def test_store_on_network_mount_uses_rollback_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_journal, "filesystem_type", lambda path: "nfs4")
+    db_path = str(tmp_path / "phonemes.db")
+    PhonemeCache(None, db_path=db_path)
+    assert sqlite3.connect(db_path).execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+    monkeypatch.setattr(sqlite_journal, "filesystem_type", lambda path: "ext4")
+    db_path = str(tmp_path / "local.db")
+    PhonemeCache(None, db_path=db_path)
+    assert sqlite3.connect(db_path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
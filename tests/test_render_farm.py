@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import threading
+import time
+import multiprocessing
+
+from PIL import Image
+
+from utils import render_farm, sqlite_journal, video_generator
+from utils.render_farm import WorkQueue
+
+
+def fill(db_path, count, kind="tts"):
+    queue = WorkQueue(db_path)
+    for n in range(count):
+        queue.enqueue("/books/Example", kind, {"n": n}, chapter=f"{n:03d}")
+    return queue
+
+
+def drain(db_path, worker, results):
+    queue = WorkQueue(db_path)
+    claimed = []
+    while True:
+        task = queue.claim(worker)
+        if task is None:
+            break
+        claimed.append(task["id"])
+        assert queue.complete(task["id"], worker)
+    results.put(claimed)
+
+
+def test_concurrent_workers_claim_each_task_once(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    fill(db_path, 60)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=drain, args=(db_path, f"worker-{n}", results))
+        for n in range(4)
+    ]
+    for process in workers:
+        process.start()
+    claimed = [task_id for _ in workers for task_id in results.get(timeout=60)]
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert sorted(claimed) == list(range(1, 61))
+    done = WorkQueue(db_path).conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE status = 'done' AND attempts = 1"
+    ).fetchone()[0]
+    assert done == 60
+
+
+def expire(queue, task_id):
+    queue.conn.execute("UPDATE tasks SET lease_until = ? WHERE id = ?", (time.time() - 1, task_id))
+
+
+def test_expired_lease_moves_to_another_worker(tmp_path):
+    queue = fill(str(tmp_path / "queue.db"), 1)
+    first = queue.claim("a")
+    assert queue.claim("b") is None
+
+    expire(queue, first["id"])
+    second = queue.claim("b")
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+    # The old owner can neither renew nor finish the task any more.
+    assert not queue.heartbeat(first["id"], "a")
+    assert not queue.complete(first["id"], "a")
+    assert queue.complete(second["id"], "b")
+
+
+def test_lease_expiring_too_often_fails_the_task(tmp_path):
+    queue = fill(str(tmp_path / "queue.db"), 1)
+    for n in range(render_farm.MAX_ATTEMPTS):
+        task = queue.claim(f"worker-{n}")
+        expire(queue, task["id"])
+    assert queue.claim("last") is None
+    status, error = queue.conn.execute("SELECT status, error FROM tasks").fetchone()
+    assert status == "failed"
+    assert "expired" in error
+
+
+def test_heartbeat_extends_the_lease(tmp_path):
+    queue = fill(str(tmp_path / "queue.db"), 1)
+    task = queue.claim("a")
+    queue.conn.execute("UPDATE tasks SET lease_until = ? WHERE id = ?", (time.time() + 1, task["id"]))
+
+    assert queue.heartbeat(task["id"], "a")
+    lease_until = queue.conn.execute("SELECT lease_until FROM tasks").fetchone()[0]
+    assert lease_until > time.time() + render_farm.LEASE_SECONDS - 5
+    assert not queue.heartbeat(task["id"], "b")
+
+
+def test_worker_keeps_lease_while_task_runs(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "queue.db")
+    queue = fill(db_path, 1, kind="slow")
+    monkeypatch.setattr(render_farm, "HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(render_farm, "LEASE_SECONDS", 0.3)
+    stolen = []
+
+    def slow(book_dir, config, task, payload):
+        # Runs well past the lease; heartbeats must stop another worker
+        # from taking it over.
+        deadline = time.time() + 1.0
+        while time.time() < deadline:
+            stolen.append(WorkQueue(db_path).claim("thief"))
+            time.sleep(0.1)
+
+    monkeypatch.setitem(render_farm.HANDLERS, "slow", slow)
+    worker = threading.Thread(
+        target=render_farm.run_worker,
+        args=(db_path, "owner"),
+        kwargs={"poll": 0.05, "idle_exit": 0.2},
+    )
+    worker.start()
+    worker.join(timeout=10)
+
+    assert stolen and not any(stolen)
+    status, attempts = queue.conn.execute("SELECT status, attempts FROM tasks").fetchone()
+    assert (status, attempts) == ("done", 1)
+
+
+def test_failed_task_is_retried_then_failed(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "queue.db")
+    queue = fill(db_path, 1, kind="broken")
+
+    def broken(book_dir, config, task, payload):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(render_farm.HANDLERS, "broken", broken)
+    render_farm.run_worker(db_path, "w", poll=0.01, idle_exit=0.05)
+    status, attempts, error = queue.conn.execute("SELECT status, attempts, error FROM tasks").fetchone()
+    assert (status, attempts) == ("failed", render_farm.MAX_ATTEMPTS)
+    assert "boom" in error
+
+
+def test_network_mount_uses_rollback_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_journal, "filesystem_type", lambda path: "nfs4")
+    mode = WorkQueue(str(tmp_path / "nfs.db")).conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "delete"
+
+    monkeypatch.setattr(sqlite_journal, "filesystem_type", lambda path: "ext4")
+    mode = WorkQueue(str(tmp_path / "local.db")).conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_journal_mode_can_be_forced(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_journal, "filesystem_type", lambda path: "ext4")
+    monkeypatch.setenv(sqlite_journal.JOURNAL_ENV, "delete")
+    assert sqlite_journal.journal_mode(str(tmp_path / "queue.db")) == "DELETE"
+
+
+def test_rollback_journal_queue_serves_concurrent_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv(sqlite_journal.JOURNAL_ENV, "DELETE")
+    db_path = str(tmp_path / "queue.db")
+    fill(db_path, 30)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=drain, args=(db_path, f"worker-{n}", results))
+        for n in range(3)
+    ]
+    for process in workers:
+        process.start()
+    claimed = [task_id for _ in workers for task_id in results.get(timeout=60)]
+    for process in workers:
+        process.join(timeout=60)
+    assert sorted(claimed) == list(range(1, 31))
+    assert sqlite3.connect(db_path).execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+
+def test_concurrent_video_tasks_keep_their_own_images(tmp_path, monkeypatch):
+    book_dir = tmp_path / "Book"
+    (book_dir / "chapters").mkdir(parents=True)
+    (book_dir / "audio").mkdir()
+    for name in ("001_One", "002_Two"):
+        (book_dir / "chapters" / f"{name}.txt").write_text(
+            f"{name}\n\n......\n\nText of {name}.\n", encoding="utf-8"
+        )
+    config = {"metadata": {"Title": "Book", "Author": "Doe, Jane"}, "cover_path": "cover.jpg"}
+    both_generated = threading.Barrier(2, timeout=5)
+    seen = {}
+
+    def generate_images(chapter_text, num_images, output_dir):
+        path = f"{output_dir}/image_1.png"
+        with open(path, "w") as f:
+            f.write(chapter_text)
+        both_generated.wait()
+        return [path]
+
+    def render(image_paths, image_durations, audio_path, start, end, video_path, **overlay):
+        with open(image_paths[0]) as f:
+            seen[overlay["chapter_title"]] = f.read()
+        return video_path
+
+    monkeypatch.setattr(video_generator, "get_audio_duration", lambda path: 10.0)
+    monkeypatch.setattr(video_generator, "generate_images_from_chapter", generate_images)
+    monkeypatch.setattr(video_generator, "render_video_window", render)
+    monkeypatch.setattr(video_generator, "make_thumbnail", lambda *args: None)
+    errors = []
+
+    def run(chapter):
+        try:
+            render_farm.run_video(str(book_dir), config, {"chapter": chapter}, {"num_images": 1})
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=run, args=(name,)) for name in ("001_One", "002_Two")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert not errors
+    assert sorted(seen.values()) == ["Text of 001_One.\n", "Text of 002_Two.\n"]
+    assert os.listdir(book_dir / "audio") == []
+
+
+def test_video_stage_plans_images_for_dotted_chapter_titles(tmp_path, monkeypatch):
+    book_dir = tmp_path / "Book"
+    (book_dir / "chapters").mkdir(parents=True)
+    (book_dir / "audio").mkdir()
+    for name in ("002_Loomings", "003_Chapter_1._The_Carpet-Bag"):
+        (book_dir / "chapters" / f"{name}.txt").write_text("", encoding="utf-8")
+        (book_dir / "audio" / f"{name}.wav").write_bytes(b"")
+    monkeypatch.setattr(video_generator, "get_audio_duration", lambda path: 1200.0)
+
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    render_farm.submit_book(queue, str(book_dir), {"Title": "Book"}, "af_heart", render_video=True)
+    queue.conn.execute("UPDATE tasks SET status = 'done'")
+    render_farm.advance_books(queue)
+
+    counts = dict(queue.conn.execute(
+        "SELECT chapter, json_extract(payload, '$.num_images') FROM tasks WHERE kind = 'video'"
+    ).fetchall())
+    assert counts["003_Chapter_1._The_Carpet-Bag"] == counts["002_Loomings"] > 1
+
+
+def test_book_without_cover_gets_a_title_card(tmp_path):
+    config = {"metadata": {"Title": "Moby Dick"}, "cover_path": None}
+    cover = render_farm.book_cover(str(tmp_path), config)
+    assert cover == str(tmp_path / "cover.png")
+    with Image.open(cover) as image:
+        assert image.size == video_generator.COVER_SIZE
+    assert render_farm.book_cover(str(tmp_path), dict(config, cover_path="given.jpg")) == "given.jpg"
@@ -0,0 +1,32 @@
+from utils.sentence_streamer import stream_sentences
+
+CHAPTER = (
+    "Chapter 1\n\n......\n\n"
+    "It was late. The train\nhad not come.\nAnna waited on the platform.\n"
+    "Snow fell. Nobody spoke.\n\n"
+    "Then a whistle sounded.\n"
+)
+
+
+def chunks(tmp_path, text):
+    path = tmp_path / "chapter.txt"
+    path.write_text(text, encoding="utf-8")
+    return list(stream_sentences(str(path), paragraphs=True))
+
+
+def test_paragraphs_end_at_blank_lines(tmp_path):
+    result = chunks(tmp_path, CHAPTER)
+    assert result[0] == ("Chapter 1 ......", True)
+    # Lines ending a sentence inside a paragraph do not end it.
+    assert [end for _, end in result] == [True] + [False] * (len(result) - 3) + [True, True]
+    assert result[-1] == ("Then a whistle sounded.", True)
+
+
+def test_chunks_do_not_depend_on_line_wrapping(tmp_path):
+    unwrapped = "\n\n".join(p.replace("\n", " ") for p in CHAPTER.split("\n\n"))
+    assert chunks(tmp_path, unwrapped) == chunks(tmp_path, CHAPTER)
+
+
+def test_tags_spanning_lines_are_not_narrated(tmp_path):
+    text = "Title\n\n......\n\nIt was late. [Illustration: The train\nat night.] Nobody spoke.\n"
+    assert chunks(tmp_path, text)[-1] == ("It was late. Nobody spoke.", True)
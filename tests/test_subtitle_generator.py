@@ -0,0 +1,47 @@
+import numpy as np
+import soundfile as sf
+
+from utils import subtitle_generator
+from utils.subtitle_generator import iter_srt_cues, merge_srt_files
+from utils.timing_store import Timings, timings_path
+
+RATE = 24000
+
+
+def write_chapter(audio_dir, name, seconds, srt_text):
+    audio_path = str(audio_dir / f"{name}.wav")
+    sf.write(audio_path, np.zeros(int(seconds * RATE), dtype=np.float32), RATE)
+    srt_path = str(audio_dir / f"{name}.srt")
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write(srt_text)
+    return srt_path, audio_path
+
+
+def test_merge_uses_timing_stores_and_falls_back_to_srt(tmp_path, monkeypatch):
+    # The first chapter's SRT is stale on purpose: its timing store wins.
+    one = write_chapter(tmp_path, "001_One", 4.0, "1\n00:00:00,000 --> 00:00:01,000\nStale text.\n\n")
+    Timings.build(["First chunk.", "Second chunk."], [RATE, RATE], [0.5, 1.5], RATE, "001_One").save(
+        timings_path(str(tmp_path), "001_One")
+    )
+    two = write_chapter(tmp_path, "002_Two", 3.0, "1\n00:00:00,250 --> 00:00:02,000\nFrom the SRT.\n\n")
+
+    parsed = []
+
+    def recording_parser(path):
+        parsed.append(path)
+        return iter_srt_cues(path)
+
+    monkeypatch.setattr(subtitle_generator, "iter_srt_cues", recording_parser)
+    output = str(tmp_path / "book.srt")
+    merge_srt_files([one[0], two[0]], [one[1], two[1]], output, vtt_path=str(tmp_path / "book.vtt"))
+
+    # Chapters with a timing store are not re-parsed.
+    assert parsed == [two[0]]
+    assert open(output, encoding="utf-8").read() == (
+        "1\n00:00:00,000 --> 00:00:01,000\nFirst chunk.\n\n"
+        "2\n00:00:01,500 --> 00:00:02,500\nSecond chunk.\n\n"
+        "3\n00:00:04,250 --> 00:00:06,000\nFrom the SRT.\n\n"
+    )
+    assert open(tmp_path / "book.vtt", encoding="utf-8").read().startswith(
+        "WEBVTT\n\n1\n00:00:00.000 --> 00:00:01.000\nFirst chunk."
+    )
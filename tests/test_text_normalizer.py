@@ -0,0 +1,35 @@
+import pytest
+
+from utils.text_normalizer import normalize_text
+
+
+@pytest.mark.parametrize(
+    "line, spoken",
+    [
+        ("From 1812-15 he served.", "From 1812 to 1815 he served."),
+        ("In 1990–2000 it grew.", "In 1990 to 2000 it grew."),
+        # Chains are not ranges and are left whole.
+        ("Census years 1990-2000-2010 differ.", "Census years 1990-2000-2010 differ."),
+        ("CHAPTER IV. The Storm", "CHAPTER 4. The Storm"),
+        ("Chapter XII The End", "Chapter 12 The End"),
+        ("Chapter I", "Chapter 1"),
+        ("See Book I, where it begins.", "See Book 1, where it begins."),
+        # "I" is the pronoun unless it closes a heading or reference.
+        ("The Letter I Wrote", "The Letter I Wrote"),
+        ("Book I read twice.", "Book I read twice."),
+        ("the letter I, which", "the letter I, which"),
+        # A number alone on a line is text, e.g. a title.
+        ("1984", "1984"),
+        ("[Pg 23]", ""),
+        ("Mr. Darcy arrived. [Illustration: A ball]", "Mister Darcy arrived."),
+        # Tags may run over several lines; one left open ends with its line.
+        (
+            "She laughed. [Illustration: \"Is it you,\" said\n  Mr. Bennet.]\nThen she left.",
+            "She laughed.\nThen she left.",
+        ),
+        ("[Footnote 1: See\n\nthe appendix.]\n\nIt rained.", "\n\nIt rained."),
+        ("[Illustration: never closed\nIt rained.", "\nIt rained."),
+    ],
+)
+def test_normalize_text(line, spoken):
+    assert normalize_text(line) == spoken
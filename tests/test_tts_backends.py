@@ -0,0 +1,78 @@
+import numpy as np
+
+from utils.tts_backends import SAMPLE_RATE, SAMPLES_PER_FRAME, TorchBackend, phoneme_word_spans
+
+FRAME = SAMPLES_PER_FRAME / SAMPLE_RATE
+
+
+class FakeDurations:
+    # Stands in for the pred_dur tensor: only .cpu().numpy() is used.
+    def __init__(self, values):
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class FakeResult:
+    def __init__(self, audio, pred_dur):
+        self.audio = audio
+        self.pred_dur = pred_dur
+
+
+class FakePipeline:
+    def __init__(self, results, vocab):
+        self.results = results
+        self.model = type("Model", (), {"vocab": vocab})()
+
+    def generate_from_tokens(self, ps, voice):
+        yield self.results[ps]
+
+
+class FakePhonemizer:
+    def __init__(self, batches):
+        self._batches = batches
+
+    def batches(self, text):
+        return self._batches
+
+
+VOCAB = {p: i for i, p in enumerate("abcd .")}
+
+
+def test_durations_map_to_word_spans():
+    # Boundary token, a b ' ' c d '.', boundary token.
+    durations = [1, 2, 3, 1, 4, 5, 2, 1]
+    spans = phoneme_word_spans("ab cd.", durations, VOCAB)
+    assert np.allclose(spans, [(1 * FRAME, 6 * FRAME), (7 * FRAME, 16 * FRAME)])
+
+
+def test_phonemes_missing_from_the_vocab_are_skipped():
+    # "x" never reaches the model, so it has no duration of its own.
+    durations = [1, 2, 3, 1, 4, 5, 2, 1]
+    assert phoneme_word_spans("axb cd.", durations, VOCAB) == phoneme_word_spans("ab cd.", durations, VOCAB)
+
+
+def test_torch_backend_times_words_across_batches():
+    first = np.zeros(int(19 * SAMPLES_PER_FRAME), dtype=np.float32)
+    second = np.zeros(int(10 * SAMPLES_PER_FRAME), dtype=np.float32)
+    backend = TorchBackend()
+    backend._pipeline = FakePipeline(
+        {
+            "ab cd.": FakeResult(first, FakeDurations([1, 2, 3, 1, 4, 5, 2, 1])),
+            "dc": FakeResult(second, FakeDurations([[2, 3, 4, 1]])),
+        },
+        VOCAB,
+    )
+    backend.phonemes = FakePhonemizer(["ab cd.", "dc"])
+
+    audio, words = backend.synthesize_words("Ab cd. Dc", "af_heart")
+    assert len(audio) == len(first) + len(second)
+    # The second batch is placed after the first batch's audio.
+    offset = len(first) / SAMPLE_RATE
+    assert np.allclose(
+        words, [(1 * FRAME, 6 * FRAME), (7 * FRAME, 16 * FRAME), (offset + 2 * FRAME, offset + 9 * FRAME)]
+    )
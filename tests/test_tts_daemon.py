@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+import pytest
+
+from utils import audio_converter, tts_backends, tts_daemon
+from utils.tts_backends import SAMPLE_RATE, TTSBackend
+
+
+class FakeBackend(TTSBackend):
+    def __init__(self, name, cache_tag):
+        self.name = name
+        self.cache_tag = cache_tag
+
+    def synthesize(self, text, voice):
+        return np.full(SAMPLE_RATE // 10, 0.1 if self.cache_tag else 0.2, dtype=np.float32)
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    remote = FakeBackend("onnx", "onnx-int8")
+    monkeypatch.setattr(tts_backends, "get_backend", lambda *a: remote)
+    server = tts_daemon.SynthesisServer(("127.0.0.1", 0), ["af_heart"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = tts_daemon.DaemonClient(*server.server_address)
+    yield server, client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_daemon_reports_its_backend_tag(daemon):
+    _, client = daemon
+    assert client.cache_tag == "onnx-int8"
+    assert len(client.synthesize("Hello.", "af_heart")) == SAMPLE_RATE // 10
+
+
+def test_daemon_audio_is_cached_under_the_daemons_tag(daemon, monkeypatch, tmp_path):
+    _, client = daemon
+    local = FakeBackend("torch", None)
+    monkeypatch.setattr(audio_converter, "get_backend", lambda *a: local)
+
+    monkeypatch.setattr(audio_converter.tts_daemon, "get_client", lambda: client)
+    assert audio_converter.synthesis_tag() == "onnx-int8"
+    remote_cache = audio_converter.open_cache(str(tmp_path))
+    audio_converter.synthesize("Hello.", "af_heart", remote_cache)
+
+    monkeypatch.setattr(audio_converter.tts_daemon, "get_client", lambda: None)
+    assert audio_converter.synthesis_tag() is None
+    local_cache = audio_converter.open_cache(str(tmp_path))
+    # Same directory, but the daemon's int8 audio is not served to local torch.
+    assert local_cache.get("Hello.", "af_heart") is None
+    assert remote_cache.get("Hello.", "af_heart") is not None
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from utils import video_generator
+from utils.timing_store import timings_path
+
+
+@pytest.fixture
+def chapter(tmp_path, monkeypatch):
+    txt_path = tmp_path / "chapters" / "01_Chapter_1.txt"
+    txt_path.parent.mkdir()
+    txt_path.write_text("Chapter 1\n\n......\n\nIt was late.\n", encoding="utf-8")
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    open(timings_path(str(audio_dir), "01_Chapter_1"), "wb").close()
+
+    def write_captions(timings, path, width, height):
+        open(path, "w").close()
+        return path
+
+    monkeypatch.setattr(video_generator, "chapter_captions", write_captions)
+    return str(txt_path), str(audio_dir), str(tmp_path / "video")
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_captions_file_is_removed_after_the_encode(chapter, monkeypatch, fails):
+    seen = []
+
+    def fake_generate_video(captions_path=None, **kwargs):
+        seen.append(os.path.exists(captions_path))
+        if fails:
+            raise RuntimeError("encode failed")
+        return "chapter.mp4"
+
+    monkeypatch.setattr(video_generator, "generate_video", fake_generate_video)
+    txt_path, audio_dir, video_dir = chapter
+    render = lambda: video_generator.render_chapter_video(
+        txt_path, audio_dir, video_dir, "cover.jpg", "Book", "Author", 1, plan_scenes=False, captions=True
+    )
+    if fails:
+        with pytest.raises(RuntimeError):
+            render()
+    else:
+        assert render() == "chapter.mp4"
+    assert seen == [True]
+    assert not [f for f in os.listdir(video_dir) if f.endswith(".ass")]
@@ -1,84 +1,143 @@
-import os
-import io
-import json
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-from PIL import Image
-
-load_dotenv(".env")
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
-TEXT_MODEL = "gemini-2.0-flash"
-IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
-
-
-def generate_image_prompts(chapter_text: str, num_prompts: int = 5) -> list[str]:
-    prompt = (
-        f"Read the following chapter and generate {num_prompts} distinct and creative prompts for 16:9 image generation that tell the story. "
-        f"Make each prompt vivid, specific, and visually descriptive. Each prompt should mention size and command to generate an image. Do not number them or add any extra text. Adhere return type to json format, return an array containing {num_prompts} prompts"
-        f"The image must be in 16:9 format.\n\nChapter:\n{chapter_text}"
-    )
-    response = client.models.generate_content(
-        model=TEXT_MODEL,
-        contents=prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": {
-                "type": "array",
-                "items": {"type": "string"},
-            },
-        },
-    )
-    raw_text = response.text.strip()
-    try:
-        prompts_list = json.loads(raw_text)
-        return prompts_list
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return []
-
-
-def generate_image(prompt: str) -> bytes | None:
-    try:
-        response = client.models.generate_content(
-            model=IMAGE_MODEL,
-            contents=[prompt],
-            config=types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"]),
-        )
-        for part in response.candidates[0].content.parts:
-            if part.inline_data:
-                return part.inline_data.data
-    except Exception as e:
-        print(f"Error generating image for prompt '{prompt}': {e}")
-    return None
-
-
-def save_image(image_data: bytes, filename: str, output_dir: str) -> str | None:
-    try:
-        os.makedirs(output_dir, exist_ok=True)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        image = image.resize((1920, 1080), Image.Resampling.LANCZOS)
-        path = os.path.join(output_dir, f"{filename}.png")
-        image.save(path)
-        return path
-    except Exception as e:
-        print(f"Error saving image '{filename}': {e}")
-    return None
-
-
-def generate_images_from_chapter(
-    chapter_text: str, num_images: int, output_dir: str
-) -> list[str]:
-    prompts = generate_image_prompts(chapter_text, num_images)
-    image_paths = []
-    for idx, prompt in enumerate(prompts, start=1):
-        print(f"\nGenerating image {idx} for prompt:\n{prompt}")
-        image_data = generate_image(prompt)
-        if image_data:
-            path = save_image(image_data, f"image_{idx}", output_dir)
-            if path:
-                image_paths.append(path)
-        else:
-            print(f"Failed to generate image {idx}.")
-    return image_paths
+import os
+import io
+import json
+from functools import lru_cache
+from dotenv import load_dotenv
+from PIL import Image
+from utils.progress import get_tracker
+
+load_dotenv(".env")
+
+TEXT_MODEL = "gemini-2.0-flash"
+IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    from google import genai
+
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def generate_image_prompts(chapter_text: str, num_prompts: int = 5) -> list[str]:
+    prompt = (
+        f"Read the following chapter and generate {num_prompts} distinct and creative prompts for 16:9 image generation that tell the story. "
+        f"Make each prompt vivid, specific, and visually descriptive. Each prompt should mention size and command to generate an image. Do not number them or add any extra text. Adhere return type to json format, return an array containing {num_prompts} prompts"
+        f"The image must be in 16:9 format.\n\nChapter:\n{chapter_text}"
+    )
+    response = get_client().models.generate_content(
+        model=TEXT_MODEL,
+        contents=prompt,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": {
+                "type": "array",
+                "items": {"type": "string"},
+            },
+        },
+    )
+    raw_text = response.text.strip()
+    try:
+        prompts_list = json.loads(raw_text)
+        return prompts_list
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON: {e}")
+        return []
+
+
+def generate_scene_prompts(excerpts: list[str]) -> list[str]:
+    scenes = "\n\n".join(
+        f"Scene {idx}:\n{excerpt}" for idx, excerpt in enumerate(excerpts, start=1)
+    )
+    prompt = (
+        f"Below are {len(excerpts)} consecutive scenes from one chapter of a book, in reading order. "
+        f"For each scene write one vivid, specific and visually descriptive prompt for 16:9 image generation that depicts it. "
+        f"Each prompt should mention size and command to generate an image. Do not number them or add any extra text. "
+        f"Adhere return type to json format, return an array containing exactly {len(excerpts)} prompts, one per scene, in order."
+        f"\n\n{scenes}"
+    )
+    response = get_client().models.generate_content(
+        model=TEXT_MODEL,
+        contents=prompt,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": {
+                "type": "array",
+                "items": {"type": "string"},
+            },
+        },
+    )
+    try:
+        return json.loads(response.text.strip())
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON: {e}")
+        return []
+
+
+def generate_image(prompt: str) -> bytes | None:
+    from google.genai import types
+
+    try:
+        response = get_client().models.generate_content(
+            model=IMAGE_MODEL,
+            contents=[prompt],
+            config=types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"]),
+        )
+        for part in response.candidates[0].content.parts:
+            if part.inline_data:
+                return part.inline_data.data
+    except Exception as e:
+        print(f"Error generating image for prompt '{prompt}': {e}")
+        get_tracker().error("images", e)
+    return None
+
+
+def save_image(image_data: bytes, filename: str, output_dir: str) -> str | None:
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        # The encoded bytes are stored as-is; the render stage decodes and
+        # scales each image once to the profile size.
+        with Image.open(io.BytesIO(image_data)) as image:
+            ext = (image.format or "png").lower().replace("jpeg", "jpg")
+        path = os.path.join(output_dir, f"{filename}.{ext}")
+        with open(path, "wb") as f:
+            f.write(image_data)
+        return path
+    except Exception as e:
+        print(f"Error saving image '{filename}': {e}")
+    return None
+
+
+def generate_images_from_chapter(
+    chapter_text: str, num_images: int, output_dir: str
+) -> list[str]:
+    prompts = generate_image_prompts(chapter_text, num_images)
+    image_paths = []
+    for idx, prompt in enumerate(prompts, start=1):
+        print(f"\nGenerating image {idx} for prompt:\n{prompt}")
+        image_data = generate_image(prompt)
+        if image_data:
+            path = save_image(image_data, f"image_{idx}", output_dir)
+            if path:
+                image_paths.append(path)
+        else:
+            print(f"Failed to generate image {idx}.")
+        get_tracker().advance("images")
+    return image_paths
+
+
+def generate_images_from_scenes(excerpts: list[str], output_dir: str) -> list[str | None]:
+    prompts = generate_scene_prompts(excerpts)
+    image_paths = []
+    for idx in range(1, len(excerpts) + 1):
+        path = None
+        if idx <= len(prompts):
+            print(f"\nGenerating image {idx} for prompt:\n{prompts[idx - 1]}")
+            image_data = generate_image(prompts[idx - 1])
+            if image_data:
+                path = save_image(image_data, f"image_{idx}", output_dir)
+        if not path:
+            print(f"Failed to generate image {idx}.")
+        get_tracker().advance("images")
+        image_paths.append(path)
+    return image_paths
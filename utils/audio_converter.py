@@ -1,141 +1,456 @@
-import re
-import os
-import soundfile as sf
-import torch
-import json
-from kokoro import KPipeline
-from utils.audio_merger import merge_audio_files
-from utils.sentence_streamer import stream_sentences
-from utils.subtitle_generator import generate_srt_from_subtitles_json
-
-
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-
-pipeline = KPipeline(lang_code="a")
-
-
-def convert_to_audio(text, voice, chunk_id, output_dir):
-    generator = pipeline(text, voice=voice)
-    output_path = f"{output_dir}/{chunk_id}.wav"
-
-    for _, _, audio in generator:
-        sf.write(output_path, audio, 24000)
-    return output_path, text
-
-
-def format_name(raw_name):
-    name = re.sub(r",\s*\d{4}-\d{4}", "", raw_name).strip()
-
-    if "," in name:
-        parts = [part.strip() for part in name.split(",", maxsplit=1)]
-        if len(parts) == 2:
-            return f"{parts[1]} {parts[0]}"
-    return name
-
-
-def process_introduction_audio(metadata, output_dir, voice):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    title = metadata.get("Title", "Unknown Title")
-    author_raw = metadata.get("Author", "Unknown Author")
-    translator_raw = metadata.get("Translator", "").strip()
-
-    author = format_name(author_raw)
-    translator = format_name(translator_raw) if translator_raw.lower() != "none" else ""
-
-    if translator:
-        intro = (
-            f"Welcome, to the audiobook edition of {title}, "
-            f"written by {author} and beautifully translated by {translator}. "
-            "Sit back, relax, and enjoy."
-        )
-    else:
-        intro = (
-            f"Welcome, to the audiobook edition of {title} by {author}. "
-            "Sit back, relax, and enjoy."
-        )
-
-    chunk_id = "introduction"
-    audio_path, _ = convert_to_audio(
-        text=intro, chunk_id=chunk_id, output_dir=output_dir, voice=voice
-    )
-
-    subtitle_data = [{"audio": f"{chunk_id}.wav", "text": intro}]
-    subtitle_json_path = os.path.join(output_dir, "subtitles.json")
-
-    with open(subtitle_json_path, "w", encoding="utf-8") as f:
-        json.dump(subtitle_data, f, indent=2)
-
-    generate_srt_from_subtitles_json(
-        subtitle_json_path=subtitle_json_path,
-        audio_dir=output_dir,
-        output_srt_path=os.path.join(output_dir, "introduction.srt"),
-    )
-
-    print("Introduction Audio Generated Successfully..")
-
-    return os.path.join(output_dir, "introduction.wav"), os.path.join(
-        output_dir, "introduction.srt"
-    )
-
-
-def process_texts_to_audio(input_dir, output_dir, voice):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    chapter_audio_paths = []
-    chapter_srt_paths = []
-
-    for file_name in os.listdir(input_dir):
-        if file_name.endswith(".txt"):
-            chapter_name = os.path.splitext(file_name)[0]
-            chapter_dir = os.path.join(output_dir, chapter_name)
-            os.makedirs(chapter_dir, exist_ok=True)
-
-            txt_path = os.path.join(input_dir, file_name)
-            subtitle_data = []
-            chunk_id = 0
-            # base_name = os.path.splitext(file_name)[0]
-            # audio_output_dir = os.path.join(output_dir, base_name)
-
-            print(f"\nProcessing Chapter: {chapter_name}")
-
-            for chunk in stream_sentences(txt_path):
-                chunk_id_str = f"{chunk_id:06d}"
-                # print(f"  Chunk {chunk_id_str}:")
-                # print(f"  {chunk[:60]}..." if len(chunk) > 60 else f"  {chunk}")
-                audio_path, text = convert_to_audio(
-                    text=chunk,
-                    chunk_id=chunk_id_str,
-                    output_dir=chapter_dir,
-                    voice=voice,
-                )
-                subtitle_data.append(
-                    {"audio": os.path.basename(audio_path), "text": text}
-                )
-                chunk_id += 1
-
-            subtitle_json_path = os.path.join(chapter_dir, "subtitles.json")
-            with open(subtitle_json_path, "w", encoding="utf-8") as f:
-                json.dump(subtitle_data, f, indent=2)
-
-            merged_chapter_path = os.path.join(output_dir, f"{chapter_name}.wav")
-            merge_audio_files(None, chapter_dir, merged_chapter_path)
-            chapter_audio_paths.append(merged_chapter_path)
-
-            chapter_srt_path = os.path.join(output_dir, f"{chapter_name}.srt")
-            generate_srt_from_subtitles_json(
-                subtitle_json_path=subtitle_json_path,
-                audio_dir=chapter_dir,
-                output_srt_path=chapter_srt_path,
-            )
-            chapter_srt_paths.append(chapter_srt_path)
-            for filename in os.listdir(chapter_dir):
-                file_path = os.path.join(chapter_dir, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-
-
-    return chapter_audio_paths, chapter_srt_paths
+import re
+import os
+import numpy as np
+import soundfile as sf
+import time
+import argparse
+import tempfile
+from utils.audio_merger import merge_audio_files
+from utils.audio_dsp import trim_bounds
+from utils.text_normalizer import NORMALIZER_VERSION
+from utils.progress import get_tracker
+from utils.sentence_streamer import count_chunks, stream_sentences
+from utils.subtitle_generator import generate_srt_from_timings
+from utils.timing_store import Timings, load_words, timings_path
+from utils.dialogue import DialogueAttributor
+from utils.manifest import fingerprint, file_fingerprint, load_manifest, save_manifest
+from utils.tts_cache import TTSCache, normalize_text, save_words, words_path
+from utils.tts_backends import SAMPLE_RATE, get_backend
+from utils import tts_daemon
+
+# Chunks whose dialogue segments are synthesized together, grouped by voice.
+VOICE_BATCH_CHUNKS = 32
+
+
+def synthesis_tag():
+    # Names the backend that actually produces the audio: the daemon's when
+    # synthesis goes through it, so its output is never mixed with a
+    # different local backend's in the cache.
+    client = tts_daemon.get_client()
+    return client.cache_tag if client is not None else get_backend().cache_tag
+
+
+def open_cache(cache_dir):
+    return TTSCache(cache_dir, SAMPLE_RATE, namespace=synthesis_tag())
+
+
+def synthesize(text, voice, cache=None):
+    return synthesize_with_words(text, voice, cache)[0]
+
+
+def synthesize_with_words(text, voice, cache=None):
+    # Word timings come from the local backend or a cache entry it wrote;
+    # audio from the TTS daemon has none.
+    if cache is not None:
+        audio = cache.get(text, voice)
+        if audio is not None:
+            return audio, cache.get_words(text, voice)
+    return synthesize_uncached(text, voice, cache)
+
+
+def synthesize_uncached(text, voice, cache=None):
+    # For callers that have already looked the text up; the result is still
+    # stored in `cache`.
+    started = time.perf_counter()
+    client = tts_daemon.get_client()
+    if client is not None:
+        audio, words = client.synthesize(text, voice), None
+    else:
+        audio, words = get_backend().synthesize_words(text, voice)
+
+    elapsed = time.perf_counter() - started
+    get_tracker().record_synthesis(elapsed, len(audio) / SAMPLE_RATE)
+    if cache is not None:
+        cache.record_synthesis(len(audio) / SAMPLE_RATE, elapsed)
+        cache.put(text, voice, audio, words)
+    return audio, words
+
+
+def preload_voices(voices):
+    if tts_daemon.get_client() is not None:
+        return
+    backend = get_backend()
+    for voice in voices:
+        backend.load_voice(voice)
+
+
+def write_chunk_audio(audio, words, output_path):
+    start, end = trim_bounds(audio, SAMPLE_RATE)
+    sf.write(output_path, audio[start:end], SAMPLE_RATE)
+    if words is not None:
+        # Shifted onto the trimmed audio; read back when the chapter's
+        # timing store is built.
+        save_words(words_path(output_path), np.clip(np.asarray(words) - start / SAMPLE_RATE, 0, None))
+    return output_path
+
+
+def convert_to_audio(text, voice, chunk_id, output_dir, cache=None):
+    audio, words = synthesize_with_words(text, voice, cache)
+    return write_chunk_audio(audio, words, f"{output_dir}/{chunk_id}.wav"), text
+
+
+def synthesize_by_voice(segments, cache=None):
+    # {(voice, text): (audio, words)} for a batch of segments, synthesized
+    # one voice at a time so the model switches voice once per voice in the
+    # batch instead of at every quote.
+    results = {}
+    for voice in dict.fromkeys(seg_voice for seg_voice, _ in segments):
+        for seg_voice, text in segments:
+            if seg_voice == voice and (voice, text) not in results:
+                results[(voice, text)] = synthesize_with_words(text, voice, cache)
+    return results
+
+
+def synthesize_segments(segments, cache=None, synthesized=None):
+    # Audio and word timings of (voice, text) segments spoken back to back,
+    # taken from `synthesized` when given. Each segment is cached on its own;
+    # timings are dropped for the whole chunk if any segment has none.
+    synthesized = synthesized or synthesize_by_voice(segments, cache)
+    parts, words, offset = [], [], 0
+    for segment in segments:
+        audio, spans = synthesized[segment]
+        if words is not None and spans is not None:
+            words.append(np.asarray(spans, dtype=np.float64).reshape(-1, 2) + offset / SAMPLE_RATE)
+        else:
+            words = None
+        parts.append(audio)
+        offset += len(audio)
+    if len(parts) == 1:
+        return parts[0], words[0] if words else None
+    audio = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return audio, np.concatenate(words) if words else None
+
+
+def chunk_plan(chunks, voice, dialogue_voices=None):
+    # (voice, text) segments per chunk: the whole chunk in the narrator's
+    # voice, or split at quotes in dialogue mode.
+    if not dialogue_voices:
+        return [[(voice, chunk)] for chunk in chunks]
+    attributor = DialogueAttributor(voice, dialogue_voices)
+    return [attributor.segments(chunk) for chunk in chunks]
+
+
+def convert_chunks_to_audio(chunks, plan, output_dir, cache=None, batch_chunks=1):
+    # Yields (audio_path, text, reused). Repeats within the chapter point at
+    # the first rendering of the chunk, in both the merge list and the
+    # subtitle index; in dialogue mode only when spoken by the same voices.
+    # With batch_chunks > 1, segments are synthesized grouped by voice over
+    # that many chunks at a time, which bounds the audio held in memory.
+    rendered = {}
+    indexed = list(enumerate(zip(chunks, plan)))
+    for batch_start in range(0, len(indexed), batch_chunks):
+        batch = indexed[batch_start : batch_start + batch_chunks]
+        keys = [tuple((seg_voice, normalize_text(text)) for seg_voice, text in segments) for _, (_, segments) in batch]
+        pending = [
+            segment
+            for key, (_, (_, segments)) in zip(keys, batch)
+            if key not in rendered
+            for segment in segments
+        ]
+        synthesized = synthesize_by_voice(pending, cache)
+        for key, (chunk_id, (chunk, segments)) in zip(keys, batch):
+            if key in rendered:
+                yield rendered[key], chunk, True
+                continue
+            audio, words = synthesize_segments(segments, cache, synthesized)
+            rendered[key] = write_chunk_audio(audio, words, f"{output_dir}/{chunk_id:06d}.wav")
+            yield rendered[key], chunk, False
+
+
+def benchmark_dialogue(txt_path, voice, dialogue_voices):
+    # Audio seconds produced per wall second for one chapter, spoken by the
+    # narrator alone and in dialogue mode, without the TTS cache.
+    chunks = [chunk for chunk, _ in stream_sentences(txt_path, paragraphs=True)]
+    preload_voices([voice] + list(dialogue_voices))
+    synthesize(chunks[0], voice)
+    results = {}
+    for label, voices in (("single voice", None), ("dialogue", dialogue_voices)):
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            seconds = sum(
+                sf.info(path).duration
+                for path, _, _ in convert_chunks_to_audio(
+                    chunks,
+                    chunk_plan(chunks, voice, voices),
+                    output_dir,
+                    batch_chunks=VOICE_BATCH_CHUNKS if voices else 1,
+                )
+            )
+            elapsed = time.perf_counter() - started
+        results[label] = seconds / elapsed
+        print(f"{label:>12}: {seconds:.1f}s of audio in {elapsed:.1f}s ({results[label]:.1f}x real time)")
+    ratio = results["dialogue"] / results["single voice"]
+    print(f"Dialogue mode throughput: {ratio:.0%} of single voice")
+    return ratio
+
+
+def format_name(raw_name):
+    name = re.sub(r",\s*\d{4}-\d{4}", "", raw_name).strip()
+
+    if "," in name:
+        parts = [part.strip() for part in name.split(",", maxsplit=1)]
+        if len(parts) == 2:
+            return f"{parts[1]} {parts[0]}"
+    return name
+
+
+def process_introduction_audio(metadata, output_dir, voice, cache_dir=None):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    title = metadata.get("Title", "Unknown Title")
+    author_raw = metadata.get("Author", "Unknown Author")
+    translator_raw = metadata.get("Translator", "").strip()
+
+    author = format_name(author_raw)
+    translator = format_name(translator_raw) if translator_raw.lower() != "none" else ""
+
+    if translator:
+        intro = (
+            f"Welcome, to the audiobook edition of {title}, "
+            f"written by {author} and beautifully translated by {translator}. "
+            "Sit back, relax, and enjoy."
+        )
+    else:
+        intro = (
+            f"Welcome, to the audiobook edition of {title} by {author}. "
+            "Sit back, relax, and enjoy."
+        )
+
+    chunk_id = "introduction"
+    audio_path, _ = convert_to_audio(
+        text=intro,
+        chunk_id=chunk_id,
+        output_dir=output_dir,
+        voice=voice,
+        cache=open_cache(cache_dir) if cache_dir else None,
+    )
+
+    timings = Timings.build(
+        [intro],
+        [sf.info(audio_path).frames],
+        [0.0],
+        SAMPLE_RATE,
+        chapter=chunk_id,
+        words=[load_words(audio_path)],
+    )
+    timings.save(timings_path(output_dir, chunk_id))
+    if os.path.exists(words_path(audio_path)):
+        os.remove(words_path(audio_path))
+    generate_srt_from_timings(timings, os.path.join(output_dir, "introduction.srt"))
+
+    print("Introduction Audio Generated Successfully..")
+
+    return os.path.join(output_dir, "introduction.wav"), os.path.join(
+        output_dir, "introduction.srt"
+    )
+
+
+def render_chapter_audio(
+    txt_path,
+    output_dir,
+    voice,
+    chunk_pause=0.0,
+    chapter_pause=0.0,
+    target_lufs=None,
+    dialogue_voices=None,
+    cache=None,
+    paragraph_pause=None,
+):
+    chapter_name = os.path.splitext(os.path.basename(txt_path))[0]
+    chapter_dir = os.path.join(output_dir, chapter_name)
+    os.makedirs(chapter_dir, exist_ok=True)
+    merged_chapter_path = os.path.join(output_dir, f"{chapter_name}.wav")
+    chapter_srt_path = os.path.join(output_dir, f"{chapter_name}.srt")
+
+    subtitle_data = []
+    # base_name = os.path.splitext(file_name)[0]
+    # audio_output_dir = os.path.join(output_dir, base_name)
+
+    print(f"\nProcessing Chapter: {chapter_name}")
+    cached_before = (cache.hits, cache.misses) if cache else (0, 0)
+    reused_seconds = 0.0
+    chunks = list(stream_sentences(txt_path, paragraphs=True))
+    paragraph_ends = [paragraph_end for _, paragraph_end in chunks]
+    chunks = [chunk for chunk, _ in chunks]
+    if paragraph_pause is None:
+        paragraph_pause = chunk_pause
+
+    plan = chunk_plan(chunks, voice, dialogue_voices)
+    chunk_audio = convert_chunks_to_audio(
+        chunks, plan, chapter_dir, cache, VOICE_BATCH_CHUNKS if dialogue_voices else 1
+    )
+
+    # Chunks are trimmed to their speech, so the gap after each one is set
+    # here by the kind of boundary it ends on.
+    tracker = get_tracker()
+    for (audio_path, text, reused), paragraph_end in zip(chunk_audio, paragraph_ends):
+        if reused:
+            reused_seconds += sf.info(audio_path).duration
+        subtitle_data.append(
+            {
+                "audio": os.path.basename(audio_path),
+                "text": text,
+                "pause": paragraph_pause if paragraph_end else chunk_pause,
+            }
+        )
+        tracker.advance("tts")
+
+    if subtitle_data:
+        subtitle_data[-1]["pause"] = chapter_pause
+
+    if cache is not None:
+        cache.record_reuse(reused_seconds)
+        print(
+            f"♻️ Reused {cache.hits - cached_before[0]} cached chunks, "
+            f"synthesized {cache.misses - cached_before[1]}."
+        )
+    if reused_seconds:
+        print(f"♻️ {reused_seconds:.1f}s of repeated passages reused within the chapter.")
+    if get_backend().phonemes is not None:
+        print(get_backend().phonemes.summary())
+
+    audio_files = [os.path.join(chapter_dir, entry["audio"]) for entry in subtitle_data]
+    pauses = [entry["pause"] for entry in subtitle_data]
+    merge_audio_files(
+        output_file=merged_chapter_path,
+        audio_files=audio_files,
+        pauses=pauses,
+        target_lufs=target_lufs,
+    )
+
+    frames = {path: sf.info(path).frames for path in set(audio_files)}
+    timings = Timings.build(
+        [entry["text"] for entry in subtitle_data],
+        [frames[path] for path in audio_files],
+        pauses,
+        SAMPLE_RATE,
+        chapter=chapter_name,
+        words=[load_words(path) for path in audio_files],
+    )
+    timings.save(timings_path(output_dir, chapter_name))
+    generate_srt_from_timings(timings, chapter_srt_path)
+    for filename in os.listdir(chapter_dir):
+        file_path = os.path.join(chapter_dir, filename)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+    return merged_chapter_path, chapter_srt_path
+
+
+def chapter_render_key(
+    txt_path, voice, chunk_pause, chapter_pause, target_lufs, dialogue_voices, paragraph_pause=None
+):
+    return fingerprint(
+        file_fingerprint(txt_path),
+        voice,
+        chunk_pause,
+        chapter_pause,
+        target_lufs,
+        dialogue_voices,
+        "trimmed",
+        paragraph_pause,
+        NORMALIZER_VERSION,
+        *filter(None, [synthesis_tag()]),
+    )
+
+
+def process_texts_to_audio(
+    input_dir,
+    output_dir,
+    voice,
+    chunk_pause=0.0,
+    chapter_pause=0.0,
+    target_lufs=None,
+    dialogue_voices=None,
+    cache_dir=None,
+    paragraph_pause=None,
+):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if dialogue_voices:
+        preload_voices([voice] + list(dialogue_voices))
+
+    cache = open_cache(cache_dir) if cache_dir else None
+    manifest_path = os.path.join(output_dir, "render_manifest.json")
+    render_manifest = load_manifest(manifest_path)
+
+    chapter_audio_paths = []
+    chapter_srt_paths = []
+
+    chapters = []
+    for file_name in sorted(os.listdir(input_dir)):
+        if file_name.endswith(".txt"):
+            chapter_name = os.path.splitext(file_name)[0]
+            txt_path = os.path.join(input_dir, file_name)
+            merged_chapter_path = os.path.join(output_dir, f"{chapter_name}.wav")
+            chapter_srt_path = os.path.join(output_dir, f"{chapter_name}.srt")
+
+            render_key = chapter_render_key(
+                txt_path,
+                voice,
+                chunk_pause,
+                chapter_pause,
+                target_lufs,
+                dialogue_voices,
+                paragraph_pause,
+            )
+            unchanged = (
+                render_manifest.get(chapter_name) == render_key
+                and os.path.exists(merged_chapter_path)
+                and os.path.exists(chapter_srt_path)
+                and os.path.exists(timings_path(output_dir, chapter_name))
+            )
+            chapters.append(
+                (chapter_name, txt_path, merged_chapter_path, chapter_srt_path, render_key, unchanged)
+            )
+
+    # Counted up front so progress and ETA cover the whole book.
+    tracker = get_tracker()
+    tracker.start_stage(
+        "tts",
+        sum(count_chunks(chapter[1]) for chapter in chapters if not chapter[-1]),
+        "chunks",
+    )
+
+    for chapter_name, txt_path, merged_chapter_path, chapter_srt_path, render_key, unchanged in chapters:
+        if unchanged:
+            print(f"\nChapter unchanged, reusing audio: {chapter_name}")
+            chapter_audio_paths.append(merged_chapter_path)
+            chapter_srt_paths.append(chapter_srt_path)
+            continue
+
+        audio_path, srt_path = render_chapter_audio(
+            txt_path,
+            output_dir,
+            voice,
+            chunk_pause=chunk_pause,
+            chapter_pause=chapter_pause,
+            target_lufs=target_lufs,
+            dialogue_voices=dialogue_voices,
+            cache=cache,
+            paragraph_pause=paragraph_pause,
+        )
+        chapter_audio_paths.append(audio_path)
+        chapter_srt_paths.append(srt_path)
+
+        render_manifest[chapter_name] = render_key
+        save_manifest(manifest_path, render_manifest)
+
+    tracker.finish_stage("tts")
+    if cache is not None:
+        print(cache.report())
+
+
+    return chapter_audio_paths, chapter_srt_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dialogue mode with single-voice synthesis.")
+    parser.add_argument("chapter", help="A chapter .txt file")
+    parser.add_argument("--voice", default="af_heart")
+    parser.add_argument("--dialogue-voices", nargs="+", required=True)
+    args = parser.parse_args()
+
+    benchmark_dialogue(args.chapter, args.voice, args.dialogue_voices)
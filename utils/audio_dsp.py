@@ -0,0 +1,323 @@
+import numpy as np
+import soundfile as sf
+
+FRAME_SECONDS = 0.1
+BLOCK_SECONDS = 2.0
+
+TARGET_LUFS = -16.0
+PEAK_CEILING_DB = -1.0
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+MUSIC_DB = -22.0
+DUCK_DB = -12.0
+DUCK_THRESHOLD_LUFS = -50.0
+DUCK_HOLD_SECONDS = 0.5
+
+TRIM_THRESHOLD_DB = -50.0
+TRIM_FRAME_SECONDS = 0.01
+TRIM_PAD_SECONDS = 0.02
+
+
+def _db_to_gain(db):
+    return 10 ** (db / 20)
+
+
+def _shelf_coefficients(samplerate):
+    # BS.1770 stage 1 pre-filter, re-derived for arbitrary sample rates
+    gain_db, q, fc = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    k = np.tan(np.pi * fc / samplerate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return b, a
+
+
+def _highpass_coefficients(samplerate):
+    # BS.1770 stage 2 RLB high-pass
+    q, fc = 0.5003270373253953, 38.13547087613982
+    k = np.tan(np.pi * fc / samplerate)
+    a0 = 1 + k / q + k * k
+    b = [1.0, -2.0, 1.0]
+    a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return b, a
+
+
+def _biquad_power(b, a, w):
+    z = np.exp(-1j * w)
+    h = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(h) ** 2
+
+
+def k_weighting_power(frame_len, samplerate):
+    # Squared K-weighting magnitude per rfft bin, folded with the Parseval
+    # weights so that `weights @ |X|^2` is the mean square of the filtered frame.
+    w = 2 * np.pi * np.fft.rfftfreq(frame_len)
+    power = _biquad_power(*_shelf_coefficients(samplerate), w)
+    power *= _biquad_power(*_highpass_coefficients(samplerate), w)
+    parseval = np.full(len(w), 2.0)
+    parseval[0] = 1.0
+    if frame_len % 2 == 0:
+        parseval[-1] = 1.0
+    return power * parseval / (frame_len * frame_len)
+
+
+def build_program(audio_files, pauses=None):
+    if pauses is None:
+        pauses = 0.0
+    if isinstance(pauses, (int, float)):
+        pauses = [pauses] * (len(audio_files) - 1) + [0.0]
+    if len(pauses) != len(audio_files):
+        raise ValueError("pauses must have one entry per audio file")
+
+    program = []
+    for path, pause in zip(audio_files, pauses):
+        program.append(("file", path))
+        if pause and pause > 0:
+            program.append(("silence", float(pause)))
+    return program
+
+
+def probe_program(program):
+    samplerate = None
+    channels = 1
+    for kind, value in program:
+        if kind != "file":
+            continue
+        info = sf.info(value)
+        if samplerate is None:
+            samplerate = info.samplerate
+        elif info.samplerate != samplerate:
+            raise ValueError(
+                f"Sample rate mismatch: {value} is {info.samplerate} Hz, expected {samplerate} Hz"
+            )
+        channels = max(channels, info.channels)
+    if samplerate is None:
+        raise ValueError("No audio files to process.")
+    return samplerate, channels
+
+
+def iter_program_blocks(program, samplerate, channels, block_frames):
+    # Yields fixed-size (block_frames, channels) float32 blocks across file and
+    # silence boundaries; only the final block may be shorter.
+    pending = []
+    pending_frames = 0
+
+    def emit():
+        nonlocal pending, pending_frames
+        block = pending[0] if len(pending) == 1 else np.concatenate(pending)
+        pending, pending_frames = [], 0
+        return block
+
+    for kind, value in program:
+        if kind == "silence":
+            remaining = int(round(value * samplerate))
+            while remaining > 0:
+                take = min(remaining, block_frames - pending_frames)
+                pending.append(np.zeros((take, channels), dtype=np.float32))
+                pending_frames += take
+                remaining -= take
+                if pending_frames == block_frames:
+                    yield emit()
+            continue
+
+        with sf.SoundFile(value) as f:
+            while True:
+                data = f.read(block_frames - pending_frames, dtype="float32", always_2d=True)
+                if not len(data):
+                    break
+                if data.shape[1] != channels:
+                    data = np.broadcast_to(data[:, :1], (len(data), channels))
+                pending.append(data)
+                pending_frames += len(data)
+                if pending_frames == block_frames:
+                    yield emit()
+
+    if pending_frames:
+        yield emit()
+
+
+def frame_mean_squares(block, frame_len, weights):
+    frames = len(block) // frame_len
+    if len(block) % frame_len:
+        frames += 1
+        block = np.pad(block, ((0, frames * frame_len - len(block)), (0, 0)))
+    spectrum = np.fft.rfft(block.reshape(frames, frame_len, -1), axis=1)
+    power = spectrum.real**2 + spectrum.imag**2
+    return np.einsum("k,fkc->f", weights, power)
+
+
+def measure_loudness(program, samplerate, channels, block_seconds=BLOCK_SECONDS):
+    frame_len = int(samplerate * FRAME_SECONDS)
+    block_frames = frame_len * max(1, int(round(block_seconds / FRAME_SECONDS)))
+    weights = k_weighting_power(frame_len, samplerate)
+
+    energies = []
+    peak = 0.0
+    for block in iter_program_blocks(program, samplerate, channels, block_frames):
+        energies.append(frame_mean_squares(block, frame_len, weights))
+        peak = max(peak, float(np.max(np.abs(block))))
+
+    frame_energy = np.concatenate(energies) if energies else np.zeros(0)
+
+    # 400 ms gating blocks with 75% overlap are the mean of four 100 ms frames.
+    span = int(round(0.4 / FRAME_SECONDS))
+    if len(frame_energy) >= span:
+        gating = np.convolve(frame_energy, np.ones(span) / span, mode="valid")
+    else:
+        gating = frame_energy[:0]
+
+    with np.errstate(divide="ignore"):
+        gating_lufs = -0.691 + 10 * np.log10(gating)
+        frame_lufs = -0.691 + 10 * np.log10(frame_energy)
+
+    gated = gating[gating_lufs > ABSOLUTE_GATE_LUFS]
+    if len(gated):
+        relative = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+        gated = gating[(gating_lufs > ABSOLUTE_GATE_LUFS) & (gating_lufs > relative)]
+    integrated = -0.691 + 10 * np.log10(gated.mean()) if len(gated) else float("-inf")
+
+    return {
+        "integrated_lufs": float(integrated),
+        "peak_db": float(20 * np.log10(peak)) if peak > 0 else float("-inf"),
+        "frame_lufs": frame_lufs,
+    }
+
+
+def trim_bounds(
+    audio,
+    samplerate,
+    threshold_db=TRIM_THRESHOLD_DB,
+    frame_seconds=TRIM_FRAME_SECONDS,
+    pad_seconds=TRIM_PAD_SECONDS,
+):
+    # One pass of per-frame RMS; everything before the first and after the
+    # last frame above the threshold is dropped, keeping a short pad so
+    # plosives and breath tails are not clipped.
+    frame = max(1, int(frame_seconds * samplerate))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return 0, len(audio)
+    mono = audio if audio.ndim == 1 else audio.mean(axis=1)
+    power = np.square(mono[: n_frames * frame], dtype=np.float64).reshape(n_frames, frame).mean(axis=1)
+    loud = np.flatnonzero(power > 10 ** (threshold_db / 10))
+    if not len(loud):
+        return 0, 0
+    pad = int(pad_seconds * samplerate)
+    start = max(0, loud[0] * frame - pad)
+    end = min(len(audio), (loud[-1] + 1) * frame + pad)
+    return start, end
+
+
+def trim_silence(audio, samplerate, **options):
+    start, end = trim_bounds(audio, samplerate, **options)
+    return audio[start:end]
+
+
+def normalization_gain_db(stats, target_lufs=TARGET_LUFS, peak_ceiling_db=PEAK_CEILING_DB):
+    if not np.isfinite(stats["integrated_lufs"]):
+        return 0.0
+    gain = target_lufs - stats["integrated_lufs"]
+    if np.isfinite(stats["peak_db"]):
+        gain = min(gain, peak_ceiling_db - stats["peak_db"])
+    return gain
+
+
+def duck_envelope(frame_lufs, music_db=MUSIC_DB, duck_db=DUCK_DB):
+    # Speech activity is dilated forwards and backwards so the bed dips just
+    # before speech starts and holds through short gaps between sentences.
+    active = (frame_lufs > DUCK_THRESHOLD_LUFS).astype(np.float64)
+    hold = max(1, int(round(DUCK_HOLD_SECONDS / FRAME_SECONDS)))
+    active = np.convolve(active, np.ones(2 * hold + 1), mode="same") > 0
+    return np.where(active, music_db + duck_db, music_db)
+
+
+class _MusicBed:
+    def __init__(self, path, samplerate, channels):
+        self._file = sf.SoundFile(path)
+        if self._file.samplerate != samplerate:
+            self._file.close()
+            raise ValueError(
+                f"Background music must be {samplerate} Hz, got {self._file.samplerate} Hz"
+            )
+        self.channels = channels
+
+    def read(self, frames):
+        parts = []
+        while frames > 0:
+            data = self._file.read(frames, dtype="float32", always_2d=True)
+            if not len(data):
+                if self._file.frames == 0:
+                    raise ValueError("Background music file is empty.")
+                self._file.seek(0)
+                continue
+            parts.append(data)
+            frames -= len(data)
+        data = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if data.shape[1] != self.channels:
+            data = np.broadcast_to(data[:, :1], (len(data), self.channels))
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def master_audio_files(
+    audio_files,
+    output_file,
+    pauses=None,
+    target_lufs=None,
+    peak_ceiling_db=PEAK_CEILING_DB,
+    music_path=None,
+    music_db=MUSIC_DB,
+    duck_db=DUCK_DB,
+    block_seconds=BLOCK_SECONDS,
+    subtype="PCM_16",
+):
+    program = build_program(audio_files, pauses)
+    samplerate, channels = probe_program(program)
+    frame_len = int(samplerate * FRAME_SECONDS)
+    block_frames = frame_len * max(1, int(round(block_seconds / FRAME_SECONDS)))
+
+    stats = None
+    gain_db = 0.0
+    if target_lufs is not None or music_path:
+        stats = measure_loudness(program, samplerate, channels, block_seconds)
+        if target_lufs is not None:
+            gain_db = normalization_gain_db(stats, target_lufs, peak_ceiling_db)
+
+    gain = np.float32(_db_to_gain(gain_db))
+    music = None
+    envelope = None
+    if music_path:
+        music = _MusicBed(music_path, samplerate, channels)
+        envelope = _db_to_gain(
+            duck_envelope(stats["frame_lufs"] + gain_db, music_db, duck_db)
+        )
+        centers = (np.arange(len(envelope)) + 0.5) * frame_len
+
+    position = 0
+    try:
+        with sf.SoundFile(
+            output_file, "w", samplerate=samplerate, channels=channels, subtype=subtype
+        ) as out:
+            for block in iter_program_blocks(program, samplerate, channels, block_frames):
+                block = block * gain
+                if music is not None:
+                    positions = np.arange(position, position + len(block))
+                    bed_gain = np.interp(positions, centers, envelope).astype(np.float32)
+                    block += music.read(len(block)) * bed_gain[:, None]
+                np.clip(block, -1.0, 1.0, out=block)
+                out.write(block)
+                position += len(block)
+    finally:
+        if music is not None:
+            music.close()
+
+    if stats is not None:
+        print(
+            f"Loudness: {stats['integrated_lufs']:.1f} LUFS, applied {gain_db:+.1f} dB"
+        )
+    return output_file
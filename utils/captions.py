@@ -0,0 +1,172 @@
+import os
+import time
+import argparse
+import subprocess
+from utils.runtime import captions_supported, cpu_count, encoder_preset, ffmpeg_binary, video_encoder
+
+CAPTION_FONT = "Montserrat.ttf"
+CAPTION_FONT_NAME = "Montserrat"
+CAPTION_MAX_CHARS = 42
+# A finished line stays up this long unless the next one starts sooner.
+CAPTION_HOLD_SECONDS = 0.4
+# ASS colours are &HAABBGGRR: spoken words turn gold, the rest stay white.
+SPOKEN_COLOUR = "&H0000D7FF"
+UPCOMING_COLOUR = "&H00FFFFFF"
+OUTLINE_COLOUR = "&H00000000"
+SHADOW_COLOUR = "&H80000000"
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: {width}
+PlayResY: {height}
+WrapStyle: 2
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Caption,{font},{size},{spoken},{upcoming},{outline_colour},{shadow_colour},0,0,0,0,100,100,0,0,1,{outline},{shadow},2,{margin},{margin},{margin_v},1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def format_ass_timestamp(seconds):
+    total = max(0, int(round(seconds * 100)))
+    whole, centis = divmod(total, 100)
+    hours, remainder = divmod(whole, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}.{centis:02}"
+
+
+def escape_ass(text):
+    # Braces open override blocks and a backslash starts a tag.
+    return text.replace("\\", "/").replace("{", "(").replace("}", ")")
+
+
+def caption_lines(words, max_chars=CAPTION_MAX_CHARS):
+    # Greedy split of a chunk's (start, end, word) rows into short lines.
+    line, length = [], 0
+    for word in words:
+        if line and length + 1 + len(word[2]) > max_chars:
+            yield line
+            line, length = [], 0
+        length += len(word[2]) + (1 if line else 0)
+        line.append(word)
+    if line:
+        yield line
+
+
+def karaoke_text(line):
+    # \k durations run from each word's start to the next one's, in whole
+    # centiseconds taken from absolute times so rounding never accumulates.
+    parts = []
+    for k, (start, end, word) in enumerate(line):
+        until = line[k + 1][0] if k + 1 < len(line) else end
+        duration = max(0, round(until * 100) - round(start * 100))
+        parts.append(f"{{\\k{duration}}}{escape_ass(word)}")
+    return " ".join(parts)
+
+
+def write_karaoke_ass(timings, output_path, width=1920, height=1080, max_chars=CAPTION_MAX_CHARS):
+    lines = [line for words in timings.word_rows() for line in caption_lines(words, max_chars)]
+    header = ASS_HEADER.format(
+        width=width,
+        height=height,
+        font=CAPTION_FONT_NAME,
+        size=round(height * 0.055),
+        spoken=SPOKEN_COLOUR,
+        upcoming=UPCOMING_COLOUR,
+        outline_colour=OUTLINE_COLOUR,
+        shadow_colour=SHADOW_COLOUR,
+        outline=max(1, round(height / 360)),
+        shadow=max(1, round(height / 540)),
+        margin=round(width * 0.05),
+        margin_v=round(height * 0.06),
+    )
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(header)
+        for k, line in enumerate(lines):
+            start = line[0][0]
+            end = line[-1][1] + CAPTION_HOLD_SECONDS
+            if k + 1 < len(lines):
+                end = min(end, lines[k + 1][0][0])
+            f.write(
+                f"Dialogue: 0,{format_ass_timestamp(start)},{format_ass_timestamp(max(end, line[-1][1]))},"
+                f"Caption,,0,0,0,,{karaoke_text(line)}\n"
+            )
+    return output_path
+
+
+def escape_filter_path(path):
+    # Escaped once for the filter's option parser and once for the graph.
+    path = os.path.abspath(path).replace("\\", "/")
+    for char in ("\\", ":", "'"):
+        path = path.replace(char, f"\\{char}")
+    for char in ("\\", "'", "[", "]", ",", ";"):
+        path = path.replace(char, f"\\{char}")
+    return path
+
+
+def caption_filter(ass_path, offset=0.0, fonts_dir="."):
+    # libass draws inside the encoder's filter graph, so captions cost no
+    # Python per frame. Segment windows start at `offset`, which the
+    # timestamps are shifted by while the subtitles are drawn.
+    subtitles = f"ass={escape_filter_path(ass_path)}:fontsdir={escape_filter_path(fonts_dir)}"
+    if not offset:
+        return subtitles
+    return f"setpts=PTS+{offset:.6f}/TB,{subtitles},setpts=PTS-STARTPTS"
+
+
+def chapter_captions(timings_path, output_path, width, height):
+    # Returns the ASS path to burn in, or None when this ffmpeg has no libass.
+    from utils.timing_store import Timings
+
+    write_karaoke_ass(Timings.load(timings_path), output_path, width, height)
+    if not captions_supported():
+        print(f"⚠️ ffmpeg was built without libass, captions left in {output_path}")
+        return None
+    return output_path
+
+
+def benchmark(ass_path, seconds=30, size="1920x1080", preset="medium"):
+    # Same encoder, preset and threads as a chapter render, on a synthetic
+    # source, with and without the caption filter.
+    codec = video_encoder()
+    results = {}
+    for label, filters in (("no captions", None), ("captions", caption_filter(ass_path))):
+        command = [
+            ffmpeg_binary(), "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=24:duration={seconds}",
+        ]
+        if filters:
+            command += ["-vf", filters]
+        command += [
+            "-pix_fmt", "yuv420p", "-c:v", codec, "-preset", encoder_preset(codec, preset),
+            "-threads", str(cpu_count()), "-f", "null", "-",
+        ]
+        started = time.perf_counter()
+        subprocess.run(command, check=True)
+        results[label] = time.perf_counter() - started
+        print(f"{label:>12}: {results[label]:.2f}s ({seconds * 24 / results[label]:.1f} fps)")
+    overhead = results["captions"] / results["no captions"] - 1
+    print(f"Caption overhead: {overhead:+.1%} of encode time ({codec}, {preset}, {size})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write karaoke captions for a chapter.")
+    parser.add_argument("timings", help="A chapter's .timings.npz")
+    parser.add_argument("--output", help="ASS file to write (defaults next to the timings)")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--bench", action="store_true", help="Time the encode with and without captions")
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    from utils.timing_store import Timings
+
+    width, height = (int(n) for n in args.size.split("x"))
+    output = args.output or args.timings.replace(".timings.npz", ".ass")
+    write_karaoke_ass(Timings.load(args.timings), output, width, height)
+    print(f"Captions saved to: {output}")
+    if args.bench:
+        benchmark(output, args.seconds, args.size)
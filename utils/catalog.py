@@ -0,0 +1,235 @@
+import os
+import re
+import csv
+import sys
+import sqlite3
+import tarfile
+import argparse
+import xml.etree.ElementTree as ET
+
+GUTENBERG_BASE = "https://www.gutenberg.org"
+
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+DCTERMS = "{http://purl.org/dc/terms/}"
+PGTERMS = "{http://www.gutenberg.org/2009/pgterms/}"
+MARCREL = "{http://id.loc.gov/vocabulary/relators/}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    translator TEXT NOT NULL,
+    language TEXT,
+    issued TEXT,
+    epub_url TEXT NOT NULL,
+    cover_url TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title, author, content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_connections = {}
+
+
+def default_epub_url(book_id):
+    return f"{GUTENBERG_BASE}/ebooks/{book_id}.epub.noimages"
+
+
+def default_cover_url(book_id):
+    return f"{GUTENBERG_BASE}/cache/epub/{book_id}/pg{book_id}.cover.medium.jpg"
+
+
+def split_csv_authors(field):
+    # "Tolstoy, Leo, graf, 1828-1910; Maude, Louise [Translator]"
+    author, translator = None, None
+    for person in filter(None, (p.strip() for p in field.split(";"))):
+        role = re.search(r"\[([^\]]+)\]\s*$", person)
+        name = re.sub(r"\s*\[[^\]]+\]\s*$", "", person)
+        if role and role.group(1).lower() == "translator":
+            translator = translator or name
+        elif not role or role.group(1).lower() == "author":
+            author = author or name
+    return author or "Unknown", translator or "None"
+
+
+def iter_csv_records(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("Type", "Text") != "Text" or not row.get("Text#", "").isdigit():
+                continue
+            book_id = int(row["Text#"])
+            author, translator = split_csv_authors(row.get("Authors", ""))
+            yield {
+                "id": book_id,
+                "title": " ".join(row.get("Title", "").split()) or "Unknown",
+                "author": author,
+                "translator": translator,
+                "language": row.get("Language"),
+                "issued": row.get("Issued"),
+                "epub_url": default_epub_url(book_id),
+                "cover_url": default_cover_url(book_id),
+            }
+
+
+def _agent_name(element):
+    name = element.find(f"{PGTERMS}agent/{PGTERMS}name")
+    return name.text.strip() if name is not None and name.text else None
+
+
+def parse_rdf(stream):
+    ebook = ET.parse(stream).getroot().find(f"{PGTERMS}ebook")
+    if ebook is None:
+        return None
+    match = re.search(r"(\d+)$", ebook.get(f"{RDF}about", ""))
+    if not match:
+        return None
+    book_id = int(match.group(1))
+
+    title = ebook.findtext(f"{DCTERMS}title") or "Unknown"
+    creators = [_agent_name(e) for e in ebook.findall(f"{DCTERMS}creator")]
+    translators = [_agent_name(e) for e in ebook.findall(f"{MARCREL}trl")]
+
+    formats = [
+        f.get(f"{RDF}about", "")
+        for f in ebook.iter(f"{PGTERMS}file")
+    ]
+    epub_url = next((u for u in formats if u.endswith(".epub.noimages")), None)
+    epub_url = epub_url or next((u for u in formats if ".epub" in u), None)
+    cover_url = next((u for u in formats if u.endswith(".cover.medium.jpg")), None)
+
+    return {
+        "id": book_id,
+        "title": " ".join(title.split()),
+        "author": next(filter(None, creators), None) or "Unknown",
+        "translator": next(filter(None, translators), None) or "None",
+        "language": ebook.findtext(f"{DCTERMS}language/{RDF}Description/{RDF}value"),
+        "issued": ebook.findtext(f"{DCTERMS}issued"),
+        "epub_url": epub_url or default_epub_url(book_id),
+        "cover_url": cover_url or default_cover_url(book_id),
+    }
+
+
+def iter_rdf_records(path):
+    if path.endswith(".rdf"):
+        with open(path, "rb") as f:
+            record = parse_rdf(f)
+        if record:
+            yield record
+        return
+
+    with tarfile.open(path, "r:*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".rdf"):
+                continue
+            record = parse_rdf(archive.extractfile(member))
+            if record:
+                yield record
+
+
+def build_catalog(source_path, db_path, batch_size=5000):
+    if source_path.endswith(".csv"):
+        records = iter_csv_records(source_path)
+    else:
+        records = iter_rdf_records(source_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        columns = ["id", "title", "author", "translator", "language", "issued", "epub_url", "cover_url"]
+        insert = (
+            f"INSERT OR REPLACE INTO books ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        count = 0
+        batch = []
+        for record in records:
+            batch.append([record[c] for c in columns])
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(insert, batch)
+            count += len(batch)
+        conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    _connections.pop(os.path.abspath(db_path), None)
+    print(f"📚 Indexed {count} books into {db_path}")
+    return count
+
+
+def open_catalog(db_path):
+    key = os.path.abspath(db_path)
+    if key not in _connections:
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Catalog not found: {db_path}")
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _connections[key] = conn
+    return _connections[key]
+
+
+def _as_metadata(row):
+    return {
+        "id": row["id"],
+        "Title": row["title"],
+        "Author": row["author"],
+        "Translator": row["translator"],
+        "epub_url": row["epub_url"],
+        "cover_url": row["cover_url"],
+    }
+
+
+def lookup_book(db_path, book_id):
+    row = open_catalog(db_path).execute(
+        "SELECT * FROM books WHERE id = ?", (int(book_id),)
+    ).fetchone()
+    return _as_metadata(row) if row else None
+
+
+def search_books(db_path, query, limit=10):
+    conn = open_catalog(db_path)
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return []
+
+    # Prefix matching covers partial words; if every term must match and
+    # nothing does, fall back to any-term matching ranked by relevance.
+    rows = []
+    for joiner in (" AND ", " OR "):
+        match = joiner.join(f'"{term}"*' for term in terms)
+        rows = conn.execute(
+            "SELECT books.* FROM books_fts JOIN books ON books.id = books_fts.rowid "
+            "WHERE books_fts MATCH ? ORDER BY bm25(books_fts, 2.0, 1.0) LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        if rows:
+            break
+    return [_as_metadata(row) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Project Gutenberg catalog index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Index a pg_catalog.csv or RDF dump (.tar.bz2)")
+    build.add_argument("source")
+    build.add_argument("db")
+    search = sub.add_parser("search", help="Search titles and authors")
+    search.add_argument("db")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_catalog(args.source, args.db)
+    else:
+        results = search_books(args.db, args.query, args.limit)
+        if not results:
+            print("No matches.", file=sys.stderr)
+        for book in results:
+            print(f"{book['id']:>6}  {book['Title']} — {book['Author']}")
@@ -0,0 +1,79 @@
+import os
+import re
+import soundfile as sf
+from typing import NamedTuple
+from utils.manifest import load_manifest, save_manifest
+
+INDEX_FILE = "chapter_index.json"
+INTRO_NAME = "introduction"
+
+
+class ChapterEntry(NamedTuple):
+    ordinal: int
+    name: str
+    title: str
+    audio: str
+    srt: str
+    video: str
+    duration: float
+    offset: float
+
+
+def format_chapter_title(title):
+    title = re.sub(r'^\d+_', '', title)
+    title = title.replace('_', ' ')
+    title = re.sub(r'\b0+(\d+)\b', r'\1', title)
+    return title
+
+
+def wav_duration(path):
+    info = sf.info(path)
+    return info.frames / info.samplerate
+
+
+def list_chapter_names(chapters_dir):
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(chapters_dir) if f.endswith(".txt"))
+
+
+def build_chapter_index(book_dir, chapter_names=None, audio_dir=None, video_dir=None):
+    # Built once the audio exists: order comes from the chapter file names,
+    # durations from the WAV headers, and every merge reads paths and offsets
+    # from here instead of scanning directories or guessing file names.
+    audio_dir = audio_dir or os.path.join(book_dir, "audio")
+    video_dir = video_dir or audio_dir
+    if chapter_names is None:
+        chapter_names = list_chapter_names(os.path.join(book_dir, "chapters"))
+
+    entries = []
+    offset = 0.0
+    for name in [INTRO_NAME] + list(chapter_names):
+        audio_path = os.path.join(audio_dir, f"{name}.wav")
+        if not os.path.exists(audio_path):
+            print(f"⚠️ No audio for {name}, leaving it out of the chapter index.")
+            continue
+        title = "Introduction" if name == INTRO_NAME else format_chapter_title(name)
+        video_name = name if name == INTRO_NAME else title
+        duration = wav_duration(audio_path)
+        entries.append(
+            ChapterEntry(
+                ordinal=len(entries),
+                name=name,
+                title=title,
+                audio=audio_path,
+                srt=os.path.join(audio_dir, f"{name}.srt"),
+                video=os.path.join(video_dir, f"{video_name}.mp4"),
+                duration=duration,
+                offset=offset,
+            )
+        )
+        offset += duration
+
+    save_manifest(
+        os.path.join(book_dir, INDEX_FILE), {"chapters": [e._asdict() for e in entries]}
+    )
+    return entries
+
+
+def load_chapter_index(book_dir):
+    data = load_manifest(os.path.join(book_dir, INDEX_FILE))
+    return [ChapterEntry(**entry) for entry in data.get("chapters", [])]
@@ -0,0 +1,119 @@
+import re
+
+OPEN_QUOTES = "“"
+CLOSE_QUOTES = "”"
+TOGGLE_QUOTES = '"'
+
+SPEECH_VERBS = (
+    "said|says|asked|replied|cried|answered|whispered|shouted|exclaimed|"
+    "continued|added|returned|muttered|called|began|resumed|observed|remarked"
+)
+NAME = r"((?:(?:Mr|Mrs|Ms|Miss|Dr|Mister|Missus|Doctor|Sir|Lady|Lord|Madame|Monsieur)\.?\s+)?[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)"
+
+VERB_THEN_NAME = re.compile(rf"^\W*(?:{SPEECH_VERBS})\s+{NAME}")
+NAME_THEN_VERB = re.compile(rf"^\W*{NAME}\s+(?:{SPEECH_VERBS})\b")
+NAME_BEFORE_QUOTE = re.compile(rf"\b{NAME}\s+(?:{SPEECH_VERBS})\W*$")
+
+NOT_NAMES = {"He", "She", "They", "I", "We", "You", "It", "The", "And", "But", "Then"}
+
+
+def split_dialogue(text, in_quote=False):
+    # Also returns whether the text ends inside an open quote, so speeches
+    # spanning several chunks keep their voice.
+    segments = []
+    current = []
+
+    def flush(kind):
+        segment = "".join(current).strip()
+        if segment:
+            segments.append((kind, segment))
+        current.clear()
+
+    for char in text:
+        if char in OPEN_QUOTES and not in_quote:
+            flush("narration")
+            in_quote = True
+        elif char in CLOSE_QUOTES and in_quote:
+            flush("quote")
+            in_quote = False
+        elif char in TOGGLE_QUOTES:
+            flush("quote" if in_quote else "narration")
+            in_quote = not in_quote
+        elif char not in OPEN_QUOTES + CLOSE_QUOTES:
+            current.append(char)
+    flush("quote" if in_quote else "narration")
+    return segments, in_quote
+
+
+def find_speaker(before, after):
+    for pattern, text in ((VERB_THEN_NAME, after), (NAME_THEN_VERB, after), (NAME_BEFORE_QUOTE, before)):
+        if not text:
+            continue
+        match = pattern.search(text)
+        if match and match.group(1).split()[0] not in NOT_NAMES:
+            return match.group(1)
+    return None
+
+
+class DialogueAttributor:
+    def __init__(self, narrator_voice, character_voices):
+        if not character_voices:
+            raise ValueError("At least one character voice is required for dialogue mode.")
+        self.narrator_voice = narrator_voice
+        self.unknown_voice = character_voices[0]
+        self.named_voices = character_voices[1:] or character_voices
+        self.speaker_voices = {}
+        self.recent_speakers = []
+        self.in_quote = False
+        self.current_speaker = None
+
+    def voice_for(self, speaker):
+        if speaker is None:
+            return self.unknown_voice
+        if speaker not in self.speaker_voices:
+            index = len(self.speaker_voices) % len(self.named_voices)
+            self.speaker_voices[speaker] = self.named_voices[index]
+        return self.speaker_voices[speaker]
+
+    def _remember(self, speaker):
+        if speaker in self.recent_speakers:
+            self.recent_speakers.remove(speaker)
+        self.recent_speakers.append(speaker)
+        del self.recent_speakers[:-2]
+
+    def _guess_turn(self):
+        # Unattributed lines in a two-person exchange usually alternate.
+        if len(self.recent_speakers) == 2:
+            return self.recent_speakers[0]
+        return None
+
+    def segments(self, chunk):
+        continues_quote = self.in_quote
+        parts, self.in_quote = split_dialogue(chunk, self.in_quote)
+
+        voiced = []
+        chunk_speaker = None
+        for i, (kind, text) in enumerate(parts):
+            if kind == "narration":
+                voiced.append((self.narrator_voice, text))
+                continue
+
+            if i == 0 and continues_quote and self.current_speaker:
+                speaker = self.current_speaker
+            else:
+                before = parts[i - 1][1] if i > 0 and parts[i - 1][0] == "narration" else ""
+                after = parts[i + 1][1] if i + 1 < len(parts) and parts[i + 1][0] == "narration" else ""
+                speaker = find_speaker(before, after) or chunk_speaker or self._guess_turn()
+            if speaker:
+                chunk_speaker = speaker
+                self._remember(speaker)
+            self.current_speaker = speaker
+            voiced.append((self.voice_for(speaker), text))
+
+        merged = []
+        for voice, text in voiced:
+            if merged and merged[-1][0] == voice:
+                merged[-1] = (voice, f"{merged[-1][1]} {text}")
+            else:
+                merged.append((voice, text))
+        return merged
@@ -1,102 +1,226 @@
-import requests
-from bs4 import BeautifulSoup
-import os
-import re
-from clint.textui import progress
-
-def get_gutenberg_metadata_epub(url, output_dir="downloads"):
-    match = re.search(r'/(\d+)', url)
-    if not match:
-        raise ValueError("Invalid Project Gutenberg URL format")
-    book_id = match.group(1)
-
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise Exception("Failed to fetch the book page")
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    metadata = {}
-    metadata_table = soup.find('table', {'class': 'bibrec'})
-    if metadata_table:
-        for row in metadata_table.find_all('tr'):
-            header_tag = row.find('th')
-            value_tag = row.find('td')
-            if header_tag and value_tag:
-                header = header_tag.get_text(strip=True)
-                value = value_tag.get_text(strip=True)
-                metadata[header] = value
-
-    title = metadata.get("Title", "Unknown")
-    author = metadata.get("Author", "Unknown")
-    translator = metadata.get("Translator", "None")
-
-    print("\n📘 Book Metadata:")
-    print(f"Title     : {title}")
-    print(f"Author    : {author}")
-    print(f"Translator: {translator}")
-
-    epub_link = None
-    for link in soup.find_all('a', href=True):
-        href = link['href']
-        if href.endswith('.epub3.images') or href.endswith('.epub.images') or href.endswith('.epub.noimages') or href.endswith('.epub'):
-            if 'epub.noimages' in href:
-                epub_link = href
-                break
-            elif not epub_link:
-                epub_link = href
-
-    if not epub_link:
-        raise Exception("No EPUB link found")
-
-    if epub_link.startswith('/'):
-        epub_link = 'https://www.gutenberg.org' + epub_link
-
-    os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, f"{title.replace(' ', '_')}.epub")
-
-    print("\n📥 Downloading EPUB...")
-    print(f"EPUB URL: {epub_link}")
-
-    with requests.get(epub_link, stream=True) as r:
-        r.raise_for_status()
-        total_length = r.headers.get('content-length')
-        total_length = int(total_length) if total_length is not None else None
-
-        with open(filename, 'wb') as f:
-            if total_length is None:
-                f.write(r.content)
-            else:
-                for chunk in progress.bar(r.iter_content(chunk_size=1024),
-                                          expected_size=(total_length // 1024) + 1):
-                    if chunk:
-                        f.write(chunk)
-                        f.flush()
-
-    print(f"\n✅ EPUB downloaded: {filename}")
-
-    cover_url = None
-    img_tag = soup.find("img", {"class": "cover-art"})
-    if img_tag and img_tag.get("src"):
-        cover_url = img_tag["src"]
-
-
-    cover_path = None
-    if cover_url:
-        print(f"\n🖼️  Downloading Cover Image: {cover_url}")
-        try:
-            cover_ext = os.path.splitext(cover_url)[1]
-            cover_filename = os.path.join(output_dir, f"{title.replace(' ', '_')}_cover{cover_ext}")
-            with requests.get(cover_url, stream=True) as r:
-                r.raise_for_status()
-                with open(cover_filename, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=1024):
-                        if chunk:
-                            f.write(chunk)
-                            f.flush()
-            cover_path = cover_filename
-            print(f"✅ Cover image saved to: {cover_path}")
-        except Exception as e:
-            print("⚠️ Failed to download cover image:", e)
-
-    return {"Title": title, "Author": author, "Translator": translator}, filename, cover_path
\ No newline at end of file
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+import os
+import re
+import json
+import shutil
+from clint.textui import progress
+from utils.catalog import lookup_book
+
+CHUNK_SIZE = 1 << 20
+# Network reads are smaller than the file buffer: a read cut short by a
+# dropped connection is lost, so this bounds what a resume has to refetch.
+READ_SIZE = 1 << 16
+TIMEOUT = (10, 60)
+
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD"],
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        _session = requests.Session()
+        _session.headers["User-Agent"] = "narrato-ai"
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_meta(meta_path, meta):
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def download_file(url, path, session=None, show_progress=False):
+    session = session or get_session()
+    part_path = f"{path}.part"
+    meta_path = f"{path}.meta.json"
+    meta = _load_meta(meta_path)
+    same_url = meta.get("url") == url
+    validator = meta.get("etag") or meta.get("last_modified")
+
+    headers = {}
+    resume_from = 0
+    if same_url and os.path.exists(path):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    elif same_url and validator and os.path.exists(part_path):
+        resume_from = os.path.getsize(part_path)
+        headers["Range"] = f"bytes={resume_from}-"
+        headers["If-Range"] = validator
+
+    with session.get(url, stream=True, headers=headers, timeout=TIMEOUT) as r:
+        if r.status_code == 304:
+            return path, False
+        if r.status_code == 416 and resume_from:
+            os.remove(part_path)
+            return download_file(url, path, session, show_progress)
+        r.raise_for_status()
+
+        if r.status_code != 206:
+            resume_from = 0
+        meta = {
+            "url": url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+        _save_meta(meta_path, meta)
+
+        total_length = r.headers.get("content-length")
+        chunks = r.iter_content(chunk_size=READ_SIZE)
+        if show_progress and total_length is not None:
+            chunks = progress.bar(
+                chunks, expected_size=(int(total_length) // READ_SIZE) + 1
+            )
+
+        with open(part_path, "ab" if resume_from else "wb", buffering=CHUNK_SIZE) as f:
+            for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+
+    os.replace(part_path, path)
+    return path, True
+
+
+def _publish(source, destination):
+    # Mirror files are linked into the output directory instead of copied.
+    if os.path.abspath(source) == os.path.abspath(destination):
+        return destination
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
+
+
+def scrape_book_page(url, session, book_mirror=None):
+    if book_mirror:
+        page_path, _ = download_file(url, os.path.join(book_mirror, "page.html"), session)
+        with open(page_path, "r", encoding="utf-8") as f:
+            page_html = f.read()
+    else:
+        response = session.get(url, timeout=TIMEOUT)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch the book page")
+        page_html = response.text
+
+    soup = BeautifulSoup(page_html, 'html.parser')
+
+    metadata = {}
+    metadata_table = soup.find('table', {'class': 'bibrec'})
+    if metadata_table:
+        for row in metadata_table.find_all('tr'):
+            header_tag = row.find('th')
+            value_tag = row.find('td')
+            if header_tag and value_tag:
+                header = header_tag.get_text(strip=True)
+                value = value_tag.get_text(strip=True)
+                metadata[header] = value
+
+    epub_link = None
+    for link in soup.find_all('a', href=True):
+        href = link['href']
+        if href.endswith('.epub3.images') or href.endswith('.epub.images') or href.endswith('.epub.noimages') or href.endswith('.epub'):
+            if 'epub.noimages' in href:
+                epub_link = href
+                break
+            elif not epub_link:
+                epub_link = href
+
+    if not epub_link:
+        raise Exception("No EPUB link found")
+
+    if epub_link.startswith('/'):
+        epub_link = 'https://www.gutenberg.org' + epub_link
+
+    cover_url = None
+    img_tag = soup.find("img", {"class": "cover-art"})
+    if img_tag and img_tag.get("src"):
+        cover_url = img_tag["src"]
+
+    return metadata, epub_link, cover_url
+
+
+def get_gutenberg_metadata_epub(url, output_dir="downloads", mirror_dir=None, catalog_path=None):
+    match = re.search(r'/(\d+)', url)
+    if not match:
+        raise ValueError("Invalid Project Gutenberg URL format")
+    book_id = match.group(1)
+    session = get_session()
+
+    book_mirror = os.path.join(mirror_dir, book_id) if mirror_dir else None
+    if book_mirror:
+        os.makedirs(book_mirror, exist_ok=True)
+
+    record = lookup_book(catalog_path, book_id) if catalog_path else None
+    if record:
+        metadata, epub_link, cover_url = record, record["epub_url"], record["cover_url"]
+    else:
+        metadata, epub_link, cover_url = scrape_book_page(url, session, book_mirror)
+
+    title = metadata.get("Title", "Unknown")
+    author = metadata.get("Author", "Unknown")
+    translator = metadata.get("Translator", "None")
+
+    print("\n📘 Book Metadata:")
+    print(f"Title     : {title}")
+    print(f"Author    : {author}")
+    print(f"Translator: {translator}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"{title.replace(' ', '_')}.epub")
+
+    print("\n📥 Downloading EPUB...")
+    print(f"EPUB URL: {epub_link}")
+
+    epub_target = os.path.join(book_mirror, f"pg{book_id}.epub") if book_mirror else filename
+    _, downloaded = download_file(epub_link, epub_target, session, show_progress=True)
+    if book_mirror:
+        _publish(epub_target, filename)
+
+    if downloaded:
+        print(f"\n✅ EPUB downloaded: {filename}")
+    else:
+        print(f"\n✅ EPUB unchanged, using local copy: {filename}")
+
+    cover_path = None
+    if cover_url:
+        print(f"\n🖼️  Downloading Cover Image: {cover_url}")
+        try:
+            cover_ext = os.path.splitext(cover_url)[1]
+            cover_filename = os.path.join(output_dir, f"{title.replace(' ', '_')}_cover{cover_ext}")
+            if book_mirror:
+                mirror_cover = os.path.join(book_mirror, f"cover{cover_ext}")
+                download_file(cover_url, mirror_cover, session)
+                _publish(mirror_cover, cover_filename)
+            else:
+                download_file(cover_url, cover_filename, session)
+            cover_path = cover_filename
+            print(f"✅ Cover image saved to: {cover_path}")
+        except Exception as e:
+            print("⚠️ Failed to download cover image:", e)
+
+    return {"Title": title, "Author": author, "Translator": translator}, filename, cover_path
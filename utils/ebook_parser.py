@@ -1,262 +1,431 @@
-import os
-import re
-from bs4 import BeautifulSoup
-from ebooklib import epub, ITEM_DOCUMENT
-from InquirerPy import inquirer
-
-
-def sanitize_filename(title):
-    return re.sub(r'[\\/*?:"<>|]', "", title).strip().replace(" ", "_")
-
-
-ROMAN_NUMERAL_MAP = {
-    "M": 1000,
-    "CM": 900,
-    "D": 500,
-    "CD": 400,
-    "C": 100,
-    "XC": 90,
-    "L": 50,
-    "XL": 40,
-    "X": 10,
-    "IX": 9,
-    "V": 5,
-    "IV": 4,
-    "I": 1,
-}
-
-
-def roman_to_int(roman):
-    roman = roman.upper()
-    i = 0
-    num = 0
-    while i < len(roman):
-        if i + 1 < len(roman) and roman[i : i + 2] in ROMAN_NUMERAL_MAP:
-            num += ROMAN_NUMERAL_MAP[roman[i : i + 2]]
-            i += 2
-        elif roman[i] in ROMAN_NUMERAL_MAP:
-            num += ROMAN_NUMERAL_MAP[roman[i]]
-            i += 1
-        else:
-            return None
-    return num
-
-
-def convert_title_roman_numerals(title):
-    def replacer(match):
-        roman = match.group(1)
-        integer = roman_to_int(roman)
-        if integer:
-            return match.group(0).replace(roman, str(integer))
-        return match.group(0)
-
-    title = re.sub(
-        r"\b(Chapter|Book|Part)\s+([IVXLCDM]+)\b",
-        lambda m: f"{m.group(1)} {roman_to_int(m.group(2)) or m.group(2)}",
-        title,
-        flags=re.IGNORECASE,
-    )
-
-    title = re.sub(
-        r"^([IVXLCDM]+)(\.?)(\s|$)",
-        lambda m: f"{roman_to_int(m.group(1)) or m.group(1)}{m.group(2)}{m.group(3)}",
-        title,
-    )
-
-    return title
-
-
-def strip_redundant_heading(title, content):
-    lines = content.strip().splitlines()
-    if not lines:
-        return content
-
-    first_line = lines[0].strip()
-    normalized_title = re.sub(r"\W+", "", title).lower()
-    normalized_first_line = re.sub(r"\W+", "", first_line).lower()
-
-    if (
-        normalized_first_line in normalized_title
-        or normalized_title in normalized_first_line
-    ):
-        return "\n".join(lines[1:]).strip()
-
-    if re.match(r"^(chapter\s*)?[ivxlcdm\d]+\.*$", first_line, re.IGNORECASE):
-        return "\n".join(lines[1:]).strip()
-
-    return content
-
-
-def extract_chapter_text(soup, start_id, next_id=None):
-    content = []
-    start_elem = soup.find(id=start_id)
-    if not start_elem:
-        return ""
-
-    current = (
-        start_elem.find_next_sibling()
-        if start_elem.name in ["h1", "h2", "h3"]
-        else start_elem
-    )
-    while current:
-        if next_id and current.get("id") == next_id:
-            break
-        if (
-            current.name in ["h1", "h2", "h3"]
-            and "chapter" in current.get_text().lower()
-        ):
-            break
-        content.append(current.get_text())
-        current = current.find_next_sibling()
-
-    return "\n".join(content).strip()
-
-
-def save_chapter_to_file(index, title, content, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    safe_title = sanitize_filename(title)
-    file_name = f"{index:02d}_{safe_title}.txt"
-    file_path = os.path.join(output_dir, file_name)
-
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(f"{content}")
-
-
-def extract_chapters_from_epub(epub_file, output_dir="chapters", debug=False):
-    if not os.path.exists(epub_file):
-        raise FileNotFoundError(f"EPUB file not found: {epub_file}")
-
-    book = epub.read_epub(epub_file)
-    chapters = []
-
-    def process_toc_items(items, prefix=""):
-        for idx, item in enumerate(items):
-            if isinstance(item, tuple) and len(item) == 2:
-                part_title, children = item
-
-                if isinstance(part_title, epub.Link):
-                    part_title_str = part_title.title.strip()
-                elif isinstance(part_title, epub.Section):
-                    part_title_str = part_title.title.strip()
-                else:
-                    part_title_str = str(part_title).strip()
-
-                new_prefix = f"{prefix} - {part_title_str}".strip(" -")
-                process_toc_items(children, new_prefix)
-
-            elif isinstance(item, epub.Link):
-                title = item.title.strip()
-                if title.lower() in [
-                    "cover",
-                    "title page",
-                    "copyright",
-                ] or title.lower().startswith("by"):
-                    continue
-
-                full_title = f"{prefix} - {title}".strip(" -")
-
-                href_parts = item.href.split("#")
-                file_name = href_parts[0]
-                fragment_id = href_parts[1] if len(href_parts) > 1 else None
-
-                doc = next(
-                    (
-                        d
-                        for d in book.get_items_of_type(ITEM_DOCUMENT)
-                        if d.file_name.endswith(file_name)
-                    ),
-                    None,
-                )
-                if not doc:
-                    continue
-
-                soup = BeautifulSoup(doc.get_content().decode("utf-8"), "html.parser")
-
-                next_fragment = None
-                for j in range(idx + 1, len(items)):
-                    if isinstance(items[j], epub.Link):
-                        next_parts = items[j].href.split("#")
-                        if next_parts[0] == file_name and len(next_parts) > 1:
-                            next_fragment = next_parts[1]
-                            break
-                        else:
-                            break
-
-                if fragment_id:
-                    content = extract_chapter_text(soup, fragment_id, next_fragment)
-                else:
-                    content = soup.get_text().strip()
-
-                if content:
-                    cleaned_content = strip_redundant_heading(full_title, content)
-                    full_title = convert_title_roman_numerals(full_title)
-                    chapters.append({"title": full_title, "content": cleaned_content})
-
-    process_toc_items(book.toc)
-
-    if not chapters:
-        for doc in sorted(
-            book.get_items_of_type(ITEM_DOCUMENT), key=lambda d: d.file_name
-        ):
-            soup = BeautifulSoup(doc.get_content().decode("utf-8"), "html.parser")
-            chapter_headers = soup.find_all(
-                ["h1", "h2", "h3"], string=re.compile(r"(chapter|book)", re.I)
-            )
-
-            for header in chapter_headers:
-                title = header.get_text().strip()
-                content = []
-                for tag in header.find_next_siblings():
-                    if tag.name in ["h1", "h2", "h3"] and re.search(
-                        r"(chapter|book)", tag.get_text(), re.I
-                    ):
-                        break
-                    content.append(tag.get_text())
-                if content:
-                    cleaned_content = strip_redundant_heading(
-                        title, "\n".join(content).strip()
-                    )
-                    title = convert_title_roman_numerals(title)
-                    chapters.append({"title": title, "content": cleaned_content})
-
-    if debug:
-        print(f"\nExtracted {len(chapters)} chapters.")
-
-    choose_and_save_chapters(chapters, output_dir, debug=debug)
-
-    return chapters
-
-
-def choose_and_save_chapters(chapters, output_dir, debug=False):
-    choices = [
-        {"name": f"{idx+1:02d}. {chapter['title']}", "value": idx, "enabled": False}
-        for idx, chapter in enumerate(chapters)
-    ]
-
-    selected_indices = inquirer.checkbox(
-        message="Select / Deselect chapters to save:",
-        choices=choices,
-        instruction="(Use space to select, enter to confirm)",
-    ).execute()
-
-    if not selected_indices:
-        print("No chapters selected. Exiting without saving.")
-        return
-
-    for save_idx, original_idx in enumerate(selected_indices, start=1):
-        chapter = chapters[original_idx]
-        file_index = f"{save_idx:03d}"
-        safe_title = sanitize_filename(chapter["title"])
-        file_name = f"{file_index}_{safe_title}.txt"
-        file_path = os.path.join(output_dir, file_name)
-
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(chapter["title"] + "\n\n......\n\n" + chapter["content"])
-
-        if debug:
-            print(f"Saved: {file_name}")
+import os
+import re
+from functools import lru_cache
+from bs4 import BeautifulSoup
+from ebooklib import epub, ITEM_DOCUMENT
+from utils.manifest import fingerprint, load_manifest, save_manifest
+from utils.text_normalizer import roman_to_int
+
+MANIFEST_FILE = "manifest.json"
+DESELECTED_DIR = "deselected"
+PARAGRAPH_TAGS = ["p", "div", "blockquote", "li", "pre", "table", "h1", "h2", "h3", "h4", "h5", "h6"]
+PARAGRAPH_GAP = re.compile(r"\n[ \t]*(?:\n[ \t]*)+")
+
+
+def sanitize_filename(title):
+    return re.sub(r'[\\/*?:"<>|]', "", title).strip().replace(" ", "_")
+
+
+def convert_title_roman_numerals(title):
+    def replacer(match):
+        roman = match.group(1)
+        integer = roman_to_int(roman)
+        if integer:
+            return match.group(0).replace(roman, str(integer))
+        return match.group(0)
+
+    title = re.sub(
+        r"\b(Chapter|Book|Part)\s+([IVXLCDM]+)\b",
+        lambda m: f"{m.group(1)} {roman_to_int(m.group(2)) or m.group(2)}",
+        title,
+        flags=re.IGNORECASE,
+    )
+
+    title = re.sub(
+        r"^([IVXLCDM]+)(\.?)(\s|$)",
+        lambda m: f"{roman_to_int(m.group(1)) or m.group(1)}{m.group(2)}{m.group(3)}",
+        title,
+    )
+
+    return title
+
+
+def mark_paragraphs(soup):
+    # get_text() separates blocks only by whatever whitespace sits between
+    # the tags; a blank line after each one is what sentence_streamer reads
+    # as a paragraph break.
+    for tag in soup.find_all(PARAGRAPH_TAGS):
+        tag.append("\n\n")
+    return soup
+
+
+def strip_redundant_heading(title, content):
+    lines = content.strip().splitlines()
+    if not lines:
+        return content
+
+    first_line = lines[0].strip()
+    normalized_title = re.sub(r"\W+", "", title).lower()
+    normalized_first_line = re.sub(r"\W+", "", first_line).lower()
+
+    if (
+        normalized_first_line in normalized_title
+        or normalized_title in normalized_first_line
+    ):
+        return "\n".join(lines[1:]).strip()
+
+    if re.match(r"^(chapter\s*)?[ivxlcdm\d]+\.*$", first_line, re.IGNORECASE):
+        return "\n".join(lines[1:]).strip()
+
+    return content
+
+
+def extract_chapter_text(soup, start_id, next_id=None):
+    content = []
+    start_elem = soup.find(id=start_id)
+    if not start_elem:
+        return ""
+
+    current = (
+        start_elem.find_next_sibling()
+        if start_elem.name in ["h1", "h2", "h3"]
+        else start_elem
+    )
+    while current:
+        if next_id and current.get("id") == next_id:
+            break
+        if (
+            current.name in ["h1", "h2", "h3"]
+            and "chapter" in current.get_text().lower()
+        ):
+            break
+        content.append(current.get_text())
+        current = current.find_next_sibling()
+
+    return "\n".join(content).strip()
+
+
+def save_chapter_to_file(index, title, content, output_dir):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    safe_title = sanitize_filename(title)
+    file_name = f"{index:02d}_{safe_title}.txt"
+    file_path = os.path.join(output_dir, file_name)
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(f"{content}")
+
+
+WORDS_PER_MINUTE = 155
+TAG_RE = re.compile(rb"<[^>]+>")
+WORD_RE = re.compile(rb"\w+")
+
+
+class Chapter:
+    # Title and size estimates come from the raw XHTML; the text itself is
+    # only extracted when .content is first read.
+    def __init__(self, index, title, raw_title, extract, raw=b""):
+        self.index = index
+        self.title = title
+        self.raw_title = raw_title
+        self._extract = extract
+        self._raw = raw
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            text = PARAGRAPH_GAP.sub("\n\n", self._extract())
+            self._content = strip_redundant_heading(self.raw_title, text)
+            self._raw = None
+        return self._content
+
+    @property
+    def byte_length(self):
+        if self._content is not None:
+            return len(self._content.encode("utf-8"))
+        return len(TAG_RE.sub(b" ", self._raw))
+
+    @property
+    def word_count(self):
+        if self._content is not None:
+            return len(self._content.split())
+        return len(WORD_RE.findall(TAG_RE.sub(b" ", self._raw)))
+
+    @property
+    def estimated_seconds(self):
+        return self.word_count * 60 / WORDS_PER_MINUTE
+
+    def __getitem__(self, key):
+        # Older callers treat chapters as {"title", "content"} dicts.
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"Chapter({self.index}, {self.title!r}, ~{self.word_count} words)"
+
+
+def fragment_bytes(raw, fragment_id, next_fragment=None):
+    def offset(fragment, default):
+        match = re.search(rb"""id=["']%s["']""" % re.escape(fragment.encode("utf-8")), raw)
+        return max(0, raw.rfind(b"<", 0, match.start())) if match else default
+
+    start = offset(fragment_id, 0) if fragment_id else 0
+    end = offset(next_fragment, len(raw)) if next_fragment else len(raw)
+    return raw[start:end] if end > start else raw[start:]
+
+
+def parse_epub(epub_file):
+    if not os.path.exists(epub_file):
+        raise FileNotFoundError(f"EPUB file not found: {epub_file}")
+
+    book = epub.read_epub(epub_file)
+    documents = list(book.get_items_of_type(ITEM_DOCUMENT))
+    chapters = []
+
+    @lru_cache(maxsize=4)
+    def soup_for(doc):
+        return mark_paragraphs(BeautifulSoup(doc.get_content().decode("utf-8"), "html.parser"))
+
+    def add_chapter(title, extract, raw):
+        if raw and not WORD_RE.search(TAG_RE.sub(b" ", raw)):
+            return
+        chapters.append(
+            Chapter(len(chapters) + 1, convert_title_roman_numerals(title), title, extract, raw)
+        )
+
+    def process_toc_items(items, prefix=""):
+        for idx, item in enumerate(items):
+            if isinstance(item, tuple) and len(item) == 2:
+                part_title, children = item
+
+                if isinstance(part_title, epub.Link):
+                    part_title_str = part_title.title.strip()
+                elif isinstance(part_title, epub.Section):
+                    part_title_str = part_title.title.strip()
+                else:
+                    part_title_str = str(part_title).strip()
+
+                new_prefix = f"{prefix} - {part_title_str}".strip(" -")
+                process_toc_items(children, new_prefix)
+
+            elif isinstance(item, epub.Link):
+                title = item.title.strip()
+                if title.lower() in [
+                    "cover",
+                    "title page",
+                    "copyright",
+                ] or title.lower().startswith("by"):
+                    continue
+
+                full_title = f"{prefix} - {title}".strip(" -")
+
+                href_parts = item.href.split("#")
+                file_name = href_parts[0]
+                fragment_id = href_parts[1] if len(href_parts) > 1 else None
+
+                doc = next(
+                    (d for d in documents if d.file_name.endswith(file_name)),
+                    None,
+                )
+                if not doc:
+                    continue
+
+                next_fragment = None
+                for j in range(idx + 1, len(items)):
+                    if isinstance(items[j], epub.Link):
+                        next_parts = items[j].href.split("#")
+                        if next_parts[0] == file_name and len(next_parts) > 1:
+                            next_fragment = next_parts[1]
+                            break
+                        else:
+                            break
+
+                if fragment_id:
+                    def extract(doc=doc, fragment_id=fragment_id, next_fragment=next_fragment):
+                        return extract_chapter_text(soup_for(doc), fragment_id, next_fragment)
+                else:
+                    def extract(doc=doc):
+                        return soup_for(doc).get_text().strip()
+
+                raw = fragment_bytes(doc.get_content(), fragment_id, next_fragment)
+                add_chapter(full_title, extract, raw)
+
+    process_toc_items(book.toc)
+
+    if not chapters:
+        for doc in sorted(documents, key=lambda d: d.file_name):
+            soup = BeautifulSoup(doc.get_content().decode("utf-8"), "html.parser")
+            chapter_headers = soup.find_all(
+                ["h1", "h2", "h3"], string=re.compile(r"(chapter|book)", re.I)
+            )
+            mark_paragraphs(soup)
+
+            for header in chapter_headers:
+                content = []
+                for tag in header.find_next_siblings():
+                    if tag.name in ["h1", "h2", "h3"] and re.search(
+                        r"(chapter|book)", tag.get_text(), re.I
+                    ):
+                        break
+                    content.append(tag.get_text())
+                text = "\n".join(content).strip()
+                if text:
+                    add_chapter(header.get_text().strip(), lambda text=text: text, text.encode("utf-8"))
+
+    return chapters
+
+
+def parse_index_ranges(spec):
+    # "1-5, 8, 12-" -> predicate over 1-based chapter indices.
+    ranges = []
+    for part in filter(None, (p.strip() for p in str(spec).split(","))):
+        low, dash, high = part.partition("-")
+        low = int(low) if low.strip() else 1
+        high = (int(high) if high.strip() else None) if dash else low
+        ranges.append((low, high))
+    return lambda index: any(low <= index and (high is None or index <= high) for low, high in ranges)
+
+
+def select_chapters(chapters, pattern=None, exclude=None, indices=None, min_words=0):
+    # Rules only look at titles and raw size estimates, so nothing is
+    # extracted for chapters that are filtered out.
+    selected = chapters
+    if indices is not None:
+        if isinstance(indices, str):
+            in_range = parse_index_ranges(indices)
+        else:
+            wanted = set(indices)
+            in_range = wanted.__contains__
+        selected = [c for c in selected if in_range(c.index)]
+    if pattern:
+        selected = [c for c in selected if re.search(pattern, c.title, re.I)]
+    if exclude:
+        selected = [c for c in selected if not re.search(exclude, c.title, re.I)]
+    if min_words:
+        selected = [c for c in selected if c.word_count >= min_words]
+    return selected
+
+
+def extract_chapters_from_epub(
+    epub_file,
+    output_dir="chapters",
+    debug=False,
+    interactive=True,
+    **rules,
+):
+    parsed = parse_epub(epub_file)
+    chapters = select_chapters(parsed, **rules)
+
+    if debug:
+        print(f"\nExtracted {len(chapters)} chapters.")
+
+    if interactive:
+        return choose_and_save_chapters(chapters, output_dir, debug=debug, all_chapters=parsed)
+    save_chapters(chapters, output_dir, debug=debug, all_chapters=parsed)
+    return chapters
+
+
+def choose_and_save_chapters(chapters, output_dir, debug=False, all_chapters=None):
+    from InquirerPy import inquirer
+
+    choices = [
+        {
+            "name": f"{chapter.index:02d}. {chapter.title} (~{chapter.estimated_seconds / 60:.0f} min)",
+            "value": idx,
+            "enabled": False,
+        }
+        for idx, chapter in enumerate(chapters)
+    ]
+
+    selected_indices = inquirer.checkbox(
+        message="Select / Deselect chapters to save:",
+        choices=choices,
+        instruction="(Use space to select, enter to confirm)",
+    ).execute()
+
+    if not selected_indices:
+        print("No chapters selected. Exiting without saving.")
+        return []
+
+    selected = [chapters[idx] for idx in selected_indices]
+    save_chapters(selected, output_dir, debug=debug, all_chapters=all_chapters)
+    return selected
+
+
+def chapter_file_name(chapter):
+    # Numbered by position in the EPUB, not in the selection, so selecting
+    # or dropping one chapter leaves every other file name alone.
+    return f"{chapter['index']:03d}_{sanitize_filename(chapter['title'])}.txt"
+
+
+def save_chapters(chapters, output_dir, debug=False, all_chapters=None):
+    # all_chapters: every chapter parsed from the EPUB. Files of chapters
+    # that are in it but not selected are parked in deselected/, out of the
+    # render's way, and brought back untouched if selected again; only
+    # chapters gone from the EPUB are deleted.
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    parked_dir = os.path.join(output_dir, DESELECTED_DIR)
+    previous = load_manifest(manifest_path)
+    known = {chapter_file_name(c) for c in (chapters if all_chapters is None else all_chapters)}
+    manifest = {}
+
+    for chapter in chapters:
+        file_name = chapter_file_name(chapter)
+        file_path = os.path.join(output_dir, file_name)
+        parked_path = os.path.join(parked_dir, file_name)
+
+        text = chapter["title"] + "\n\n......\n\n" + chapter["content"]
+        manifest[file_name] = {"title": chapter["title"], "sha1": fingerprint(text)}
+
+        # Unchanged chapters keep their file untouched so downstream stages
+        # can reuse their audio and video.
+        if previous.get(file_name, {}).get("sha1") == manifest[file_name]["sha1"]:
+            if not os.path.exists(file_path) and os.path.exists(parked_path):
+                os.replace(parked_path, file_path)
+            if os.path.exists(file_path):
+                continue
+
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        if os.path.exists(parked_path):
+            os.remove(parked_path)
+
+        if debug:
+            print(f"Saved: {file_name}")
+
+    for file_name, entry in previous.items():
+        if file_name in manifest:
+            continue
+        stale_path = os.path.join(output_dir, file_name)
+        parked_path = os.path.join(parked_dir, file_name)
+        if file_name in known:
+            if os.path.exists(stale_path):
+                os.makedirs(parked_dir, exist_ok=True)
+                os.replace(stale_path, parked_path)
+            if os.path.exists(parked_path):
+                manifest[file_name] = dict(entry, selected=False)
+            continue
+        for path in (stale_path, parked_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    save_manifest(manifest_path, manifest)
+
+    changes = diff_chapter_manifests(previous, manifest)
+    if previous:
+        print(
+            f"Chapters: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+            f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged."
+        )
+    return changes
+
+
+def diff_chapter_manifests(previous, current):
+    # Deselected chapters are still listed, so they can be brought back
+    # unchanged, but count as removed.
+    previous = {name: entry for name, entry in previous.items() if entry.get("selected", True)}
+    current = {name: entry for name, entry in current.items() if entry.get("selected", True)}
+    changes = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for file_name, entry in current.items():
+        if file_name not in previous:
+            changes["added"].append(file_name)
+        elif previous[file_name].get("sha1") != entry["sha1"]:
+            changes["changed"].append(file_name)
+        else:
+            changes["unchanged"].append(file_name)
+    changes["removed"] = [name for name in previous if name not in current]
+    return changes
@@ -0,0 +1,108 @@
+import io
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from PIL import Image
+
+DECODED_CACHE_BYTES = 128 << 20
+# About 40 frames of 1080p RGB.
+SCALED_CACHE_BYTES = 256 << 20
+
+# Intermediates are deleted right after encoding, so favour write speed.
+FAST_PNG = {"compress_level": 1}
+
+
+class ByteLRU:
+    # Least recently used entries are dropped once their total size passes
+    # max_bytes; entries larger than that are not kept at all.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return value
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_decoded = ByteLRU(DECODED_CACHE_BYTES)
+_scaled_cache = ByteLRU(SCALED_CACHE_BYTES)
+
+
+def _read(path: str) -> tuple:
+    # Keyed on content, not mtime: a file rewritten within the filesystem's
+    # timestamp resolution is still picked up.
+    with open(path, "rb") as f:
+        data = f.read()
+    return hashlib.sha1(data).hexdigest(), data
+
+
+def _decode(digest: str, data: bytes, mode: str) -> Image.Image:
+    key = (digest, mode)
+    img = _decoded.get(key)
+    if img is None:
+        with Image.open(io.BytesIO(data)) as source:
+            source.load()
+            img = source.convert(mode)
+        _decoded.put(key, img, img.width * img.height * len(img.getbands()))
+    return img
+
+
+def _scaled(digest: str, data: bytes, mode: str, size: tuple) -> np.ndarray:
+    key = (digest, mode, size)
+    array = _scaled_cache.get(key)
+    if array is None:
+        img = _decode(digest, data, mode)
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        array = np.asarray(img)
+        array.setflags(write=False)
+        _scaled_cache.put(key, array, array.nbytes)
+    return array
+
+
+def image_size(path: str) -> tuple:
+    return _decode(*_read(path), "RGB").size
+
+
+def load_image(
+    path: str, size: tuple = None, height: int = None, mode: str = "RGB"
+) -> np.ndarray:
+    digest, data = _read(path)
+    if size is None:
+        width, source_height = _decode(digest, data, mode).size
+        if height is None:
+            size = (width, source_height)
+        else:
+            size = (int(height * width / source_height), height)
+    return _scaled(digest, data, mode, tuple(size))
+
+
+def clear_image_cache():
+    _decoded.clear()
+    _scaled_cache.clear()
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import queue
+import struct
+import argparse
+import threading
+import urllib.request
+import numpy as np
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils.audio_converter import SAMPLE_RATE, open_cache, synthesize_uncached
+from utils.audio_dsp import trim_silence
+from utils.sentence_streamer import stream_sentences
+from utils.tts_backends import get_backend
+from utils.tts_cache import default_cache_dir
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 50618
+PREFETCH_CHUNKS = 4
+CHUNK_PAUSE = 0.15
+PARAGRAPH_PAUSE = 0.6
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+_synthesis_lock = threading.Lock()
+
+
+def wav_stream_header(samplerate=SAMPLE_RATE, channels=1):
+    # Length fields are left at their maximum: players treat the stream as
+    # open-ended PCM and read until the connection closes.
+    bits = 16
+    byte_rate = samplerate * channels * bits // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, samplerate, byte_rate, channels * bits // 8, bits)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def to_pcm16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def book_path(library_dir, book):
+    # Only books directly inside the library are served.
+    library_dir = os.path.realpath(library_dir)
+    path = os.path.realpath(os.path.join(library_dir, book))
+    if os.path.dirname(path) != library_dir or not os.path.isdir(os.path.join(path, "chapters")):
+        raise FileNotFoundError(f"No book {book!r}")
+    return path
+
+
+def chapter_path(library_dir, book, chapter):
+    chapters_dir = os.path.join(book_path(library_dir, book), "chapters")
+    path = os.path.realpath(os.path.join(chapters_dir, f"{chapter}.txt"))
+    if os.path.dirname(path) != chapters_dir or not os.path.exists(path):
+        raise FileNotFoundError(f"No chapter {chapter!r} in {book!r}")
+    return path
+
+
+def list_chapters(library_dir, book):
+    chapters_dir = os.path.join(book_path(library_dir, book), "chapters")
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(chapters_dir) if f.endswith(".txt"))
+
+
+def synthesize_locked(text, voice, cache=None):
+    with _synthesis_lock:
+        return synthesize_uncached(text, voice, cache)[0]
+
+
+def narrate(
+    path, voice, cache, start=0, pause=CHUNK_PAUSE, paragraph_pause=PARAGRAPH_PAUSE, stop=None
+):
+    # Yields float32 audio blocks in reading order. A producer thread keeps up
+    # to PREFETCH_CHUNKS chunks synthesized ahead of what has been sent.
+    ahead = queue.Queue(maxsize=PREFETCH_CHUNKS)
+    stop = stop or threading.Event()
+    silence = np.zeros(int(pause * SAMPLE_RATE), dtype=np.float32)
+    paragraph_silence = np.zeros(int(paragraph_pause * SAMPLE_RATE), dtype=np.float32)
+
+    def put(item):
+        # Gives up once the listener has gone, instead of blocking on a full queue.
+        while not stop.is_set():
+            try:
+                ahead.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        first_chunk = None
+        try:
+            # Same paragraph-aware chunking as the batch render, so both
+            # share cached chunks.
+            for idx, (chunk, paragraph_end) in enumerate(stream_sentences(path, paragraphs=True)):
+                if idx < start:
+                    continue
+                if stop.is_set():
+                    return
+                # One lookup per chunk; misses are synthesized without a
+                # second one, so each is counted once.
+                cached = cache.get(chunk, voice) if cache is not None else None
+                sentences = [s.strip() for s in SENTENCE_END.split(chunk) if s.strip()]
+                if cached is not None:
+                    audio = trim_silence(cached, SAMPLE_RATE)
+                elif idx == start and len(sentences) > 1:
+                    # The first chunk is spoken sentence by sentence so audio
+                    # starts after one sentence rather than two or three,
+                    # with the usual pause between sentences. Its prosody
+                    # differs from a whole-chunk synthesis, so it is not cached.
+                    for k, sentence in enumerate(sentences):
+                        if k and not put(silence):
+                            return
+                        if not put(trim_silence(synthesize_locked(sentence, voice), SAMPLE_RATE)):
+                            return
+                    first_chunk = chunk
+                    audio = None
+                else:
+                    audio = trim_silence(synthesize_locked(chunk, voice, cache), SAMPLE_RATE)
+                if audio is not None and not put(audio):
+                    return
+                put(paragraph_silence if paragraph_end else silence)
+            # Once the rest has been sent, the first chunk is synthesized
+            # whole, with word timings, for a later batch render to reuse.
+            if first_chunk is not None and cache is not None:
+                synthesize_locked(first_chunk, voice, cache)
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = ahead.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class _NarrationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/chapters":
+                self._send_json(list_chapters(self.server.library_dir, params["book"]))
+            elif url.path == "/stream":
+                self._stream(params)
+            else:
+                self._send_json({"error": "not found"}, 404)
+        except (KeyError, ValueError, FileNotFoundError) as e:
+            self._send_json({"error": str(e)}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, params):
+        # Everything that can be refused is checked before the 200 goes out;
+        # once audio has started, an error can only cut the stream short.
+        book = params["book"]
+        path = chapter_path(self.server.library_dir, book, params["chapter"])
+        voice = params.get("voice", self.server.voice)
+        start = int(params.get("start", 0))
+        cache = self.server.cache_for(book)
+        try:
+            with _synthesis_lock:
+                get_backend().load_voice(voice)
+        except Exception as e:
+            raise ValueError(f"Unknown voice {voice!r}") from e
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        try:
+            self._write_chunk(wav_stream_header())
+            for audio in narrate(path, voice, cache, start=start):
+                if len(audio):
+                    self._write_chunk(to_pcm16(audio))
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as e:
+            # No terminating chunk: the client sees a truncated response.
+            print(f"❌ Narration of {book}/{params['chapter']} stopped: {e}")
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class NarrationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, library_dir=".", voice="af_heart"):
+        self.library_dir = library_dir
+        self.voice = voice
+        self._caches = {}
+        get_backend().load_voice(voice)
+        super().__init__(address, _NarrationHandler)
+
+    def cache_for(self, book):
+        # Same location and namespace as the batch render, so streamed chunks
+        # are reused when the full audiobook is produced.
+        if book not in self._caches:
+            self._caches[book] = open_cache(default_cache_dir(book_path(self.library_dir, book)))
+        return self._caches[book]
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, library_dir=".", voice="af_heart"):
+    with NarrationServer((host, port), library_dir, voice) as server:
+        print(f"🎧 Narration server on http://{host}:{port}/stream?book=<title>&chapter=<name>")
+        server.serve_forever()
+
+
+def benchmark(url, book, chapter, voice=None):
+    # First byte of audio is the first read past the 44-byte WAV header.
+    # Sustained real-time factor is wall time over audio delivered; below 1
+    # means playback never waits once started.
+    query = {"book": book, "chapter": chapter}
+    if voice:
+        query["voice"] = voice
+    started = time.perf_counter()
+    first_audio = None
+    received = 0
+    with urllib.request.urlopen(f"{url.rstrip('/')}/stream?{urlencode(query)}") as response:
+        response.read(44)
+        while True:
+            data = response.read1(65536)
+            if not data:
+                break
+            if first_audio is None:
+                first_audio = time.perf_counter() - started
+            received += len(data)
+    elapsed = time.perf_counter() - started
+    seconds = received / 2 / SAMPLE_RATE
+    print(f"Time to first audio: {first_audio or 0:.3f}s")
+    print(f"Audio streamed     : {seconds:.1f}s in {elapsed:.1f}s (RTF {elapsed / max(seconds, 1e-9):.3f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream narration of a chapter as it is synthesized.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve")
+    serve_cmd.add_argument("--host", default=DEFAULT_HOST)
+    serve_cmd.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_cmd.add_argument("--library", default=".", help="Directory holding <Title>/chapters/")
+    serve_cmd.add_argument("--voice", default="af_heart")
+    bench = sub.add_parser("bench", help="Measure first-audio latency and sustained RTF")
+    bench.add_argument("book")
+    bench.add_argument("chapter")
+    bench.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    bench.add_argument("--voice")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.library, args.voice)
+    else:
+        benchmark(args.url, args.book, args.chapter, args.voice)
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from utils.manifest import fingerprint, file_fingerprint
+from utils.sqlite_journal import journal_mode
+
+PHONEME_DB_ENV = "NARRATO_PHONEME_DB"
+LEXICON_ENV = "NARRATO_LEXICON"
+LRU_SIZE = 4096
+MAX_PHONEMES = 510
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def normalize_sentence(sentence):
+    return " ".join(sentence.split())
+
+
+def split_sentences(text):
+    return [s for s in (normalize_sentence(p) for p in SENTENCE_END.split(text)) if s]
+
+
+def load_lexicon(path):
+    # {"Levin": "lˈɛvɪn", ...}; entries apply to the word as written and in
+    # lower and title case.
+    with open(path, "r", encoding="utf-8") as f:
+        lexicon = json.load(f)
+    expanded = {}
+    for word, phonemes in lexicon.items():
+        for form in (word, word.lower(), word.title()):
+            expanded.setdefault(form, phonemes)
+    return expanded
+
+
+def pack_phonemes(phoneme_strings, limit=MAX_PHONEMES):
+    # Sentences are joined into the fewest model calls that fit the model's
+    # input limit; an oversized sentence is cut at word boundaries.
+    batch = ""
+    for ps in phoneme_strings:
+        pieces = [ps]
+        if len(ps) > limit:
+            pieces, current = [], ""
+            for word in ps.split(" "):
+                if current and len(current) + 1 + len(word) > limit:
+                    pieces.append(current)
+                    current = ""
+                current = f"{current} {word}".strip()[:limit]
+            if current:
+                pieces.append(current)
+        for piece in pieces:
+            if batch and len(batch) + 1 + len(piece) > limit:
+                yield batch
+                batch = ""
+            batch = f"{batch} {piece}" if batch else piece
+    if batch:
+        yield batch
+
+
+class PhonemeCache:
+    def __init__(self, g2p, db_path=None, maxsize=LRU_SIZE, lexicon_path=None, namespace=""):
+        self.g2p = g2p
+        self.maxsize = maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.g2p_seconds = 0.0
+        self.g2p_chars = 0
+        self.saved_chars = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lexicon = load_lexicon(lexicon_path) if lexicon_path else {}
+        lexicon_key = file_fingerprint(lexicon_path) if lexicon_path else ""
+        self.namespace = fingerprint(namespace, lexicon_key)
+        self._install_lexicon()
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            # Render workers on several nodes may share the store, so it
+            # picks its journal the same way as the work queue.
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute(f"PRAGMA journal_mode={journal_mode(db_path)}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS phonemes (key TEXT PRIMARY KEY, phonemes TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def _install_lexicon(self):
+        # Misaki consults its gold dictionary before anything else, so custom
+        # entries override both the built-in lexicon and the espeak fallback.
+        # Out-of-vocabulary words that reach the fallback are memoised per word.
+        lexicon = getattr(self.g2p, "lexicon", None)
+        if lexicon is not None and hasattr(lexicon, "golds"):
+            lexicon.golds.update(self.lexicon)
+
+        fallback = getattr(self.g2p, "fallback", None)
+        if fallback is not None:
+            words = {}
+
+            def cached_fallback(token):
+                if token.text not in words:
+                    words[token.text] = fallback(token)
+                return words[token.text]
+
+            self.g2p.fallback = cached_fallback
+
+    def _remember(self, key, phonemes):
+        self._lru[key] = phonemes
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def phonemize(self, sentence):
+        sentence = normalize_sentence(sentence)
+        key = fingerprint(self.namespace, sentence)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                self.saved_chars += len(sentence)
+                return self._lru[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT phonemes FROM phonemes WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    self.disk_hits += 1
+                    self.saved_chars += len(sentence)
+                    self._remember(key, row[0])
+                    return row[0]
+
+        started = time.perf_counter()
+        phonemes, _ = self.g2p(sentence)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.misses += 1
+            self.g2p_seconds += elapsed
+            self.g2p_chars += len(sentence)
+            self._remember(key, phonemes)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO phonemes (key, phonemes) VALUES (?, ?)", (key, phonemes)
+                )
+                self._db.commit()
+        return phonemes
+
+    def batches(self, text):
+        return pack_phonemes(self.phonemize(s) for s in split_sentences(text))
+
+    @property
+    def seconds_saved(self):
+        # Estimated from the measured G2P cost per character of actual misses.
+        if not self.g2p_chars:
+            return 0.0
+        return self.saved_chars * self.g2p_seconds / self.g2p_chars
+
+    def summary(self):
+        return (
+            f"🔤 G2P: {self.hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses; "
+            f"{self.g2p_seconds:.1f}s phonemizing, ~{self.seconds_saved:.1f}s saved"
+        )
+
+
+def create_phoneme_cache(g2p, namespace=""):
+    return PhonemeCache(
+        g2p,
+        db_path=os.getenv(PHONEME_DB_ENV),
+        lexicon_path=os.getenv(LEXICON_ENV),
+        namespace=namespace,
+    )
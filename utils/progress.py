@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils.manifest import save_manifest
+
+STATUS_FILE_ENV = "NARRATO_STATUS_FILE"
+STATUS_PORT_ENV = "NARRATO_STATUS_PORT"
+WRITE_INTERVAL = 2.0
+# Weight of the newest rate sample in the rolling average.
+RATE_SMOOTHING = 0.2
+MAX_ERRORS = 20
+
+
+class Stage:
+    def __init__(self, name, total, unit):
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.started = time.monotonic()
+        self.rate = None
+        self._sample_at = self.started
+        self._sample_done = 0
+
+    def sample(self, now):
+        # Rate is re-estimated at most once per write interval, so the
+        # average follows slowdowns without jittering per item.
+        elapsed = now - self._sample_at
+        if elapsed <= 0 or self.done == self._sample_done:
+            return
+        rate = (self.done - self._sample_done) / elapsed
+        self.rate = rate if self.rate is None else (
+            RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+        )
+        self._sample_at, self._sample_done = now, self.done
+
+    @property
+    def eta(self):
+        if self.total is None:
+            return None
+        remaining = max(0, self.total - self.done)
+        if not remaining:
+            return 0.0
+        return remaining / self.rate if self.rate else None
+
+    def snapshot(self):
+        return {
+            "done": self.done,
+            "total": self.total,
+            "unit": self.unit,
+            "percent": round(100 * self.done / self.total, 1) if self.total else None,
+            "rate_per_second": round(self.rate, 3) if self.rate else None,
+            "elapsed_seconds": round(time.monotonic() - self.started, 1),
+            "eta_seconds": round(self.eta, 1) if self.eta is not None else None,
+        }
+
+
+class ProgressTracker:
+    # advance() only bumps counters; rates, ETAs and the status file are
+    # refreshed at most every WRITE_INTERVAL seconds, so calling it from the
+    # synthesis and frame loops costs next to nothing.
+    def __init__(self, status_path=None, interval=WRITE_INTERVAL):
+        self.status_path = status_path
+        self.interval = interval
+        self.stages = {}
+        self.errors = []
+        self.tts_seconds = 0.0
+        self.tts_audio_seconds = 0.0
+        self.on_update = None
+        self._next_write = 0.0
+        self._lock = threading.Lock()
+
+    def start_stage(self, name, total=None, unit="items"):
+        with self._lock:
+            self.stages[name] = Stage(name, total, unit)
+        self.flush()
+
+    def advance(self, name, count=1):
+        stage = self.stages.get(name)
+        if stage is None:
+            return
+        stage.done += count
+        if time.monotonic() >= self._next_write:
+            self.flush()
+
+    def record_synthesis(self, work_seconds, audio_seconds):
+        self.tts_seconds += work_seconds
+        self.tts_audio_seconds += audio_seconds
+
+    def error(self, name, message):
+        with self._lock:
+            self.errors.append({"stage": name, "message": str(message), "time": time.time()})
+            del self.errors[:-MAX_ERRORS]
+        self.flush()
+
+    def finish_stage(self, name):
+        stage = self.stages.get(name)
+        if stage is not None and stage.total is None:
+            stage.total = stage.done
+        self.flush()
+
+    @property
+    def real_time_factor(self):
+        if not self.tts_audio_seconds:
+            return None
+        return self.tts_seconds / self.tts_audio_seconds
+
+    def snapshot(self):
+        stages = {name: stage.snapshot() for name, stage in self.stages.items()}
+        etas = [stage["eta_seconds"] for stage in stages.values()]
+        rtf = self.real_time_factor
+        return {
+            "updated": time.time(),
+            "stages": stages,
+            # Unknown while any stage has no rate yet.
+            "eta_seconds": None if None in etas else round(sum(etas), 1),
+            "tts_real_time_factor": round(rtf, 3) if rtf else None,
+            "errors": self.errors,
+        }
+
+    def line(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            return ""
+        total = f"/{stage.total}" if stage.total is not None else ""
+        eta = stage.eta
+        eta_text = f", ETA {format_duration(eta)}" if eta else ""
+        return f"{stage.done}{total} {stage.unit}{eta_text}"
+
+    def flush(self):
+        with self._lock:
+            now = time.monotonic()
+            self._next_write = now + self.interval
+            for stage in self.stages.values():
+                stage.sample(now)
+            if self.status_path:
+                save_manifest(self.status_path, self.snapshot())
+        if self.on_update:
+            self.on_update()
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02}m" if hours else f"{minutes}m{seconds:02}s"
+
+
+_tracker = ProgressTracker(os.getenv(STATUS_FILE_ENV))
+
+
+def get_tracker():
+    return _tracker
+
+
+def set_status_path(path):
+    # An explicit NARRATO_STATUS_FILE wins over the per-book default.
+    if not os.getenv(STATUS_FILE_ENV):
+        _tracker.status_path = path
+
+
+def follow(spinner, prefix, stage):
+    # Keeps a yaspin spinner showing the stage's count and ETA.
+    _tracker.on_update = lambda: setattr(spinner, "text", f"{prefix} {_tracker.line(stage)}")
+
+
+def frame_logger(stage="frames"):
+    # MoviePy reports encoding through proglog; only frame counts are kept.
+    from proglog import ProgressBarLogger
+
+    class FrameLogger(ProgressBarLogger):
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if bar == "frame_index" and attr == "index":
+                _tracker.advance(stage, value - (old_value or 0))
+
+    return FrameLogger()
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(_tracker.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_status(port=None, host="127.0.0.1"):
+    port = port or int(os.getenv(STATUS_PORT_ENV, "0"))
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _StatusHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Progress at http://{host}:{port}/")
+    return server
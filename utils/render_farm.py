@@ -0,0 +1,505 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import traceback
+from contextlib import contextmanager
+from utils.tts_cache import default_cache_dir
+from utils.chapter_index import build_chapter_index, list_chapter_names
+from utils.sqlite_journal import journal_mode
+
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 30
+POLL_SECONDS = 2.0
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book_dir TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_dir TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    chapter TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS tasks_book ON tasks (book_dir, kind);
+"""
+
+# A book moves through these stages; the coordinator enqueues the next
+# stage's tasks once every task of the current one is done.
+STAGE_KINDS = {
+    "audio": ("intro", "tts"),
+    "video": ("intro_video", "video"),
+    "merge": ("merge",),
+}
+
+
+class WorkQueue:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode(db_path)}")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers can never
+        # select and lease the same row.
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def enqueue(self, book_dir, kind, payload=None, chapter=None):
+        self.conn.execute(
+            "INSERT INTO tasks (book_dir, kind, chapter, payload, updated) VALUES (?, ?, ?, ?, ?)",
+            (book_dir, kind, chapter, json.dumps(payload or {}), time.time()),
+        )
+
+    def claim(self, worker, kinds=None):
+        kind_filter = ""
+        params = []
+        if kinds:
+            kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params = list(kinds)
+        while True:
+            now = time.time()
+            with self.transaction() as conn:
+                row = conn.execute(
+                    "SELECT * FROM tasks WHERE (status = 'pending' "
+                    "OR (status = 'leased' AND lease_until < ?))" + kind_filter +
+                    " ORDER BY id LIMIT 1",
+                    [now] + params,
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["status"] == "leased" and row["attempts"] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE tasks SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                        (f"lease held by {row['worker']} expired", now, row["id"]),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker, now + LEASE_SECONDS, now, row["id"]),
+                )
+                return dict(row, worker=worker, attempts=row["attempts"] + 1)
+
+    def heartbeat(self, task_id, worker):
+        now = time.time()
+        cur = self.conn.execute(
+            "UPDATE tasks SET lease_until = ?, updated = ? "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (now + LEASE_SECONDS, now, task_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, task_id, worker):
+        cur = self.conn.execute(
+            "UPDATE tasks SET status = 'done', lease_until = NULL, updated = ? "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (time.time(), task_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, task_id, worker, error):
+        self.conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, error = ?, updated = ? "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (MAX_ATTEMPTS, error, time.time(), task_id, worker),
+        )
+
+    def book_config(self, book_dir):
+        row = self.conn.execute(
+            "SELECT config FROM books WHERE book_dir = ?", (book_dir,)
+        ).fetchone()
+        return json.loads(row["config"]) if row else None
+
+    def status(self):
+        return self.conn.execute(
+            "SELECT books.book_dir, books.stage, tasks.status, COUNT(tasks.id) AS n "
+            "FROM books LEFT JOIN tasks ON tasks.book_dir = books.book_dir "
+            "GROUP BY books.book_dir, tasks.status ORDER BY books.book_dir"
+        ).fetchall()
+
+
+def book_paths(book_dir):
+    return {
+        "chapters": os.path.join(book_dir, "chapters"),
+        "audio": os.path.join(book_dir, "audio"),
+        "cache": default_cache_dir(book_dir),
+    }
+
+
+def chapter_names(book_dir):
+    return list_chapter_names(book_paths(book_dir)["chapters"])
+
+
+def submit_book(queue, book_dir, metadata, voice, **options):
+    book_dir = os.path.abspath(book_dir)
+    config = {
+        "metadata": metadata,
+        "voice": voice,
+        "cover_path": options.get("cover_path"),
+        "render_video": options.get("render_video", False),
+        "chunk_pause": options.get("chunk_pause", 0.0),
+        "chapter_pause": options.get("chapter_pause", 0.0),
+        "paragraph_pause": options.get("paragraph_pause"),
+        "target_lufs": options.get("target_lufs"),
+        "dialogue_voices": options.get("dialogue_voices"),
+        "music_path": options.get("music_path"),
+        "min_images": options.get("min_images", 1),
+        "max_images": options.get("max_images", 12),
+        "image_budget": options.get("image_budget"),
+    }
+    chapters = chapter_names(book_dir)
+    with queue.transaction() as conn:
+        conn.execute("DELETE FROM tasks WHERE book_dir = ?", (book_dir,))
+        conn.execute(
+            "INSERT OR REPLACE INTO books (book_dir, config, stage, updated) VALUES (?, ?, 'audio', ?)",
+            (book_dir, json.dumps(config), time.time()),
+        )
+        queue.enqueue(book_dir, "intro")
+        for chapter in chapters:
+            queue.enqueue(book_dir, "tts", chapter=chapter)
+    print(f"📦 Queued {len(chapters)} chapters of {metadata['Title']}")
+    return len(chapters)
+
+
+def advance_books(queue):
+    books = queue.conn.execute(
+        "SELECT book_dir, stage FROM books WHERE stage IN ('audio', 'video', 'merge')"
+    ).fetchall()
+    for book in books:
+        book_dir, stage = book["book_dir"], book["stage"]
+        kinds = STAGE_KINDS[stage]
+        counts = dict(queue.conn.execute(
+            f"SELECT status, COUNT(*) FROM tasks WHERE book_dir = ? "
+            f"AND kind IN ({', '.join('?' * len(kinds))}) GROUP BY status",
+            (book_dir, *kinds),
+        ).fetchall())
+        if counts.get("failed"):
+            next_stage = "failed"
+        elif set(counts) - {"done"}:
+            continue
+        elif stage == "audio":
+            next_stage = "video" if queue.book_config(book_dir)["render_video"] else "merge"
+        elif stage == "video":
+            next_stage = "merge"
+        else:
+            next_stage = "done"
+
+        # Image counts depend on every chapter's duration, so they are only
+        # planned here, after all audio exists.
+        image_counts = {}
+        if next_stage == "video":
+            from utils.video_generator import plan_book_images
+
+            config = queue.book_config(book_dir)
+            image_counts = plan_book_images(
+                [f"{chapter}.txt" for chapter in chapter_names(book_dir)],
+                book_paths(book_dir)["audio"],
+                min_images=config["min_images"],
+                max_images=config["max_images"],
+                image_budget=config["image_budget"],
+            )
+
+        with queue.transaction() as conn:
+            moved = conn.execute(
+                "UPDATE books SET stage = ?, updated = ? WHERE book_dir = ? AND stage = ?",
+                (next_stage, time.time(), book_dir, stage),
+            ).rowcount
+            if not moved:
+                continue
+            if next_stage == "video":
+                queue.enqueue(book_dir, "intro_video")
+                for chapter in chapter_names(book_dir):
+                    queue.enqueue(
+                        book_dir, "video", {"num_images": image_counts.get(chapter, 1)}, chapter
+                    )
+            elif next_stage == "merge":
+                queue.enqueue(book_dir, "merge")
+        print(f"📚 {os.path.basename(book_dir)}: {stage} -> {next_stage}")
+
+
+def coordinate(db_path, poll=POLL_SECONDS, once=False):
+    queue = WorkQueue(db_path)
+    while True:
+        advance_books(queue)
+        if once:
+            return
+        time.sleep(poll)
+
+
+def run_intro(book_dir, config, task, payload):
+    from utils.audio_converter import process_introduction_audio
+
+    paths = book_paths(book_dir)
+    process_introduction_audio(
+        config["metadata"], paths["audio"], config["voice"], cache_dir=paths["cache"]
+    )
+
+
+def run_tts(book_dir, config, task, payload):
+    from utils.audio_converter import open_cache, render_chapter_audio
+
+    paths = book_paths(book_dir)
+    render_chapter_audio(
+        os.path.join(paths["chapters"], f"{task['chapter']}.txt"),
+        paths["audio"],
+        config["voice"],
+        chunk_pause=config["chunk_pause"],
+        chapter_pause=config["chapter_pause"],
+        target_lufs=config["target_lufs"],
+        dialogue_voices=config["dialogue_voices"],
+        cache=open_cache(paths["cache"]),
+        paragraph_pause=config.get("paragraph_pause"),
+    )
+
+
+def book_cover(book_dir, config):
+    # A local EPUB submitted without --cover gets a title card instead.
+    if config["cover_path"]:
+        return config["cover_path"]
+    from utils.video_generator import placeholder_cover
+
+    return placeholder_cover(config["metadata"]["Title"], os.path.join(book_dir, "cover.png"))
+
+
+def run_intro_video(book_dir, config, task, payload):
+    from utils.audio_converter import format_name
+    from utils.video_generator import generate_intro_video
+
+    generate_intro_video(
+        book_title=config["metadata"]["Title"],
+        book_author=format_name(config["metadata"]["Author"]),
+        book_image=book_cover(book_dir, config),
+        audio_path=os.path.join(book_paths(book_dir)["audio"], "introduction.wav"),
+    )
+
+
+def run_video(book_dir, config, task, payload):
+    from utils.audio_converter import format_name
+    from utils.video_generator import render_chapter_video
+
+    paths = book_paths(book_dir)
+    render_chapter_video(
+        os.path.join(paths["chapters"], f"{task['chapter']}.txt"),
+        paths["audio"],
+        paths["audio"],
+        book_cover(book_dir, config),
+        config["metadata"]["Title"],
+        format_name(config["metadata"]["Author"]),
+        payload["num_images"],
+        memory_limit_mb=int(os.getenv("NARRATO_RENDER_MEMORY_MB", "0")) or None,
+        captions=os.getenv("NARRATO_BURN_CAPTIONS") == "1",
+    )
+
+
+def run_merge(book_dir, config, task, payload):
+    from utils.audio_merger import merge_audio_files
+    from utils.subtitle_generator import merge_srt_files
+    from utils.video_generator import merge_video_files
+
+    index = build_chapter_index(book_dir, chapter_names(book_dir), book_paths(book_dir)["audio"])
+    merge_audio_files(
+        output_file=os.path.join(book_dir, "audiobook.wav"),
+        audio_files=[entry.audio for entry in index],
+        target_lufs=config["target_lufs"],
+        music_path=config["music_path"],
+    )
+    merge_srt_files(
+        srt_paths=[entry.srt for entry in index],
+        audio_paths=[entry.audio for entry in index],
+        output_path=os.path.join(book_dir, "audiobook.srt"),
+        vtt_path=os.path.join(book_dir, "audiobook.vtt"),
+        durations=[entry.duration for entry in index],
+    )
+    if config["render_video"]:
+        from utils.audio_converter import format_name
+        from utils.youtube_export import export_youtube_chapters
+
+        video_chapters = [entry for entry in index if os.path.exists(entry.video)]
+        _, chapters_metadata = export_youtube_chapters(
+            video_chapters,
+            book_dir,
+            config["metadata"]["Title"],
+            format_name(config["metadata"]["Author"]),
+        )
+        merge_video_files(
+            [entry.video for entry in video_chapters],
+            os.path.join(book_dir, "audiobook.mp4"),
+            chapters_metadata=chapters_metadata,
+        )
+
+
+HANDLERS = {
+    "intro": run_intro,
+    "tts": run_tts,
+    "intro_video": run_intro_video,
+    "video": run_video,
+    "merge": run_merge,
+}
+
+
+def _keep_leased(db_path, task_id, worker, done, lost):
+    queue = WorkQueue(db_path)
+    while not done.wait(HEARTBEAT_SECONDS):
+        if not queue.heartbeat(task_id, worker):
+            lost.set()
+            return
+
+
+def run_worker(db_path, worker=None, kinds=None, poll=POLL_SECONDS, idle_exit=None):
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(db_path)
+    idle_since = time.time()
+    print(f"🛠️ Worker {worker} polling {db_path}")
+    while True:
+        task = queue.claim(worker, kinds)
+        if task is None:
+            if idle_exit is not None and time.time() - idle_since >= idle_exit:
+                return
+            time.sleep(poll)
+            continue
+
+        label = f"{task['kind']} {task['chapter'] or ''}".strip()
+        print(f"▶️ [{worker}] {os.path.basename(task['book_dir'])}: {label} (attempt {task['attempts']})")
+        done, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(
+            target=_keep_leased, args=(db_path, task["id"], worker, done, lost), daemon=True
+        )
+        beat.start()
+        try:
+            config = queue.book_config(task["book_dir"])
+            HANDLERS[task["kind"]](task["book_dir"], config, task, json.loads(task["payload"]))
+        except Exception as e:
+            print(f"❌ [{worker}] {label} failed: {e}")
+            queue.fail(task["id"], worker, traceback.format_exc())
+        else:
+            if lost.is_set() or not queue.complete(task["id"], worker):
+                print(f"⚠️ [{worker}] lease on {label} was lost; result left for the new owner.")
+        finally:
+            done.set()
+            beat.join()
+        idle_since = time.time()
+
+
+def epub_metadata(epub_file):
+    from ebooklib import epub
+
+    book = epub.read_epub(epub_file)
+
+    def first(name):
+        values = book.get_metadata("DC", name)
+        return values[0][0].strip() if values else "Unknown"
+
+    return {"Title": first("title"), "Author": first("creator"), "Translator": "None"}
+
+
+def print_status(db_path):
+    rows = WorkQueue(db_path).status()
+    current = None
+    for row in rows:
+        if row["book_dir"] != current:
+            current = row["book_dir"]
+            print(f"\n{os.path.basename(current)} [{row['stage']}]")
+        if row["status"]:
+            print(f"  {row['status']:>8}: {row['n']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed audiobook rendering over a shared SQLite queue.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    submit = sub.add_parser("submit", help="Extract a book's chapters and queue it")
+    submit.add_argument("db")
+    submit.add_argument("source", help="Project Gutenberg book URL or local .epub")
+    submit.add_argument("--library", default=".", help="Shared directory books are rendered into")
+    submit.add_argument("--voice", default="af_heart")
+    submit.add_argument("--cover", help="Cover image for a local .epub")
+    submit.add_argument("--video", action="store_true", help="Also render chapter videos")
+    submit.add_argument("--chapters", help="Index ranges to keep, e.g. 1-5,8")
+    submit.add_argument("--min-words", type=int, default=0)
+    submit.add_argument("--music")
+
+    worker_cmd = sub.add_parser("worker", help="Claim and run tasks")
+    worker_cmd.add_argument("db")
+    worker_cmd.add_argument("--id")
+    worker_cmd.add_argument("--kinds", help=f"Comma-separated subset of {', '.join(HANDLERS)}")
+    worker_cmd.add_argument("--idle-exit", type=float, help="Exit after this many idle seconds")
+
+    coordinator = sub.add_parser("coordinate", help="Advance books through their stages")
+    coordinator.add_argument("db")
+    coordinator.add_argument("--once", action="store_true")
+
+    status = sub.add_parser("status")
+    status.add_argument("db")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        from utils.ebook_parser import extract_chapters_from_epub
+
+        cover_path = args.cover
+        if args.source.startswith("http"):
+            from utils.downloader import get_gutenberg_metadata_epub
+
+            metadata, epub_file, cover_path = get_gutenberg_metadata_epub(
+                args.source, os.path.join(args.library, "ebooks")
+            )
+        else:
+            epub_file = args.source
+            metadata = epub_metadata(epub_file)
+        book_dir = os.path.join(args.library, metadata["Title"])
+        extract_chapters_from_epub(
+            epub_file,
+            output_dir=os.path.join(book_dir, "chapters"),
+            interactive=False,
+            indices=args.chapters,
+            min_words=args.min_words,
+        )
+        submit_book(
+            WorkQueue(args.db),
+            book_dir,
+            metadata,
+            args.voice,
+            cover_path=cover_path and os.path.abspath(cover_path),
+            render_video=args.video,
+            chunk_pause=0.15,
+            paragraph_pause=0.6,
+            chapter_pause=1.5,
+            target_lufs=-16.0,
+            music_path=args.music and os.path.abspath(args.music),
+        )
+    elif args.command == "worker":
+        run_worker(
+            args.db,
+            args.id,
+            [k.strip() for k in args.kinds.split(",")] if args.kinds else None,
+            idle_exit=args.idle_exit,
+        )
+    elif args.command == "coordinate":
+        coordinate(args.db, once=args.once)
+    else:
+        print_status(args.db)
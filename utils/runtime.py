@@ -0,0 +1,192 @@
+import os
+import time
+import argparse
+import platform
+import subprocess
+from functools import lru_cache
+
+ENCODER_ENV = "NARRATO_VIDEO_ENCODER"
+THREADS_ENV = "NARRATO_THREADS"
+
+# Fastest first; a hardware encoder is only chosen after a test encode
+# succeeds, since ffmpeg builds list encoders the machine cannot run.
+H264_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox", "libx264")
+
+# x264 preset names mapped onto each encoder's own scale.
+ENCODER_PRESETS = {
+    "h264_nvenc": {
+        "ultrafast": "p1", "superfast": "p1", "veryfast": "p2", "faster": "p3", "fast": "p3",
+        "medium": "p4", "slow": "p5", "slower": "p6", "veryslow": "p7",
+    },
+    "h264_qsv": {"ultrafast": "veryfast", "superfast": "veryfast"},
+    "h264_videotoolbox": {},
+}
+
+
+def ffmpeg_binary():
+    from moviepy.config import FFMPEG_BINARY
+
+    return FFMPEG_BINARY
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_encoders() -> frozenset:
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-encoders"], capture_output=True, text=True
+    )
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # " V....D libx264   description"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            names.add(parts[1])
+    return frozenset(names)
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_filters() -> frozenset:
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-filters"], capture_output=True, text=True
+    )
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # " ... ass               V->V       description"
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def captions_supported() -> bool:
+    return "ass" in ffmpeg_filters()
+
+
+@lru_cache(maxsize=None)
+def encoder_works(codec: str) -> bool:
+    if codec not in ffmpeg_encoders():
+        return False
+    result = subprocess.run(
+        [
+            ffmpeg_binary(), "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=black:size=256x256:rate=24:duration=0.2",
+            "-pix_fmt", "yuv420p", "-c:v", codec, "-f", "null", "-",
+        ],
+        capture_output=True,
+    )
+    return result.returncode == 0
+
+
+@lru_cache(maxsize=None)
+def video_encoder() -> str:
+    forced = os.getenv(ENCODER_ENV)
+    if forced:
+        return forced
+    return next((codec for codec in H264_ENCODERS if encoder_works(codec)), "libx264")
+
+
+def encoder_preset(codec: str, preset: str) -> str:
+    return ENCODER_PRESETS.get(codec, {}).get(preset, preset)
+
+
+@lru_cache(maxsize=None)
+def cpu_count() -> int:
+    if os.getenv(THREADS_ENV):
+        return int(os.getenv(THREADS_ENV))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def cpu_flags() -> frozenset:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return frozenset(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return frozenset()
+
+
+@lru_cache(maxsize=None)
+def torch_device() -> str:
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def configure_torch():
+    # Called by the torch backend when it loads the model, so other stages
+    # never import torch just to learn the device.
+    import torch
+
+    device = torch_device()
+    if device == "cpu":
+        torch.set_num_threads(cpu_count())
+    return device
+
+
+@lru_cache(maxsize=None)
+def get_capabilities() -> dict:
+    flags = cpu_flags()
+    return {
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "cpu_features": sorted(
+            f for f in ("sse4_2", "avx", "avx2", "fma", "avx512f", "avx512_vnni", "avx_vnni", "neon", "asimd")
+            if f in flags
+        ),
+        "h264_encoders": [codec for codec in H264_ENCODERS if encoder_works(codec)],
+        "video_encoder": video_encoder(),
+        "libass": captions_supported(),
+    }
+
+
+def describe():
+    capabilities = dict(get_capabilities())
+    try:
+        capabilities["torch_device"] = torch_device()
+    except ImportError:
+        capabilities["torch_device"] = None
+    for key, value in capabilities.items():
+        print(f"{key:>14}: {', '.join(value) if isinstance(value, list) else value}")
+
+
+def benchmark(seconds=10, size="1920x1080", presets=("ultrafast", "medium")):
+    # Encodes a synthetic 24 fps source with every working encoder, preset
+    # and thread count; speed is frames encoded per wall-clock second.
+    thread_counts = sorted({1, max(1, cpu_count() // 2), cpu_count()})
+    print(f"{'encoder':>18} {'preset':>10} {'threads':>7} {'fps':>8}")
+    for codec in get_capabilities()["h264_encoders"]:
+        for preset in presets:
+            for threads in thread_counts:
+                started = time.perf_counter()
+                subprocess.run(
+                    [
+                        ffmpeg_binary(), "-hide_banner", "-loglevel", "error",
+                        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=24:duration={seconds}",
+                        "-pix_fmt", "yuv420p", "-c:v", codec,
+                        "-preset", encoder_preset(codec, preset), "-threads", str(threads),
+                        "-f", "null", "-",
+                    ],
+                    check=True,
+                )
+                fps = seconds * 24 / (time.perf_counter() - started)
+                print(f"{codec:>18} {preset:>10} {threads:>7} {fps:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show detected runtime capabilities.")
+    parser.add_argument("--bench", action="store_true", help="Benchmark encoder, preset and thread combinations")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--size", default="1920x1080")
+    args = parser.parse_args()
+
+    describe()
+    if args.bench:
+        benchmark(args.seconds, args.size)
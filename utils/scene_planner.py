@@ -0,0 +1,119 @@
+import os
+import bisect
+from typing import NamedTuple
+from utils.subtitle_generator import Cue, iter_srt_cues
+from utils.timing_store import Timings
+
+SECONDS_PER_IMAGE = 120
+MIN_IMAGES = 1
+MAX_IMAGES = 12
+EXCERPT_CHARS = 1500
+
+
+class Scene(NamedTuple):
+    start: float
+    end: float
+    excerpt: str
+
+
+def ideal_image_count(
+    duration: float,
+    min_images: int = MIN_IMAGES,
+    max_images: int = MAX_IMAGES,
+    seconds_per_image: float = SECONDS_PER_IMAGE,
+) -> int:
+    return max(min_images, min(max_images, round(duration / seconds_per_image)))
+
+
+def allocate_images(
+    durations: dict,
+    min_images: int = MIN_IMAGES,
+    max_images: int = MAX_IMAGES,
+    budget: int = None,
+    seconds_per_image: float = SECONDS_PER_IMAGE,
+) -> dict:
+    counts = {
+        name: ideal_image_count(duration, min_images, max_images, seconds_per_image)
+        for name, duration in durations.items()
+    }
+    if budget is None:
+        return counts
+
+    # Over budget: repeatedly take an image from the chapter whose images
+    # currently cover the least audio, so long chapters keep theirs longest.
+    while sum(counts.values()) > budget:
+        candidates = [name for name, count in counts.items() if count > min_images]
+        if not candidates:
+            print(
+                f"⚠️ Image budget {budget} is below {min_images} per chapter, "
+                f"using {sum(counts.values())} images."
+            )
+            break
+        name = min(candidates, key=lambda n: durations[n] / counts[n])
+        counts[name] -= 1
+    return counts
+
+
+def bounded_excerpt(lines: list[str], limit: int = EXCERPT_CHARS) -> str:
+    text = " ".join(lines)
+    if len(text) <= limit:
+        return text
+    # Evenly spaced cues stand in for the whole window, so the prompt size
+    # stays fixed however long the scene runs.
+    keep = max(1, len(lines) * limit // len(text))
+    step = len(lines) / keep
+    sampled = [lines[int(i * step)] for i in range(keep)]
+    return " … ".join(sampled)[:limit]
+
+
+def plan_scenes(cues, duration: float, count: int, excerpt_chars: int = EXCERPT_CHARS) -> list[Scene]:
+    cues = list(cues)
+    starts = [cue.start for cue in cues]
+    span = duration / count
+
+    # Scene cuts snap to the nearest sentence start, so an image never
+    # changes mid-sentence.
+    boundaries = [0.0]
+    for k in range(1, count):
+        target = k * span
+        i = bisect.bisect_left(starts, target)
+        nearby = [starts[j] for j in (i - 1, i) if 0 <= j < len(starts)]
+        cut = min(nearby, key=lambda s: abs(s - target)) if nearby else target
+        if cut <= boundaries[-1] or abs(cut - target) > span / 2:
+            cut = target
+        boundaries.append(cut)
+    boundaries.append(duration)
+
+    scenes = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        lo = bisect.bisect_left(starts, start)
+        hi = bisect.bisect_left(starts, end)
+        lines = [cue.text.replace("\n", " ") for cue in cues[lo:hi]]
+        scenes.append(Scene(start, end, bounded_excerpt(lines, excerpt_chars)))
+    return scenes
+
+
+def estimate_cues(text: str, duration: float) -> list[Cue]:
+    # Without subtitles, paragraphs are timed by their share of the characters.
+    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
+    total = sum(len(p) for p in paragraphs) or 1
+    cues, offset = [], 0
+    for paragraph in paragraphs:
+        start = duration * offset / total
+        offset += len(paragraph)
+        cues.append(Cue(start, duration * offset / total, paragraph))
+    return cues
+
+
+def plan_chapter_scenes(
+    srt_path: str, chapter_text: str, duration: float, count: int, timings_path: str = None
+) -> list[Scene]:
+    # Whole chunks from the timing store beat SRT lines: cuts land on chunk
+    # starts and nothing has to be parsed.
+    if timings_path and os.path.exists(timings_path):
+        cues = [Cue(*row) for row in Timings.load(timings_path).rows()]
+    elif os.path.exists(srt_path):
+        cues = iter_srt_cues(srt_path)
+    else:
+        cues = estimate_cues(chapter_text, duration)
+    return plan_scenes(cues, duration, count)
@@ -1,31 +1,65 @@
-import re
-import random
-
-def stream_sentences(filepath):
-    sentence_endings = re.compile(r'(?<=[.!?])\s+')
-    sentence_buffer = []
-
-    with open(filepath, 'r', encoding='utf-8') as file:
-        buffer = ""
-        for line in file:
-            buffer += ' ' + line.strip()
-            sentences = sentence_endings.split(buffer)
-
-            if re.search(r'[.!?]["\']?\s*$', buffer):
-                buffer = ""
-            else:
-                buffer = sentences.pop() if sentences else ""
-
-            sentence_buffer.extend(sentences)
-
-            while len(sentence_buffer) >= 2:
-                chunk_size = min(random.choice([2, 3]), len(sentence_buffer))
-                chunk = ' '.join(sentence_buffer[:chunk_size])
-                yield chunk
-                sentence_buffer = sentence_buffer[chunk_size:]
-
-        if buffer:
-            sentence_buffer.append(buffer.strip())
-
-        if sentence_buffer:
-            yield ' '.join(sentence_buffer)
+import re
+import zlib
+from utils.text_normalizer import normalize_text
+
+
+def chunk_size_for(sentence):
+    # Deterministic 2-or-3 sentence chunks: the same text always chunks the
+    # same way, so unchanged passages map to the same cached audio.
+    return 2 + (zlib.crc32(sentence.encode("utf-8")) & 1)
+
+
+def count_chunks(filepath):
+    return sum(1 for _ in stream_sentences(filepath, paragraphs=True))
+
+
+def stream_sentences(filepath, paragraphs=False, normalize=True):
+    # Paragraphs are separated by blank lines, as save_chapters writes them;
+    # inside one, lines may be wrapped anywhere. Chunks depend only on the
+    # sentences, not on where lines break. With paragraphs=True the end of a
+    # paragraph also closes the chunk, and (chunk, paragraph_end) pairs are
+    # yielded so callers can pause longer between paragraphs. A paragraph
+    # without words, like the "......" under a chapter title, stays with the
+    # one before it.
+    sentence_endings = re.compile(r'(?<=[.!?])\s+')
+    sentence_buffer = []
+    buffer = ""
+    blank = False
+
+    def take_chunks(final):
+        nonlocal sentence_buffer
+        chunks = []
+        while sentence_buffer and (final or len(sentence_buffer) >= chunk_size_for(sentence_buffer[0])):
+            chunk_size = min(chunk_size_for(sentence_buffer[0]), len(sentence_buffer))
+            chunks.append(' '.join(sentence_buffer[:chunk_size]))
+            sentence_buffer = sentence_buffer[chunk_size:]
+        for idx, chunk in enumerate(chunks):
+            yield (chunk, final and idx == len(chunks) - 1) if paragraphs else chunk
+
+    with open(filepath, 'r', encoding='utf-8') as file:
+        text = file.read()
+    # Normalized as a whole, since tags such as [Illustration: ...] may run
+    # over several lines.
+    lines = normalize_text(text).split("\n") if normalize else text.split("\n")
+
+    for line in lines:
+        if not line.strip():
+            blank = True
+            continue
+        if blank and paragraphs and re.search(r'\w', line):
+            if buffer:
+                sentence_buffer.append(buffer)
+            buffer = ""
+            yield from take_chunks(final=True)
+        blank = False
+
+        # The last piece may be an unfinished sentence; it is held until
+        # the next line or the end of the paragraph.
+        sentences = sentence_endings.split(f"{buffer} {line.strip()}".strip())
+        buffer = sentences.pop()
+        sentence_buffer.extend(sentences)
+        yield from take_chunks(final=False)
+
+    if buffer:
+        sentence_buffer.append(buffer)
+    yield from take_chunks(final=True)
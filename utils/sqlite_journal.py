@@ -0,0 +1,41 @@
+import os
+
+JOURNAL_ENV = "NARRATO_QUEUE_JOURNAL"
+# WAL keeps its index in shared memory that other hosts cannot see, so a
+# database shared by workers on any of these uses the rollback journal.
+NETWORK_FILESYSTEMS = {
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs", "lustre",
+    "fuse.sshfs", "fuse.glusterfs", "fuse.cephfs", "afs", "gpfs", "beegfs",
+}
+
+
+def filesystem_type(path):
+    # Type of the mount holding `path`, from /proc/mounts; None elsewhere.
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount = parts[1].replace("\\040", " ")
+                inside = path == mount or path.startswith(mount.rstrip("/") + "/")
+                if inside and len(mount) >= len(best):
+                    best, fstype = mount, parts[2]
+    except OSError:
+        return None
+    return fstype
+
+
+def journal_mode(db_path):
+    # WAL only where every worker is sure to be on this host's filesystem;
+    # unknown or network mounts use the rollback journal, which relies on
+    # file locks alone and is safe across nodes.
+    forced = os.getenv(JOURNAL_ENV)
+    if forced:
+        return forced.upper()
+    fstype = filesystem_type(os.path.dirname(os.path.abspath(db_path)))
+    if fstype is None or fstype in NETWORK_FILESYSTEMS:
+        return "DELETE"
+    return "WAL"
@@ -1,94 +1,168 @@
-import json
-import os
-import soundfile as sf
-from datetime import timedelta
-
-
-def format_timestamp(seconds: float) -> str:
-    td = timedelta(seconds=seconds)
-    total_seconds = int(td.total_seconds())
-    millis = int((td.total_seconds() - total_seconds) * 1000)
-    hours, remainder = divmod(total_seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    return f"{hours:02}:{minutes:02}:{seconds:02},{millis:03}"
-
-
-def break_into_lines(text, max_chars=80):
-    import textwrap
-    return textwrap.wrap(text, width=max_chars)
-
-
-def get_audio_duration(filepath):
-    with sf.SoundFile(filepath) as f:
-        frames = len(f)
-        samplerate = f.samplerate
-        return frames / samplerate
-
-
-def generate_srt_from_subtitles_json(subtitle_json_path, audio_dir, output_srt_path):
-    with open(subtitle_json_path, "r", encoding="utf-8") as f:
-        subtitles = json.load(f)
-
-    srt_entries = []
-    current_time = 0.0
-    index = 1
-
-    for entry in subtitles:
-        audio_filename = entry["audio"]
-        text = entry["text"]
-
-        audio_path = os.path.join(audio_dir, audio_filename)
-        duration = get_audio_duration(audio_path)
-
-        lines = break_into_lines(text)
-        line_duration = duration / len(lines)
-
-        for line in lines:
-            start_ts = format_timestamp(current_time)
-            end_ts = format_timestamp(current_time + line_duration)
-
-            srt_entries.append(f"{index}\n{start_ts} --> {end_ts}\n{line}\n")
-            current_time += line_duration
-            index += 1
-
-    with open(output_srt_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(srt_entries))
-
-    print(f"SRT saved to: {output_srt_path}")
-
-
-def merge_srt_files(srt_paths, audio_paths, output_path):
-    current_offset = 0.0
-    index = 1
-    srt_output = []
-
-    for srt_file, audio_file in zip(srt_paths, audio_paths):
-        duration = get_audio_duration(audio_file)
-
-        with open(srt_file, "r", encoding="utf-8") as f:
-            blocks = f.read().strip().split("\n\n")
-
-        for block in blocks:
-            lines = block.strip().split("\n")
-            if len(lines) < 2:
-                continue
-            timestamp_line = lines[1]
-            start, end = timestamp_line.split(" --> ")
-            start_time = parse_srt_time(start) + current_offset
-            end_time = parse_srt_time(end) + current_offset
-
-            new_ts = f"{format_timestamp(start_time)} --> {format_timestamp(end_time)}"
-            srt_output.append(f"{index}\n{new_ts}\n" + "\n".join(lines[2:]) + "\n")
-            index += 1
-
-        current_offset += duration
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(srt_output))
-    print(f"Merged SRT saved to: {output_path}")
-
-
-def parse_srt_time(srt_time_str):
-    h, m, rest = srt_time_str.split(":")
-    s, ms = rest.split(",")
-    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+import os
+import textwrap
+import soundfile as sf
+from typing import NamedTuple
+from utils.timing_store import Timings, timings_path
+
+DRIFT_TOLERANCE = 0.05
+
+
+class Cue(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+def format_timestamp(seconds: float, separator: str = ",") -> str:
+    total_millis = max(0, int(round(seconds * 1000)))
+    total_seconds, millis = divmod(total_millis, 1000)
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}{separator}{millis:03}"
+
+
+def parse_srt_time(srt_time_str):
+    # Fixed-width "HH:MM:SS,mmm" (also accepts the WebVTT "." separator).
+    s = srt_time_str.strip()
+    hours, minutes, rest = s.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(rest[:2]) + int(rest[3:6]) / 1000
+
+
+def break_into_lines(text, max_chars=80):
+    return textwrap.wrap(text, width=max_chars)
+
+
+def get_audio_duration(filepath):
+    info = sf.info(filepath)
+    return info.frames / info.samplerate
+
+
+class SubtitleWriter:
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or ("vtt" if path.lower().endswith(".vtt") else "srt")
+        self.index = 0
+        self.last_end = 0.0
+        self.overlaps_fixed = 0
+        self._file = open(path, "w", encoding="utf-8")
+        if self.fmt == "vtt":
+            self._file.write("WEBVTT\n\n")
+
+    def write(self, cue: Cue):
+        start, end = cue.start, cue.end
+        if round(start * 1000) < round(self.last_end * 1000):
+            self.overlaps_fixed += 1
+        start = max(start, self.last_end)
+        end = max(end, start)
+
+        self.index += 1
+        separator = "." if self.fmt == "vtt" else ","
+        self._file.write(
+            f"{self.index}\n{format_timestamp(start, separator)} --> "
+            f"{format_timestamp(end, separator)}\n{cue.text}\n\n"
+        )
+        self.last_end = end
+
+    def close(self):
+        self._file.close()
+        if self.overlaps_fixed:
+            print(f"⚠️ Adjusted {self.overlaps_fixed} overlapping cues in {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MultiWriter:
+    def __init__(self, paths):
+        self.writers = [SubtitleWriter(path) for path in paths if path]
+
+    def write(self, cue: Cue):
+        for writer in self.writers:
+            writer.write(cue)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for writer in self.writers:
+            writer.close()
+
+
+def iter_timing_cues(timings):
+    # Chunk starts come from exact sample offsets in the timing store, so long
+    # chapters do not accumulate rounding drift.
+    for start, end, text in timings.rows():
+        lines = break_into_lines(text) or [text]
+        line_duration = (end - start) / len(lines)
+        for i, line in enumerate(lines):
+            yield Cue(start + i * line_duration, start + (i + 1) * line_duration, line)
+
+
+def iter_srt_cues(path):
+    # Streams cues line by line; only the timing line is parsed, text lines
+    # are passed through untouched.
+    with open(path, "r", encoding="utf-8") as f:
+        timing = None
+        text_lines = []
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if timing is None:
+                if " --> " in line:
+                    start, end = line.split(" --> ", 1)
+                    timing = (parse_srt_time(start), parse_srt_time(end.split()[0]))
+                continue
+            if line:
+                text_lines.append(line)
+                continue
+            yield Cue(timing[0], timing[1], "\n".join(text_lines))
+            timing, text_lines = None, []
+        if timing is not None:
+            yield Cue(timing[0], timing[1], "\n".join(text_lines))
+
+
+def generate_srt_from_timings(timings, output_srt_path, output_vtt_path=None):
+    with MultiWriter([output_srt_path, output_vtt_path]) as writer:
+        for cue in iter_timing_cues(timings):
+            writer.write(cue)
+
+    print(f"SRT saved to: {output_srt_path}")
+
+
+def chapter_cues(timings, srt_path, offset):
+    # A chapter's cues on the book timeline: from its timing store, shifted
+    # by whole samples, or parsed from its SRT when it has no store.
+    if timings is not None:
+        return iter_timing_cues(Timings.concatenate([timings], [offset]))
+    return (Cue(c.start + offset, c.end + offset, c.text) for c in iter_srt_cues(srt_path))
+
+
+def merge_srt_files(srt_paths, audio_paths, output_path, vtt_path=None, durations=None):
+    # Durations from the chapter index spare a header read per chapter.
+    current_offset = 0.0
+    durations = durations or [None] * len(srt_paths)
+
+    with MultiWriter([output_path, vtt_path]) as writer:
+        for srt_file, audio_file, duration in zip(srt_paths, audio_paths, durations):
+            if duration is None:
+                duration = get_audio_duration(audio_file)
+            store = timings_path(
+                os.path.dirname(audio_file), os.path.splitext(os.path.basename(audio_file))[0]
+            )
+            timings = Timings.load(store) if os.path.exists(store) else None
+            chapter_end = current_offset + duration
+
+            for cue in chapter_cues(timings, srt_file, current_offset):
+                if cue.end > chapter_end + DRIFT_TOLERANCE:
+                    print(
+                        f"⚠️ Cue at {format_timestamp(cue.start - current_offset)} runs past the end of "
+                        f"{audio_file} ({cue.end - chapter_end:.2f}s drift), clamping."
+                    )
+                    cue = Cue(min(cue.start, chapter_end), chapter_end, cue.text)
+                writer.write(cue)
+
+            current_offset = chapter_end
+
+    print(f"Merged SRT saved to: {output_path}")
@@ -0,0 +1,237 @@
+import re
+import time
+import argparse
+
+ROMAN_NUMERAL_MAP = {
+    "M": 1000,
+    "CM": 900,
+    "D": 500,
+    "CD": 400,
+    "C": 100,
+    "XC": 90,
+    "L": 50,
+    "XL": 40,
+    "X": 10,
+    "IX": 9,
+    "V": 5,
+    "IV": 4,
+    "I": 1,
+}
+
+
+def roman_to_int(roman):
+    roman = roman.upper()
+    i = 0
+    num = 0
+    while i < len(roman):
+        if i + 1 < len(roman) and roman[i : i + 2] in ROMAN_NUMERAL_MAP:
+            num += ROMAN_NUMERAL_MAP[roman[i : i + 2]]
+            i += 2
+        elif roman[i] in ROMAN_NUMERAL_MAP:
+            num += ROMAN_NUMERAL_MAP[roman[i]]
+            i += 1
+        else:
+            return None
+    return num
+
+
+# Expanded before sentence splitting: "Mr. Darcy" would otherwise end a
+# sentence at "Mr." and break the chunking.
+ABBREVIATIONS = {
+    "Mr.": "Mister",
+    "Mrs.": "Missus",
+    "Dr.": "Doctor",
+    "St.": "Saint",
+    "Capt.": "Captain",
+    "Col.": "Colonel",
+    "Gen.": "General",
+    "Lieut.": "Lieutenant",
+    "Sgt.": "Sergeant",
+    "Rev.": "Reverend",
+    "Prof.": "Professor",
+    "Hon.": "Honourable",
+    "Jr.": "Junior",
+    "Sr.": "Senior",
+    "Mt.": "Mount",
+    "vol.": "volume",
+    "Vol.": "Volume",
+    "viz.": "namely",
+    "i.e.": "that is",
+    "e.g.": "for example",
+    "&c.": "et cetera",
+    "etc.": "et cetera",
+}
+
+SENTENCE_FINAL = {"etc.", "&c.", "Jr.", "Sr."}
+CURRENCIES = {"£": "pounds", "$": "dollars", "€": "euros"}
+TITLED_NUMERALS = ("Chapter", "Book", "Part", "Volume", "Act", "Scene", "Canto", "Letter", "Stave")
+INVISIBLE = r"\u00ad\u200b-\u200d\u2060\ufeff"
+# Not preceded by a word character: checked from just after the lead.
+WORD_START = r"(?<![\w.].)"
+# Longest multi-line tag that is removed whole.
+MAX_TAG_CHARS = 4000
+
+
+def _after_lead(words, flags=""):
+    # Alternatives keyed on their first character, which the lead has
+    # already consumed.
+    scoped = f"(?{flags}:{{}})" if flags else "{}"
+    return "(?:" + "|".join(
+        f"(?<={re.escape(w[0])})" + scoped.format(re.escape(w[1:]))
+        for w in sorted(words, key=len, reverse=True)
+    ) + ")"
+
+
+# Abbreviations starting with a lowercase letter would make "e", "i" and "v"
+# leads, which are most of the text, so they are found by a plain substring
+# check and their own pattern instead.
+TITLE_ABBREVIATIONS = [a for a in ABBREVIATIONS if not a[0].islower()]
+LOWERCASE_ABBREVIATIONS = [a for a in ABBREVIATIONS if a[0].islower()]
+LOWERCASE_NORMALIZER = re.compile(
+    "[" + "".join(sorted({a[0] for a in LOWERCASE_ABBREVIATIONS})) + "]"
+    + WORD_START + _after_lead(LOWERCASE_ABBREVIATIONS) + r"(?=\s|$)",
+    re.MULTILINE,
+)
+
+# Each rule is (lead, rest): a match is one character of the lead class
+# followed by the rest. The combined pattern opens with the union of the
+# leads, so the regex engine skips straight between candidate characters
+# (capitals, digits, brackets...) instead of trying every rule at every
+# position, and a book is normalized in one scan.
+RULES = {
+    # Tags may run over several lines; an unclosed one ends with its line.
+    "artifact": (
+        r"\[",
+        r"(?:Illustration|Footnote|Sidenote|Transcriber'?s? [Nn]ote)"
+        rf"(?:[^\[\]]{{0,{MAX_TAG_CHARS}}}\]|[^\]\n]*)",
+    ),
+    "page": (r"\[{", r"(?:Pg|Page|p\.)\s*[\dIVXLCDMivxlcdm]+[\]}]"),
+    "marker": (r"\[{", r"(?<=[\w.,;:!?'\"”’].)\d{1,3}[\]}]"),
+    "abbrev": (
+        "".join(sorted({a[0] for a in TITLE_ABBREVIATIONS})),
+        WORD_START + _after_lead(TITLE_ABBREVIATIONS) + r"(?=\s|$)",
+    ),
+    "number_sign": ("N", WORD_START + r"[oO]\.\s*(?=\d)"),
+    "numeral": (
+        "".join(w[0] for w in TITLED_NUMERALS),
+        WORD_START + _after_lead(TITLED_NUMERALS, "i") + r"\s+[IVXLCDM]+\b(?=\s*(?:[^\w\s']|$)|\s+[A-Z])",
+    ),
+    "currency": (r"£$€", r"\d[\d,]*(?:\.\d+)?"),
+    # A whole chain of dash-joined numbers, so "1990-2000-2010" is not read
+    # as a range from its middle.
+    "year_range": (r"\d", WORD_START + r"\d{2,3}(?:\s*[-–—]\s*\d{2,4}\b)+"),
+    "dashes": (r"\-", r"-+"),
+    "italics": (r"_", r"(?<!\w_)(?P<italic>[^_\n]+)_(?!\w)"),
+    "invisible": (INVISIBLE, rf"[{INVISIBLE}]*"),
+}
+
+
+def _following(m):
+    # First character after the match, looking past whitespace; bounded so
+    # that matches in a whole book do not copy the rest of it.
+    return m.string[m.end() : m.end() + 64].lstrip()[:1]
+
+
+def _abbrev(m):
+    abbreviation = m.group(0)
+    following = _following(m)
+    if abbreviation == "St." and not following.isupper():
+        return "Street"
+    # Kept as a sentence end where the abbreviation also closes the sentence.
+    if abbreviation in SENTENCE_FINAL and (not following or following.isupper()):
+        return ABBREVIATIONS[abbreviation] + "."
+    return ABBREVIATIONS[abbreviation]
+
+
+def _numeral(m):
+    word, roman = m.group(0).rsplit(None, 1)
+    # A lone "I" may be the pronoun ("The Letter I Wrote"): it is read as a
+    # number only where it closes a heading or reference ("CHAPTER I",
+    # "Chapter I. Loomings", "see Book I, where").
+    if roman == "I" and (_following(m).isalnum() or word.islower()):
+        return m.group(0)
+    return f"{word} {roman_to_int(roman) or roman}"
+
+
+def _year_range(m):
+    parts = re.split(r"\s*[-–—]\s*", m.group(0))
+    if len(parts) != 2:
+        return m.group(0)
+    first, last = parts
+    # "1812-15" reads as "1812 to 1815".
+    if len(last) < len(first):
+        last = first[: len(first) - len(last)] + last
+    return f"{first} to {last}"
+
+
+HANDLERS = {
+    "artifact": lambda m: "",
+    "page": lambda m: "",
+    "marker": lambda m: "",
+    "abbrev": _abbrev,
+    "number_sign": lambda m: "number ",
+    "numeral": _numeral,
+    "currency": lambda m: f"{m.group(0)[1:]} {CURRENCIES[m.group(0)[0]]}",
+    "year_range": _year_range,
+    "dashes": lambda m: " — ",
+    "italics": lambda m: m.group("italic"),
+    "invisible": lambda m: "",
+}
+
+NORMALIZER = re.compile(
+    "[" + "".join(lead for lead, _ in RULES.values()) + "](?:"
+    + "|".join(f"(?<=[{lead}])(?P<{name}>{rest})" for name, (lead, rest) in RULES.items())
+    + ")",
+    re.MULTILINE,
+)
+# Bumped whenever the rules change, so rendered chapters are redone.
+NORMALIZER_VERSION = 3
+
+
+def _replace(m):
+    return HANDLERS[m.lastgroup](m)
+
+
+def normalize_text(text):
+    # The whole text in one pass, so tags spanning lines are caught; line
+    # breaks are kept for the paragraph-aware chunking.
+    if any(a in text for a in LOWERCASE_ABBREVIATIONS):
+        text = LOWERCASE_NORMALIZER.sub(_abbrev, text)
+    # split() also folds non-breaking and other Unicode spaces.
+    return "\n".join([" ".join(line.split()) for line in NORMALIZER.sub(_replace, text).split("\n")])
+
+
+def normalize_text_file(input_path, output_path):
+    with open(input_path, "r", encoding="utf-8") as src:
+        text = src.read()
+    with open(output_path, "w", encoding="utf-8") as dst:
+        dst.write(normalize_text(text))
+
+
+def benchmark(path, repeat=3):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    size = len(text.encode("utf-8"))
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        normalized = normalize_text(text)
+        best = min(best, time.perf_counter() - started)
+    changed = sum(1 for a, b in zip(text.split("\n"), normalized.split("\n")) if a != b)
+    print(f"{size / 1e6:.2f} MB in {best:.3f}s ({size / 1e6 / best:.1f} MB/s), {changed} lines changed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize chapter text for narration.")
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?", help="Write the normalized text here")
+    parser.add_argument("--bench", action="store_true", help="Measure throughput on the input")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.input)
+    elif args.output:
+        normalize_text_file(args.input, args.output)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            print(normalize_text(f.read()))
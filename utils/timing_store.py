@@ -0,0 +1,231 @@
+import os
+import re
+import argparse
+import numpy as np
+from utils.tts_cache import words_path
+
+# One row per synthesized chunk; sample ranges cover the speech only, the
+# pause after a chunk is the gap to the next row's sample_start. Words use
+# the same layout, with `chunk` holding the row of the chunk they belong to.
+CHUNK_DTYPE = np.dtype(
+    [
+        ("chapter", "<u2"),
+        ("chunk", "<u4"),
+        ("text_start", "<u8"),
+        ("text_end", "<u8"),
+        ("sample_start", "<u8"),
+        ("sample_end", "<u8"),
+    ]
+)
+
+
+WORD = re.compile(r"\S*\w\S*")
+
+
+def timings_path(audio_dir, chapter_name):
+    return os.path.join(audio_dir, f"{chapter_name}.timings.npz")
+
+
+def load_words(audio_path):
+    path = words_path(audio_path)
+    return np.load(path) if os.path.exists(path) else None
+
+
+def chunk_words(text, frames, samplerate, spans=None):
+    # Byte offsets and sample ranges of the words in one chunk. Timings from
+    # the synthesizer are used when they cover exactly the words of the text;
+    # otherwise each word gets its share of the chunk by character position.
+    matches = list(WORD.finditer(text))
+    if text.isascii():
+        bounds = np.array([m.span() for m in matches], dtype=np.float64).reshape(-1, 2)
+    else:
+        bounds = np.array(
+            [(len(text[: m.start()].encode("utf-8")), len(text[: m.end()].encode("utf-8"))) for m in matches],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+    if spans is not None and len(spans) == len(matches):
+        samples = np.rint(np.asarray(spans, dtype=np.float64) * samplerate)
+    else:
+        char_bounds = np.array([m.span() for m in matches], dtype=np.float64).reshape(-1, 2)
+        samples = np.rint(char_bounds / max(1, len(text)) * frames)
+    return bounds.astype(np.uint64), np.clip(samples, 0, frames).astype(np.uint64)
+
+
+def word_table(texts, chunks, samplerate, words=None):
+    words = words if words is not None else [None] * len(texts)
+    blocks = [np.zeros(0, dtype=CHUNK_DTYPE)]
+    for i, (chunk_text, spans) in enumerate(zip(texts, words)):
+        row = chunks[i]
+        frames = int(row["sample_end"] - row["sample_start"])
+        bounds, samples = chunk_words(chunk_text, frames, samplerate, spans)
+        block = np.zeros(len(bounds), dtype=CHUNK_DTYPE)
+        block["chunk"] = i
+        block["text_start"] = bounds[:, 0] + row["text_start"]
+        block["text_end"] = bounds[:, 1] + row["text_start"]
+        block["sample_start"] = samples[:, 0] + row["sample_start"]
+        block["sample_end"] = samples[:, 1] + row["sample_start"]
+        blocks.append(block)
+    return np.concatenate(blocks)
+
+
+class Timings:
+    # Chunk timing and text for a chapter, or a whole book once chapters are
+    # concatenated. Texts live in one UTF-8 buffer addressed by offsets.
+    def __init__(self, chunks, text, samplerate, chapters=(), words=None):
+        self.chunks = chunks
+        self.words = words if words is not None else np.zeros(0, dtype=CHUNK_DTYPE)
+        self.text = text
+        self.samplerate = int(samplerate)
+        self.chapters = list(chapters)
+        self._sample_starts = None
+
+    @classmethod
+    def build(cls, texts, frames, pauses, samplerate, chapter="", words=None):
+        # words: per chunk, (start, end) seconds of each spoken word from the
+        # synthesizer, or None to estimate them.
+        encoded = [t.encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(t) for t in encoded), dtype=np.uint64, count=len(encoded))
+        frames = np.asarray(frames, dtype=np.uint64)
+        # Same rounding as the merge, which inserts round(pause * rate) frames.
+        gaps = np.rint(np.asarray(pauses, dtype=np.float64) * samplerate).astype(np.uint64)
+
+        chunks = np.zeros(len(encoded), dtype=CHUNK_DTYPE)
+        chunks["chunk"] = np.arange(len(encoded))
+        chunks["text_end"] = np.cumsum(lengths)
+        chunks["text_start"] = chunks["text_end"] - lengths
+        chunks["sample_start"] = np.cumsum(frames + gaps) - frames - gaps
+        chunks["sample_end"] = chunks["sample_start"] + frames
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        return cls(chunks, text, samplerate, [chapter], word_table(texts, chunks, samplerate, words))
+
+    def save(self, path):
+        # Written under a temporary name first: render workers and readers may
+        # touch the same chapter.
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            chunks=self.chunks,
+            words=self.words,
+            text=self.text,
+            samplerate=np.array(self.samplerate),
+            chapters=np.array(self.chapters, dtype=str),
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            timings = cls(
+                data["chunks"],
+                data["text"],
+                int(data["samplerate"]),
+                data["chapters"].tolist(),
+                data["words"] if "words" in data.files else None,
+            )
+        if "words" not in data.files:
+            # Stores written before word timings: estimate them per chunk.
+            texts = [timings.text_of(i) for i in range(len(timings))]
+            timings.words = word_table(texts, timings.chunks, timings.samplerate)
+        return timings
+
+    @classmethod
+    def concatenate(cls, parts, offsets):
+        # Offsets (seconds) place each chapter on the book timeline, e.g. the
+        # chapter index offsets of the merged audiobook.
+        chunks, words, texts, chapters = [], [], [], []
+        text_offset = row_offset = 0
+        samplerate = parts[0].samplerate if parts else 24000
+        for number, (part, offset) in enumerate(zip(parts, offsets)):
+            shift = np.uint64(round(offset * samplerate))
+            for rows, blocks in ((part.chunks, chunks), (part.words, words)):
+                block = rows.copy()
+                block["chapter"] = number
+                block["sample_start"] += shift
+                block["sample_end"] += shift
+                block["text_start"] += np.uint64(text_offset)
+                block["text_end"] += np.uint64(text_offset)
+                blocks.append(block)
+            words[-1]["chunk"] += np.uint32(row_offset)
+            text_offset += len(part.text)
+            row_offset += len(part.chunks)
+            texts.append(part.text)
+            chapters += part.chapters[:1] or [""]
+        return cls(
+            np.concatenate(chunks) if chunks else np.zeros(0, dtype=CHUNK_DTYPE),
+            np.concatenate(texts) if texts else np.zeros(0, dtype=np.uint8),
+            samplerate,
+            chapters,
+            np.concatenate(words) if words else None,
+        )
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def starts(self):
+        return self.chunks["sample_start"] / self.samplerate
+
+    @property
+    def ends(self):
+        return self.chunks["sample_end"] / self.samplerate
+
+    def text_of(self, i, rows=None):
+        row = (self.chunks if rows is None else rows)[i]
+        return self.text[int(row["text_start"]) : int(row["text_end"])].tobytes().decode("utf-8")
+
+    def locate(self, seconds):
+        # Index of the chunk being spoken (or the pause after it) at `seconds`;
+        # accepts an array of times as well.
+        if self._sample_starts is None:
+            # A field of a structured array is strided; search a packed copy.
+            self._sample_starts = np.ascontiguousarray(self.chunks["sample_start"])
+        positions = np.rint(np.maximum(np.asarray(seconds, dtype=np.float64), 0) * self.samplerate)
+        found = np.searchsorted(self._sample_starts, positions.astype(np.uint64), side="right") - 1
+        found = np.maximum(found, 0)
+        return int(found) if found.ndim == 0 else found
+
+    def rows(self):
+        starts, ends = self.starts.tolist(), self.ends.tolist()
+        for i in range(len(self.chunks)):
+            yield starts[i], ends[i], self.text_of(i)
+
+    def word_rows(self):
+        # (start, end, word) per chunk, in chunk order.
+        bounds = np.searchsorted(self.words["chunk"], np.arange(len(self.chunks) + 1))
+        starts = (self.words["sample_start"] / self.samplerate).tolist()
+        ends = (self.words["sample_end"] / self.samplerate).tolist()
+        for lo, hi in zip(bounds, bounds[1:]):
+            yield [(starts[j], ends[j], self.text_of(j, self.words)) for j in range(lo, hi)]
+
+
+def load_book_timings(entries):
+    # entries: the chapter index; chapters without a timing store are skipped.
+    parts, offsets = [], []
+    for entry in entries:
+        path = timings_path(os.path.dirname(entry.audio), entry.name)
+        if os.path.exists(path):
+            part = Timings.load(path)
+            part.chapters = [entry.name]
+            parts.append(part)
+            offsets.append(entry.offset)
+    return Timings.concatenate(parts, offsets)
+
+
+if __name__ == "__main__":
+    from utils.chapter_index import load_chapter_index
+
+    parser = argparse.ArgumentParser(description="Find what is being read at a point in the audiobook.")
+    parser.add_argument("book", help="Book directory holding chapter_index.json")
+    parser.add_argument("seconds", type=float, nargs="+")
+    args = parser.parse_args()
+
+    timings = load_book_timings(load_chapter_index(args.book))
+    for seconds in args.seconds:
+        i = timings.locate(seconds)
+        row = timings.chunks[i]
+        print(
+            f"{seconds:.1f}s → {timings.chapters[row['chapter']]} chunk {row['chunk']} "
+            f"@ {timings.starts[i]:.2f}s: {timings.text_of(i)}"
+        )
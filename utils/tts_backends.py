@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from functools import lru_cache
+from utils.phoneme_cache import create_phoneme_cache
+
+SAMPLE_RATE = 24000
+BACKEND_ENV = "NARRATO_TTS_BACKEND"
+PRECISION_ENV = "NARRATO_TTS_PRECISION"
+ONNX_MODEL_ENV = "NARRATO_ONNX_MODEL"
+
+KOKORO_REPO = "hexgrad/Kokoro-82M"
+ONNX_REPO = "onnx-community/Kokoro-82M-v1.0-ONNX"
+# Kokoro predicts one duration per input phoneme, in frames of 600 samples.
+SAMPLES_PER_FRAME = 600
+PUNCTUATION = set(';:,.!?¡¿—…"«»“”()')
+ONNX_MODELS = {
+    "fp32": "onnx/model.onnx",
+    "fp16": "onnx/model_fp16.onnx",
+    "int8": "onnx/model_quantized.onnx",
+}
+
+
+def to_numpy(audio):
+    if hasattr(audio, "cpu"):
+        audio = audio.detach().cpu().numpy()
+    return np.asarray(audio, dtype=np.float32)
+
+
+def join_segments(segments):
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(segments)
+
+
+def phoneme_word_spans(phonemes, durations, vocab):
+    # Start and end (seconds) of each spoken word in a phoneme batch. Phonemes
+    # missing from the vocab never reach the model, and durations[0] and
+    # durations[-1] belong to the boundary tokens around the batch.
+    kept = [p for p in phonemes if p in vocab]
+    edges = np.concatenate([[0], np.cumsum(durations)]) * SAMPLES_PER_FRAME / SAMPLE_RATE
+    spans, first, last = [], None, None
+    for k, p in enumerate(kept + [" "]):
+        if p == " ":
+            if first is not None:
+                spans.append((float(edges[first + 1]), float(edges[last + 2])))
+            first = last = None
+        elif p not in PUNCTUATION:
+            first = k if first is None else first
+            last = k
+    return spans
+
+
+class TTSBackend:
+    name = None
+    # Distinguishes cached audio from backends whose output is not identical.
+    cache_tag = None
+    sample_rate = SAMPLE_RATE
+    lang_code = "a"
+    phonemes = None
+
+    @property
+    def frontend(self):
+        raise NotImplementedError
+
+    def phonemizer(self):
+        # Created on first local synthesis, so daemon clients never load G2P.
+        if self.phonemes is None:
+            self.phonemes = create_phoneme_cache(self.frontend.g2p, self.lang_code)
+        return self.phonemes
+
+    def load_voice(self, voice):
+        pass
+
+    def synthesize(self, text, voice):
+        raise NotImplementedError
+
+    def synthesize_words(self, text, voice):
+        # Audio plus (start, end) seconds per spoken word, or None when the
+        # backend cannot time words.
+        return self.synthesize(text, voice), None
+
+
+class TorchBackend(TTSBackend):
+    name = "torch"
+
+    def __init__(self, lang_code="a"):
+        self.lang_code = lang_code
+        self._pipeline = None
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            from kokoro import KPipeline
+            from utils.runtime import configure_torch
+
+            self._pipeline = KPipeline(lang_code=self.lang_code, device=configure_torch())
+        return self._pipeline
+
+    @property
+    def frontend(self):
+        return self.pipeline
+
+    def load_voice(self, voice):
+        self.pipeline.load_voice(voice)
+
+    def synthesize(self, text, voice):
+        return join_segments([
+            to_numpy(result.audio)
+            for ps in self.phonemizer().batches(text)
+            for result in self.pipeline.generate_from_tokens(ps, voice=voice)
+            if result.audio is not None
+        ])
+
+    def synthesize_words(self, text, voice):
+        segments, words, offset = [], [], 0.0
+        for ps in self.phonemizer().batches(text):
+            for result in self.pipeline.generate_from_tokens(ps, voice=voice):
+                if result.audio is None:
+                    continue
+                audio = to_numpy(result.audio)
+                if result.pred_dur is not None:
+                    durations = result.pred_dur.cpu().numpy().reshape(-1)
+                    words += [
+                        (offset + start, offset + end)
+                        for start, end in phoneme_word_spans(ps, durations, self.pipeline.model.vocab)
+                    ]
+                segments.append(audio)
+                offset += len(audio) / self.sample_rate
+        return join_segments(segments), words
+
+
+class OnnxBackend(TTSBackend):
+    name = "onnx"
+
+    def __init__(self, precision="fp32", model_path=None, lang_code="a", threads=None):
+        if precision not in ONNX_MODELS:
+            raise ValueError(f"Unsupported ONNX precision: {precision}")
+        self.precision = precision
+        self.cache_tag = f"onnx-{precision}"
+        self.model_path = model_path
+        self.lang_code = lang_code
+        self.threads = threads
+        self._session = None
+        self._frontend = None
+        self._vocab = None
+        self._voices = {}
+
+    @property
+    def session(self):
+        # One session per process: graph optimisation and weight loading are
+        # paid once, every chunk after that is a plain run().
+        if self._session is None:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+
+            path = self.model_path or hf_hub_download(ONNX_REPO, ONNX_MODELS[self.precision])
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            self._session = ort.InferenceSession(
+                path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            self._inputs = {i.name: i.type for i in self._session.get_inputs()}
+            self._output = self._session.get_outputs()[0].name
+        return self._session
+
+    @property
+    def frontend(self):
+        # Kokoro's own pipeline without a model provides G2P only.
+        if self._frontend is None:
+            from kokoro import KPipeline
+
+            self._frontend = KPipeline(lang_code=self.lang_code, model=False)
+        return self._frontend
+
+    @property
+    def vocab(self):
+        if self._vocab is None:
+            from huggingface_hub import hf_hub_download
+
+            with open(hf_hub_download(KOKORO_REPO, "config.json"), "r", encoding="utf-8") as f:
+                self._vocab = json.load(f)["vocab"]
+        return self._vocab
+
+    def load_voice(self, voice):
+        if voice not in self._voices:
+            from huggingface_hub import hf_hub_download
+
+            path = hf_hub_download(ONNX_REPO, f"voices/{voice}.bin")
+            self._voices[voice] = np.fromfile(path, dtype=np.float32).reshape(-1, 1, 256)
+        return self._voices[voice]
+
+    def _float(self, name, value):
+        dtype = np.float16 if "float16" in self._inputs[name] else np.float32
+        return np.asarray(value, dtype=dtype)
+
+    def infer(self, phonemes, voice, speed=1.0):
+        session = self.session
+        tokens = [self.vocab[p] for p in phonemes if p in self.vocab]
+        if not tokens:
+            return np.zeros(0, dtype=np.float32)
+        style = self.load_voice(voice)[len(tokens) - 1]
+        (audio,) = session.run(
+            [self._output],
+            {
+                "input_ids": np.array([[0, *tokens, 0]], dtype=np.int64),
+                "style": self._float("style", style),
+                "speed": self._float("speed", [speed]),
+            },
+        )
+        return np.asarray(audio, dtype=np.float32).reshape(-1)
+
+    def synthesize(self, text, voice):
+        return join_segments([
+            self.infer(ps, voice) for ps in self.phonemizer().batches(text)
+        ])
+
+
+BACKENDS = {"torch": TorchBackend, "onnx": OnnxBackend}
+
+
+def create_backend(name=None, precision=None, **kwargs):
+    name = (name or os.getenv(BACKEND_ENV) or "torch").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name == "onnx":
+        kwargs.setdefault("precision", precision or os.getenv(PRECISION_ENV) or "fp32")
+        kwargs.setdefault("model_path", os.getenv(ONNX_MODEL_ENV))
+    return BACKENDS[name](**kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_backend(name=None, precision=None):
+    return create_backend(name, precision)
+
+
+def parity(reference, audio):
+    # Length difference in samples and waveform correlation over the
+    # overlapping part; backends agree when both are close to 0 and 1.
+    n = min(len(reference), len(audio))
+    corr = float(np.corrcoef(reference[:n], audio[:n])[0, 1]) if n > 1 else float("nan")
+    return len(audio) - len(reference), corr
+
+
+def benchmark(backends, text, voice):
+    # Real-time factor is synthesis time over audio duration; below 1 is faster
+    # than playback. Outputs are compared against the first backend.
+    reference = None
+    for backend in backends:
+        backend.load_voice(voice)
+        backend.synthesize("Warm up.", voice)
+        started = time.perf_counter()
+        audio = backend.synthesize(text, voice)
+        elapsed = time.perf_counter() - started
+        seconds = len(audio) / backend.sample_rate
+        line = f"{backend.cache_tag or backend.name:>10}  {seconds:6.2f}s audio  RTF {elapsed / max(seconds, 1e-9):.3f}"
+        if reference is None:
+            reference = audio
+        else:
+            length, corr = parity(reference, audio)
+            line += f"  length {length:+d} samples  correlation {corr:.4f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare TTS backends for speed and parity.")
+    parser.add_argument("--voice", default="af_heart")
+    parser.add_argument("--precisions", default="fp32,fp16,int8", help="ONNX variants to compare against torch")
+    parser.add_argument(
+        "--text",
+        default="The quick brown fox jumps over the lazy dog. It was the best of times, it was the worst of times.",
+    )
+    args = parser.parse_args()
+    benchmark(
+        [TorchBackend()] + [OnnxBackend(p.strip()) for p in args.precisions.split(",") if p.strip()],
+        args.text,
+        args.voice,
+    )
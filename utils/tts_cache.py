@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import soundfile as sf
+from utils.manifest import fingerprint
+
+SHARED_CACHE_ENV = "NARRATO_TTS_CACHE"
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def default_cache_dir(book_dir):
+    # One shared store lets identical passages (license boilerplate,
+    # epigraphs, refrains) be synthesized once across a whole library.
+    return os.getenv(SHARED_CACHE_ENV) or os.path.join(book_dir, ".tts_cache")
+
+
+def words_path(audio_path):
+    return f"{os.path.splitext(audio_path)[0]}.words.npy"
+
+
+def save_words(path, words):
+    # (start, end) seconds per spoken word, kept beside the audio they time.
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, np.asarray(words, dtype=np.float32).reshape(-1, 2))
+    os.replace(tmp_path, path)
+    return path
+
+
+class TTSCache:
+    def __init__(self, cache_dir, samplerate=24000, namespace=None):
+        self.cache_dir = cache_dir
+        self.samplerate = samplerate
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.saved_audio_seconds = 0.0
+        self.synth_seconds = 0.0
+        self.synth_audio_seconds = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, text, voice):
+        text = normalize_text(text)
+        if self.namespace:
+            key = fingerprint(self.namespace, voice, text)
+        else:
+            key = fingerprint(voice, text)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def get(self, text, voice):
+        path = self.path_for(text, voice)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        audio = sf.read(path, dtype="float32")[0]
+        self.record_reuse(len(audio) / self.samplerate)
+        return audio
+
+    def get_words(self, text, voice):
+        path = words_path(self.path_for(text, voice))
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def put(self, text, voice, audio, words=None):
+        path = self.path_for(text, voice)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.wav"
+        sf.write(tmp_path, audio, self.samplerate)
+        os.replace(tmp_path, path)
+        if words is not None:
+            save_words(words_path(path), words)
+        return path
+
+    def record_reuse(self, audio_seconds):
+        self.saved_audio_seconds += audio_seconds
+
+    def record_synthesis(self, audio_seconds, elapsed):
+        self.synth_audio_seconds += audio_seconds
+        self.synth_seconds += elapsed
+
+    @property
+    def saved_synthesis_seconds(self):
+        # Reused audio priced at the real-time factor measured on this run's misses.
+        if not self.synth_audio_seconds:
+            return 0.0
+        return self.saved_audio_seconds * self.synth_seconds / self.synth_audio_seconds
+
+    def report(self):
+        return (
+            f"♻️ Reused {self.hits} cached chunks ({self.saved_audio_seconds:.1f}s of audio), "
+            f"synthesized {self.misses}; ~{self.saved_synthesis_seconds:.1f}s of synthesis saved."
+        )
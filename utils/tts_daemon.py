@@ -0,0 +1,145 @@
+import os
+import json
+import socket
+import argparse
+import threading
+import socketserver
+import numpy as np
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 50617
+DAEMON_ENV = "NARRATO_TTS_DAEMON"
+
+_client = None
+_client_checked = False
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port or DEFAULT_PORT)
+
+
+def _recv_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ConnectionError("TTS daemon closed the connection mid-response")
+    return data
+
+
+class DaemonClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=None):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile("rwb")
+        self._lock = threading.Lock()
+        # Tag of the daemon's backend, e.g. "onnx-int8": its audio is cached
+        # under this namespace, not the local backend's.
+        self.cache_tag = self.ping().get("cache_tag")
+
+    def _request(self, payload):
+        with self._lock:
+            self._stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+            self._stream.flush()
+            header = json.loads(self._stream.readline() or b"{}")
+            if not header.get("ok"):
+                raise RuntimeError(f"TTS daemon error: {header.get('error', 'no response')}")
+            body = _recv_exact(self._stream, header.get("bytes", 0))
+        return header, body
+
+    def synthesize(self, text, voice):
+        header, body = self._request({"op": "synthesize", "text": text, "voice": voice})
+        if header.get("cache_tag") != self.cache_tag:
+            raise RuntimeError("TTS daemon changed backend since connecting")
+        return np.frombuffer(body, dtype="<f4").copy()
+
+    def ping(self):
+        header, _ = self._request({"op": "ping"})
+        return header
+
+    def close(self):
+        self._stream.close()
+        self._sock.close()
+
+
+def get_client():
+    global _client, _client_checked
+    if _client_checked:
+        return _client
+    _client_checked = True
+
+    address = os.getenv(DAEMON_ENV)
+    if not address:
+        return None
+    try:
+        _client = DaemonClient(*parse_address(address))
+    except OSError as e:
+        print(f"⚠️ TTS daemon unavailable at {address} ({e}), using local pipeline.")
+        _client = None
+    return _client
+
+
+class _SynthesisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("op") == "ping":
+                    header = {"ok": True, "voices": self.server.voices, "cache_tag": self.server.backend.cache_tag}
+                    body = b""
+                else:
+                    audio = self.server.synthesize(request["text"], request["voice"])
+                    body = audio.astype("<f4").tobytes()
+                    header = {
+                        "ok": True,
+                        "samples": len(audio),
+                        "bytes": len(body),
+                        "cache_tag": self.server.backend.cache_tag,
+                    }
+            except Exception as e:
+                header, body = {"ok": False, "error": str(e)}, b""
+            self.wfile.write(json.dumps(header).encode("utf-8") + b"\n" + body)
+            self.wfile.flush()
+
+
+class SynthesisServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, voices, backend=None):
+        from utils.tts_backends import get_backend
+
+        self.backend = get_backend(backend)
+        self._lock = threading.Lock()
+        self.voices = list(voices)
+        for voice in self.voices:
+            self.backend.load_voice(voice)
+        super().__init__(address, _SynthesisHandler)
+
+    def synthesize(self, text, voice):
+        with self._lock:
+            return self.backend.synthesize(text, voice)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, voices=("af_heart",), backend=None):
+    with SynthesisServer((host, port), voices, backend) as server:
+        print(
+            f"🎙️ TTS daemon listening on {host}:{port} "
+            f"({server.backend.name} backend, voices: {', '.join(voices)})"
+        )
+        print(f"Set {DAEMON_ENV}={host}:{port} to route synthesis through it.")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the Kokoro model resident for fast TTS jobs.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--voices", default="af_heart", help="Comma-separated voices to preload")
+    parser.add_argument("--backend", choices=["torch", "onnx"], help="Defaults to NARRATO_TTS_BACKEND or torch")
+    args = parser.parse_args()
+    serve(
+        args.host,
+        args.port,
+        [v.strip() for v in args.voices.split(",") if v.strip()],
+        args.backend,
+    )
@@ -1,390 +1,860 @@
-import os
-import re
-import torch
-from PIL import Image, ImageFont, ImageDraw, Image
-from moviepy import (
-    CompositeVideoClip,
-    ImageClip,
-    VideoFileClip,
-    ImageClip,
-    concatenate_videoclips,
-    AudioFileClip,
-    TextClip,
-    ColorClip,
-    ImageSequenceClip,
-)
-from pydub import AudioSegment
-from utils.ai_workflows import generate_images_from_chapter
-
-
-def get_audio_duration(audio_path: str) -> float:
-    audio = AudioSegment.from_file(audio_path)
-    return audio.duration_seconds
-
-
-def create_spinning_disc_video(
-    disc_path: str,
-    record_size: int = 300,
-    duration: int = 5,
-    fps: int = 30,
-):
-    disc = (
-        ImageClip(disc_path).resized((record_size, record_size)).with_duration(duration)
-    )
-    return disc.rotated(lambda t: 360 * t / 2).with_fps(fps)
-    # final = CompositeVideoClip(
-    #     [spinning], size=(record_size, record_size)
-    # ).with_duration(duration)
-    # final.write_videofile(
-    #     output_path, codec="libx264", fps=fps, preset="ultrafast", audio=False
-    # )
-
-
-def generate_static_text_image(
-    book_title: str,
-    author: str,
-    chapter_title: str,
-    font_path: str,
-    text_color: str,
-    max_width: int,
-    max_height: int,
-) -> str:
-    dummy = Image.new("RGBA", (10, 10))
-    draw = ImageDraw.Draw(dummy)
-
-    def wrap_text(line: str, font: ImageFont.FreeTypeFont):
-        words = line.split()
-        lines = []
-        current = ""
-        for w in words:
-            trial = (current + " " + w).strip()
-            if draw.textlength(trial, font=font) <= max_width:
-                current = trial
-            else:
-                if current:
-                    lines.append(current)
-                current = w
-        if current:
-            lines.append(current)
-        return lines
-
-    low, high = 10, 120
-    best = None
-    while low <= high:
-        mid = (low + high) // 2
-        t_font = ImageFont.truetype(font_path, mid)
-        a_font = ImageFont.truetype(font_path, int(mid * 0.8))
-        c_font = ImageFont.truetype(font_path, int(mid * 0.8))
-
-        wrapped_info = []
-        total_heights = []
-        for text, font in [
-            (book_title, t_font),
-            (author, a_font),
-            (chapter_title, c_font),
-        ]:
-            lines = wrap_text(text, font)
-            wrapped_info.append((lines, font))
-            for ln in lines:
-                bbox = font.getbbox(ln)
-                total_heights.append(bbox[3] - bbox[1])
-
-        total_h = sum(total_heights) + 10 * (len(total_heights) - 1)
-        if total_h <= max_height:
-            best = (t_font, a_font, c_font, wrapped_info, total_h)
-            low = mid + 1
-        else:
-            high = mid - 1
-
-    if best is None:
-        raise RuntimeError("Text is too tall to fit even at the smallest font size.")
-
-    t_font, a_font, c_font, wrapped_info, total_h = best
-    img = Image.new("RGBA", (max_width, max_height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
-
-    y = (max_height - total_h) // 2
-    for lines, font in wrapped_info:
-        for ln in lines:
-            w = draw.textlength(ln, font=font)
-            draw.text(((max_width - w) // 2, y), ln, font=font, fill=text_color)
-            bbox = font.getbbox(ln)
-            line_h = bbox[3] - bbox[1]
-            y += line_h + 10
-
-    out_path = f"temp_text_{book_title[:4]}_{chapter_title[:4]}.png"
-    img.save(out_path)
-    return out_path
-
-
-def create_overlayed_video(
-    background_video,
-    output_path: str,
-    book_title: str,
-    book_author: str,
-    chapter_title: str,
-    center_image_path: str = None,
-    font_path: str = "Rye.ttf",
-    disc_image_path: str = "disc.png",
-    video_width: int = 1920,
-    final_height: int = 1080,
-    overlay_height: int = 400,
-    record_size: int = 300,
-    center_img_width: int = 115,
-    center_img_height: int = 200,
-    text_color: str = "white",
-    fps: int = 24,
-):
-    base_video = background_video
-    duration = base_video.duration
-
-    cx = 50 + (record_size - center_img_width) // 2
-    cy = (overlay_height - record_size) // 2 + (record_size - center_img_height) // 2
-
-    spinning_disc = create_spinning_disc_video(
-        disc_path=disc_image_path, duration=duration, fps=fps, record_size=record_size
-    ).with_position((50, (overlay_height - record_size) // 2))
-
-    center_on_disc = (
-        ImageClip(center_image_path)
-        .resized((center_img_width, center_img_height))
-        .with_duration(duration)
-        .with_position((cx, cy))
-    )
-
-    # record_clip = CompositeVideoClip(
-    #     [spinning_disc, center_on_disc], size=(video_width, overlay_height)
-    # ).with_duration(duration)
-
-    text_area_width = video_width - record_size - 100
-    # text_img = generate_text_image(
-    #     [book_title, book_author, chapter_title],
-    #     text_area_width,
-    #     overlay_height,
-    #     font_path,
-    #     text_color,
-    # )
-    text_png = generate_static_text_image(
-        book_title,
-        book_author,
-        chapter_title,
-        font_path,
-        text_color,
-        text_area_width,
-        overlay_height,
-    )
-
-    text_clip = (
-        ImageClip(text_png, is_mask=False)
-        .with_duration(duration)
-        .with_fps(fps)
-        .with_position((record_size + 100, 0))
-    )
-
-    # overlay_clip = CompositeVideoClip(
-    #     [record_clip, text_clip], size=(video_width, overlay_height)
-    # ).with_position(("center", 0))
-
-    final_video = CompositeVideoClip(
-        [base_video, spinning_disc, center_on_disc, text_clip],
-        size=(video_width, final_height),
-    ).with_duration(duration)
-
-    final_video.write_videofile(
-        output_path,
-        threads=6,
-        fps=fps,
-        audio_codec="aac",
-        ffmpeg_params=[
-            "-c:v",
-            "h264_nvenc" if torch.cuda.is_available() else "libx264",
-        ],
-    )
-
-
-def merge_video_files(video_paths, output_path):
-    clips = []
-    for video_path in video_paths:
-        if os.path.exists(video_path):
-            clips.append(VideoFileClip(video_path))
-        else:
-            print(f"⚠️ Skipping missing file: {video_path}")
-
-    if not clips:
-        raise ValueError("No valid video files provided for merging.")
-
-    final_clip = concatenate_videoclips(clips, method="compose")
-    final_clip.write_videofile(
-        output_path,
-        codec="h264_nvenc" if torch.cuda.is_available() else "libx264",
-        audio_codec="aac",
-        logger=None,
-    )
-
-
-def generate_video(
-    chapter_text: str,
-    audio_path: str,
-    book_title: str,
-    book_author: str,
-    chapter_title: str,
-    book_image: str,
-    output_dir: str,
-    num_images: int = 1,
-) -> str:
-    duration = get_audio_duration(audio_path)
-
-    if not chapter_text.strip() or chapter_text.strip() == "":
-        print("No chapter text detected. Generating default video...")
-        return generate_intro_video(
-            audio_path=audio_path,
-            book_image=book_image,
-            book_title=book_title,
-            book_author=book_author,
-        )
-
-    print("Starting image generation from chapter...")
-    image_paths = generate_images_from_chapter(chapter_text, num_images, output_dir)
-
-    if not image_paths:
-        raise RuntimeError("No images generated to create video.")
-
-    video_path = os.path.join(output_dir, f"{chapter_title}.mp4")
-    print("Creating video from generated images...")
-
-    try:
-        image_duration = duration / len(image_paths)
-        final_video = ImageSequenceClip(
-            image_paths, durations=[image_duration] * len(image_paths)
-        )
-        audio = AudioFileClip(audio_path).subclipped(0, duration)
-        final_video = final_video.with_audio(audio)
-        result = create_overlayed_video(
-            background_video=final_video,
-            output_path=video_path,
-            center_image_path=book_image,
-            book_author=book_author,
-            chapter_title=chapter_title,
-            book_title=book_title,
-        )
-    finally:
-        for img_path in image_paths:
-            try:
-                os.remove(img_path)
-            except Exception as e:
-                print(f"Error deleting {img_path}: {e}")
-
-    return result
-
-def format_chapter_title(title):
-    title = re.sub(r'^\d+_', '', title)
-    title = title.replace('_', ' ')
-    title = re.sub(r'\b0+(\d+)\b', r'\1', title)
-    return title
-
-def process_chapters_from_directory(
-    input_dir: str,
-    audio_dir: str,
-    cover_path: str,
-    book_title: str,
-    book_author: str,
-    num_images: int,
-):
-    txt_files = sorted([f for f in os.listdir(input_dir) if f.endswith(".txt")])
-
-    for txt_file in txt_files:
-        chapter_file_path = os.path.join(input_dir, txt_file)
-
-        with open(chapter_file_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-
-        if "\n\n......\n\n" not in raw_text:
-            print(f"Skipping {txt_file}: separator not found.")
-            continue
-
-        _, chapter_content = raw_text.split("\n\n......\n\n", 1)
-
-        audio_path = os.path.join(audio_dir, f"{os.path.splitext(txt_file)[0]}.wav")
-        chapter_title = format_chapter_title(os.path.splitext(txt_file)[0])
-        output_path = os.path.join(audio_dir, f"{chapter_title}.mp4")
-
-        print(f"Processing chapter: {chapter_title}")
-
-        generate_video(
-            chapter_text=chapter_content,
-            audio_path=audio_path,
-            book_title=book_title,
-            book_author=book_author,
-            chapter_title=chapter_title,
-            book_image=cover_path,
-            output_dir=os.path.dirname(output_path),
-            num_images=num_images,
-        )
-
-
-def generate_intro_video(book_title, book_author, book_image, audio_path):
-    video_width, video_height = 1920, 1080
-    audio_clip = AudioFileClip(audio_path)
-    duration = audio_clip.duration
-
-    with Image.open(book_image) as img:
-        img = img.convert("RGB")
-        img_ratio = img.width / img.height
-        new_width = int(video_height * img_ratio)
-        resized_img = img.resize((new_width, video_height), Image.Resampling.LANCZOS)
-        temp_image_path = "temp_resized_cover.jpg"
-        resized_img.save(temp_image_path)
-
-    image_clip = (
-        ImageClip(temp_image_path).with_duration(duration).with_position((0, 0))
-    )
-
-    text_x = image_clip.w + 40
-
-    title_txt = TextClip(
-        text=book_title,
-        font_size=70,
-        color="white",
-        font="Rye.ttf",
-        size=(video_width - text_x - 80, None),
-        method="caption",
-    )
-    title_txt = title_txt.with_position(
-        (text_x, video_height // 2 - 100)
-    ).with_duration(duration)
-
-    author_txt = TextClip(
-        text=f"by {book_author}",
-        font_size=50,
-        color="white",
-        font="Montserrat.ttf",
-        method="caption",
-        size=(video_width - text_x - 80, None),
-    )
-    author_txt = author_txt.with_position(
-        (text_x, video_height // 2 + 20)
-    ).with_duration(duration)
-
-    background = ColorClip(
-        size=(video_width, video_height), color=(51, 51, 153), duration=duration
-    )
-
-    video = CompositeVideoClip(
-        [background, image_clip, title_txt, author_txt], size=(1920, 1080)
-    )
-    video = video.with_duration(duration)
-    video = video.with_audio(audio_clip)
-
-    output_path = audio_path.replace(".wav", ".mp4")
-
-    video.write_videofile(
-        output_path,
-        fps=24,
-        codec="h264_nvenc" if torch.cuda.is_available() else "libx264",
-        logger=None,
-    )
-
-    if os.path.exists(temp_image_path):
-        os.remove(temp_image_path)
-
+import os
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import soundfile as sf
+from PIL import Image, ImageFont, ImageDraw, Image
+from moviepy import (
+    CompositeVideoClip,
+    ImageClip,
+    VideoFileClip,
+    ImageClip,
+    concatenate_videoclips,
+    AudioFileClip,
+    TextClip,
+    ImageSequenceClip,
+)
+from moviepy.config import FFMPEG_BINARY
+from utils.ai_workflows import generate_images_from_chapter, generate_images_from_scenes
+from utils.chapter_index import format_chapter_title
+from utils.manifest import fingerprint, load_manifest, save_manifest
+from utils.image_assets import FAST_PNG, load_image
+from utils.youtube_export import make_thumbnail, thumbnail_path
+from utils.progress import frame_logger, get_tracker
+from utils.runtime import cpu_count, encoder_preset, video_encoder
+from utils.scene_planner import allocate_images, plan_chapter_scenes
+from utils.timing_store import timings_path
+from utils.captions import caption_filter, chapter_captions
+
+
+FULL_PROFILE = {
+    "width": 1920,
+    "height": 1080,
+    "fps": 24,
+    "codec": None,
+    "preset": "medium",
+    "max_seconds": None,
+    "placeholder_images": False,
+}
+
+PREVIEW_PROFILE = {
+    "width": 480,
+    "height": 270,
+    "fps": 6,
+    "codec": "libx264",
+    "preset": "ultrafast",
+    "max_seconds": 20,
+    "placeholder_images": True,
+}
+
+# Rough render budget used to size segments under a memory ceiling: a fixed
+# cost for the interpreter, MoviePy and overlay assets, plus growth per minute
+# of window at 1080p (frame caches and ffmpeg reader buffers).
+RENDER_BASE_MB = 700
+RENDER_MB_PER_MINUTE = 60
+MIN_SEGMENT_SECONDS = 60
+MAX_SEGMENT_SECONDS = 1800
+# Portrait, like most book covers.
+COVER_SIZE = (600, 900)
+
+
+def profile_codec(profile: dict) -> str:
+    return profile.get("codec") or video_encoder()
+
+
+def encoder_options(profile: dict) -> dict:
+    # Codec, preset and threads all come from the probed runtime, so each
+    # write uses the fastest encoder that actually works on this machine.
+    codec = profile_codec(profile)
+    return {
+        "codec": codec,
+        "preset": encoder_preset(codec, profile["preset"]),
+        "threads": cpu_count(),
+    }
+
+
+def generate_placeholder_images(
+    chapter_title: str, num_images: int, output_dir: str, size: tuple
+) -> list[str]:
+    os.makedirs(output_dir, exist_ok=True)
+    font = ImageFont.truetype("Montserrat.ttf", max(12, size[1] // 10))
+    paths = []
+    for idx in range(1, num_images + 1):
+        hue = (hash(chapter_title) + idx * 67) % 255
+        img = Image.new("RGB", size, (hue, 80, 255 - hue))
+        draw = ImageDraw.Draw(img)
+        label = f"{chapter_title} - scene {idx}"
+        w = draw.textlength(label, font=font)
+        draw.text(((size[0] - w) // 2, size[1] // 2), label, font=font, fill="white")
+        path = os.path.join(output_dir, f"image_{idx}.png")
+        img.save(path, **FAST_PNG)
+        paths.append(path)
+    return paths
+
+
+def placeholder_cover(book_title: str, output_path: str, size: tuple = COVER_SIZE) -> str:
+    # Stands in for a missing cover: the title on a plain card. Written under
+    # a temporary name first, since several render workers may ask for it.
+    if os.path.exists(output_path):
+        return output_path
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    img = Image.new("RGB", size, (30, 30, 90))
+    draw = ImageDraw.Draw(img)
+    font_size = size[0] // 8
+    font = ImageFont.truetype("Rye.ttf", font_size)
+    while draw.textlength(book_title, font=font) > size[0] * 0.9 and font_size > 12:
+        font_size -= 4
+        font = ImageFont.truetype("Rye.ttf", font_size)
+    w = draw.textlength(book_title, font=font)
+    draw.text(((size[0] - w) // 2, (size[1] - font_size) // 2), book_title, font=font, fill="white")
+    tmp_path = f"{output_path}.{os.getpid()}.tmp.png"
+    img.save(tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def get_audio_duration(audio_path: str) -> float:
+    info = sf.info(audio_path)
+    return info.frames / info.samplerate
+
+
+def choose_segment_seconds(memory_limit_mb: int, profile: dict) -> float:
+    pixels = profile["width"] * profile["height"] / (1920 * 1080)
+    budget_mb = memory_limit_mb - RENDER_BASE_MB
+    if budget_mb <= 0:
+        return MIN_SEGMENT_SECONDS
+    seconds = 60 * budget_mb / (RENDER_MB_PER_MINUTE * max(pixels, 0.05))
+    return max(MIN_SEGMENT_SECONDS, min(MAX_SEGMENT_SECONDS, seconds))
+
+
+def drop_missing_images(image_paths: list, image_durations: list[float]):
+    # A failed image hands its screen time to the previous scene (or the next
+    # one at the start of the chapter).
+    paths, durations = [], []
+    carry = 0.0
+    for path, duration in zip(image_paths, image_durations):
+        if path is None:
+            if durations:
+                durations[-1] += duration
+            else:
+                carry += duration
+            continue
+        paths.append(path)
+        durations.append(duration + carry)
+        carry = 0.0
+    return paths, durations
+
+
+def close_clips(*clips):
+    for clip in clips:
+        if clip is not None:
+            try:
+                clip.close()
+            except Exception as e:
+                print(f"Error closing clip: {e}")
+
+
+def create_spinning_disc_video(
+    disc_path: str,
+    record_size: int = 300,
+    duration: int = 5,
+    fps: int = 30,
+    time_offset: float = 0.0,
+):
+    disc = ImageClip(
+        load_image(disc_path, (record_size, record_size), mode="RGBA")
+    ).with_duration(duration)
+    return disc.rotated(lambda t: 360 * (t + time_offset) / 2).with_fps(fps)
+    # final = CompositeVideoClip(
+    #     [spinning], size=(record_size, record_size)
+    # ).with_duration(duration)
+    # final.write_videofile(
+    #     output_path, codec="libx264", fps=fps, preset="ultrafast", audio=False
+    # )
+
+
+def generate_static_text_image(
+    book_title: str,
+    author: str,
+    chapter_title: str,
+    font_path: str,
+    text_color: str,
+    max_width: int,
+    max_height: int,
+) -> np.ndarray:
+    dummy = Image.new("RGBA", (10, 10))
+    draw = ImageDraw.Draw(dummy)
+
+    def wrap_text(line: str, font: ImageFont.FreeTypeFont):
+        words = line.split()
+        lines = []
+        current = ""
+        for w in words:
+            trial = (current + " " + w).strip()
+            if draw.textlength(trial, font=font) <= max_width:
+                current = trial
+            else:
+                if current:
+                    lines.append(current)
+                current = w
+        if current:
+            lines.append(current)
+        return lines
+
+    low, high = 10, 120
+    best = None
+    while low <= high:
+        mid = (low + high) // 2
+        t_font = ImageFont.truetype(font_path, mid)
+        a_font = ImageFont.truetype(font_path, int(mid * 0.8))
+        c_font = ImageFont.truetype(font_path, int(mid * 0.8))
+
+        wrapped_info = []
+        total_heights = []
+        for text, font in [
+            (book_title, t_font),
+            (author, a_font),
+            (chapter_title, c_font),
+        ]:
+            lines = wrap_text(text, font)
+            wrapped_info.append((lines, font))
+            for ln in lines:
+                bbox = font.getbbox(ln)
+                total_heights.append(bbox[3] - bbox[1])
+
+        total_h = sum(total_heights) + 10 * (len(total_heights) - 1)
+        if total_h <= max_height:
+            best = (t_font, a_font, c_font, wrapped_info, total_h)
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    if best is None:
+        raise RuntimeError("Text is too tall to fit even at the smallest font size.")
+
+    t_font, a_font, c_font, wrapped_info, total_h = best
+    img = Image.new("RGBA", (max_width, max_height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    y = (max_height - total_h) // 2
+    for lines, font in wrapped_info:
+        for ln in lines:
+            w = draw.textlength(ln, font=font)
+            draw.text(((max_width - w) // 2, y), ln, font=font, fill=text_color)
+            bbox = font.getbbox(ln)
+            line_h = bbox[3] - bbox[1]
+            y += line_h + 10
+
+    return np.asarray(img)
+
+
+def create_overlayed_video(
+    background_video,
+    output_path: str,
+    book_title: str,
+    book_author: str,
+    chapter_title: str,
+    center_image_path: str = None,
+    font_path: str = "Rye.ttf",
+    disc_image_path: str = "disc.png",
+    video_width: int = 1920,
+    final_height: int = 1080,
+    overlay_height: int = 400,
+    record_size: int = 300,
+    center_img_width: int = 115,
+    center_img_height: int = 200,
+    text_color: str = "white",
+    fps: int = 24,
+    profile: dict = None,
+    time_offset: float = 0.0,
+    with_audio: bool = True,
+    captions_path: str = None,
+):
+    profile = profile or FULL_PROFILE
+    base_video = background_video
+    duration = base_video.duration
+
+    # Layout constants are authored for 1080p and scaled to the profile.
+    scale = profile["height"] / final_height
+    video_width, final_height = profile["width"], profile["height"]
+    overlay_height = int(overlay_height * scale)
+    record_size = int(record_size * scale)
+    center_img_width = int(center_img_width * scale)
+    center_img_height = int(center_img_height * scale)
+    margin = int(50 * scale)
+    fps = profile["fps"]
+
+    cx = margin + (record_size - center_img_width) // 2
+    cy = (overlay_height - record_size) // 2 + (record_size - center_img_height) // 2
+
+    spinning_disc = create_spinning_disc_video(
+        disc_path=disc_image_path,
+        duration=duration,
+        fps=fps,
+        record_size=record_size,
+        time_offset=time_offset,
+    ).with_position((margin, (overlay_height - record_size) // 2))
+
+    center_on_disc = (
+        ImageClip(load_image(center_image_path, (center_img_width, center_img_height)))
+        .with_duration(duration)
+        .with_position((cx, cy))
+    )
+
+    # record_clip = CompositeVideoClip(
+    #     [spinning_disc, center_on_disc], size=(video_width, overlay_height)
+    # ).with_duration(duration)
+
+    text_area_width = video_width - record_size - 2 * margin
+    # text_img = generate_text_image(
+    #     [book_title, book_author, chapter_title],
+    #     text_area_width,
+    #     overlay_height,
+    #     font_path,
+    #     text_color,
+    # )
+    text_image = generate_static_text_image(
+        book_title,
+        book_author,
+        chapter_title,
+        font_path,
+        text_color,
+        text_area_width,
+        overlay_height,
+    )
+
+    text_clip = (
+        ImageClip(text_image, is_mask=False)
+        .with_duration(duration)
+        .with_fps(fps)
+        .with_position((record_size + 2 * margin, 0))
+    )
+
+    # overlay_clip = CompositeVideoClip(
+    #     [record_clip, text_clip], size=(video_width, overlay_height)
+    # ).with_position(("center", 0))
+
+    final_video = CompositeVideoClip(
+        [base_video, spinning_disc, center_on_disc, text_clip],
+        size=(video_width, final_height),
+    ).with_duration(duration)
+
+    try:
+        final_video.write_videofile(
+            output_path,
+            fps=fps,
+            audio=with_audio,
+            audio_codec="aac",
+            logger=frame_logger(),
+            ffmpeg_params=["-vf", caption_filter(captions_path, time_offset)] if captions_path else None,
+            **encoder_options(profile),
+        )
+    finally:
+        close_clips(final_video, spinning_disc, center_on_disc, text_clip)
+    return output_path
+
+
+def embed_chapters(video_path: str, metadata_path: str, output_path: str) -> str:
+    # Stream copy: chapter markers and tags are added without re-encoding.
+    subprocess.run(
+        [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-i", video_path,
+            "-f", "ffmetadata", "-i", metadata_path,
+            "-map", "0", "-map_metadata", "1", "-map_chapters", "1",
+            "-c", "copy", "-movflags", "+faststart",
+            output_path,
+        ],
+        check=True,
+    )
+    return output_path
+
+
+def merge_video_files(
+    video_paths, output_path, profile: dict = None, chapters_metadata: str = None
+):
+    profile = profile or FULL_PROFILE
+    clips = []
+    for video_path in video_paths:
+        if os.path.exists(video_path):
+            clips.append(VideoFileClip(video_path))
+        else:
+            print(f"⚠️ Skipping missing file: {video_path}")
+
+    if not clips:
+        raise ValueError("No valid video files provided for merging.")
+
+    final_clip = concatenate_videoclips(clips, method="compose")
+    encoded_path = f"{output_path}.encoding.mp4" if chapters_metadata else output_path
+    try:
+        final_clip.write_videofile(
+            encoded_path,
+            audio_codec="aac",
+            logger=None,
+            **encoder_options(profile),
+        )
+    finally:
+        close_clips(final_clip, *clips)
+
+    if chapters_metadata:
+        try:
+            embed_chapters(encoded_path, chapters_metadata, output_path)
+        finally:
+            os.remove(encoded_path)
+    return output_path
+
+
+def render_video_window(
+    image_paths: list[str],
+    image_durations: list[float],
+    audio_path: str,
+    start: float,
+    end: float,
+    output_path: str,
+    book_title: str,
+    book_author: str,
+    chapter_title: str,
+    book_image: str,
+    profile: dict,
+    with_audio: bool = True,
+    captions_path: str = None,
+) -> str:
+    size = (profile["width"], profile["height"])
+    images = ImageSequenceClip(
+        [load_image(path, size) for path in image_paths], durations=image_durations
+    )
+    audio = AudioFileClip(audio_path) if with_audio else None
+    try:
+        background = images.subclipped(start, end)
+        if audio is not None:
+            background = background.with_audio(audio.subclipped(start, end))
+        return create_overlayed_video(
+            background_video=background,
+            output_path=output_path,
+            center_image_path=book_image,
+            book_author=book_author,
+            chapter_title=chapter_title,
+            book_title=book_title,
+            profile=profile,
+            time_offset=start,
+            with_audio=with_audio,
+            captions_path=captions_path,
+        )
+    finally:
+        close_clips(images, audio)
+
+
+def concat_segments(part_paths: list[str], audio_path: str, duration: float, output_path: str):
+    # Video segments are stream-copied; the chapter audio is encoded once from
+    # the WAV so there are no AAC priming gaps at segment boundaries.
+    list_path = f"{output_path}.segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for part in part_paths:
+            escaped = os.path.abspath(part).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run(
+            [
+                FFMPEG_BINARY, "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-i", audio_path,
+                "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy", "-c:a", "aac",
+                "-t", f"{duration:.3f}",
+                output_path,
+            ],
+            check=True,
+        )
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def render_segmented_video(
+    image_paths: list[str],
+    image_durations: list[float],
+    audio_path: str,
+    duration: float,
+    segment_seconds: float,
+    output_path: str,
+    profile: dict,
+    **overlay,
+) -> str:
+    fps = profile["fps"]
+    # Window boundaries land on whole frames so the joined stream keeps its cadence.
+    segment = max(1, int(segment_seconds * fps)) / fps
+    windows = []
+    start = 0.0
+    while start < duration:
+        windows.append((start, min(start + segment, duration)))
+        start += segment
+
+    part_paths = []
+    try:
+        for idx, (start, end) in enumerate(windows):
+            part_path = f"{output_path}.part{idx:03d}.mp4"
+            print(f"Rendering segment {idx + 1}/{len(windows)} ({start:.0f}s - {end:.0f}s)")
+            render_video_window(
+                image_paths, image_durations, audio_path, start, end, part_path,
+                profile=profile, with_audio=False, **overlay,
+            )
+            part_paths.append(part_path)
+        return concat_segments(part_paths, audio_path, duration, output_path)
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+
+def generate_video(
+    chapter_text: str,
+    audio_path: str,
+    book_title: str,
+    book_author: str,
+    chapter_title: str,
+    book_image: str,
+    output_dir: str,
+    num_images: int = 1,
+    profile: dict = None,
+    segment_seconds: float = None,
+    memory_limit_mb: int = None,
+    scenes: list = None,
+    captions_path: str = None,
+) -> str:
+    profile = profile or FULL_PROFILE
+    duration = get_audio_duration(audio_path)
+    if profile["max_seconds"]:
+        duration = min(duration, profile["max_seconds"])
+
+    video_path = os.path.join(output_dir, f"{chapter_title}.mp4")
+
+    if not chapter_text.strip() or chapter_text.strip() == "":
+        print("No chapter text detected. Generating default video...")
+        return generate_intro_video(
+            audio_path=audio_path,
+            book_image=book_image,
+            book_title=book_title,
+            book_author=book_author,
+            output_path=video_path,
+            profile=profile,
+        )
+
+    if scenes:
+        num_images = len(scenes)
+        image_durations = [scene.end - scene.start for scene in scenes]
+    else:
+        image_durations = [duration / num_images] * num_images
+
+    # Images are named by index, so each chapter gets a directory of its own;
+    # render workers may be generating other chapters of the book alongside.
+    image_dir = tempfile.mkdtemp(prefix=".images_", dir=output_dir)
+    try:
+        if profile["placeholder_images"]:
+            image_paths = generate_placeholder_images(
+                chapter_title, num_images, image_dir, (profile["width"], profile["height"])
+            )
+        elif scenes:
+            print(f"Starting image generation for {len(scenes)} scenes...")
+            image_paths = generate_images_from_scenes(
+                [scene.excerpt for scene in scenes], image_dir
+            )
+        else:
+            print("Starting image generation from chapter...")
+            image_paths = generate_images_from_chapter(chapter_text, num_images, image_dir)
+            image_durations = [duration / max(1, len(image_paths))] * len(image_paths)
+        image_paths, image_durations = drop_missing_images(image_paths, image_durations)
+
+        if not image_paths:
+            raise RuntimeError("No images generated to create video.")
+
+        print("Creating video from generated images...")
+
+        if memory_limit_mb and not segment_seconds:
+            segment_seconds = choose_segment_seconds(memory_limit_mb, profile)
+
+        overlay = dict(
+            book_title=book_title,
+            book_author=book_author,
+            chapter_title=chapter_title,
+            book_image=book_image,
+            captions_path=captions_path,
+        )
+        if segment_seconds and duration > segment_seconds:
+            result = render_segmented_video(
+                image_paths, image_durations, audio_path, duration, segment_seconds,
+                video_path, profile, **overlay,
+            )
+        else:
+            result = render_video_window(
+                image_paths, image_durations, audio_path, 0, duration, video_path,
+                profile=profile, **overlay,
+            )
+        # The image shown longest stands for the chapter.
+        make_thumbnail(
+            image_paths[image_durations.index(max(image_durations))],
+            chapter_title,
+            thumbnail_path(video_path),
+        )
+    finally:
+        shutil.rmtree(image_dir, ignore_errors=True)
+
+    return result
+
+def plan_book_images(
+    txt_files: list[str],
+    audio_dir: str,
+    num_images: int = None,
+    min_images: int = 1,
+    max_images: int = 12,
+    image_budget: int = None,
+) -> dict:
+    # Image counts are planned for the whole book up front so the API budget
+    # is shared out by chapter length; a fixed num_images skips planning.
+    durations = {}
+    for txt_file in txt_files:
+        chapter_name = os.path.splitext(os.path.basename(txt_file))[0]
+        audio_path = os.path.join(audio_dir, f"{chapter_name}.wav")
+        if os.path.exists(audio_path):
+            durations[chapter_name] = get_audio_duration(audio_path)
+    if num_images:
+        return dict.fromkeys(durations, num_images)
+    return allocate_images(durations, min_images, max_images, image_budget)
+
+
+def render_chapter_video(
+    txt_path: str,
+    audio_dir: str,
+    video_dir: str,
+    cover_path: str,
+    book_title: str,
+    book_author: str,
+    num_images: int,
+    plan_scenes: bool = True,
+    profile: dict = None,
+    segment_seconds: float = None,
+    memory_limit_mb: int = None,
+    captions: bool = False,
+) -> str | None:
+    with open(txt_path, "r", encoding="utf-8") as f:
+        raw_text = f.read()
+
+    if "\n\n......\n\n" not in raw_text:
+        print(f"Skipping {os.path.basename(txt_path)}: separator not found.")
+        return None
+
+    _, chapter_content = raw_text.split("\n\n......\n\n", 1)
+
+    chapter_name = os.path.splitext(os.path.basename(txt_path))[0]
+    audio_path = os.path.join(audio_dir, f"{chapter_name}.wav")
+    chapter_title = format_chapter_title(chapter_name)
+
+    print(f"Processing chapter: {chapter_title} ({num_images} images)")
+    scenes = None
+    if plan_scenes and os.path.exists(audio_path):
+        scenes = plan_chapter_scenes(
+            os.path.join(audio_dir, f"{chapter_name}.srt"),
+            chapter_content,
+            get_audio_duration(audio_path),
+            num_images,
+            timings_path(audio_dir, chapter_name),
+        )
+
+    os.makedirs(video_dir, exist_ok=True)
+    profile = profile or FULL_PROFILE
+    captions_path = None
+    if captions and os.path.exists(timings_path(audio_dir, chapter_name)):
+        captions_path = chapter_captions(
+            timings_path(audio_dir, chapter_name),
+            os.path.join(video_dir, f"{chapter_title}.ass"),
+            profile["width"],
+            profile["height"],
+        )
+    try:
+        return generate_video(
+            chapter_text=chapter_content,
+            audio_path=audio_path,
+            book_title=book_title,
+            book_author=book_author,
+            chapter_title=chapter_title,
+            book_image=cover_path,
+            output_dir=video_dir,
+            num_images=num_images,
+            profile=profile,
+            segment_seconds=segment_seconds,
+            memory_limit_mb=memory_limit_mb,
+            scenes=scenes,
+            captions_path=captions_path,
+        )
+    finally:
+        # Read by every segment of the encode, so only removed once the
+        # whole chapter is done.
+        if captions_path and os.path.exists(captions_path):
+            os.remove(captions_path)
+
+
+def process_chapters_from_directory(
+    input_dir: str,
+    audio_dir: str,
+    cover_path: str,
+    book_title: str,
+    book_author: str,
+    num_images: int = None,
+    profile: dict = None,
+    video_dir: str = None,
+    segment_seconds: float = None,
+    memory_limit_mb: int = None,
+    min_images: int = 1,
+    max_images: int = 12,
+    image_budget: int = None,
+    captions: bool = False,
+) -> list[str]:
+    profile = profile or FULL_PROFILE
+    video_dir = video_dir or audio_dir
+    os.makedirs(video_dir, exist_ok=True)
+    video_paths = []
+
+    txt_files = sorted([f for f in os.listdir(input_dir) if f.endswith(".txt")])
+    render_manifest = load_manifest(os.path.join(audio_dir, "render_manifest.json"))
+    video_manifest_path = os.path.join(audio_dir, "video_manifest.json")
+    video_manifest = load_manifest(video_manifest_path)
+    image_counts = plan_book_images(
+        txt_files, audio_dir, num_images, min_images, max_images, image_budget
+    )
+
+    chapters = []
+    for txt_file in txt_files:
+        chapter_name = os.path.splitext(txt_file)[0]
+        chapter_title = format_chapter_title(chapter_name)
+        output_path = os.path.join(video_dir, f"{chapter_title}.mp4")
+
+        chapter_images = image_counts.get(chapter_name, min_images)
+        video_key = fingerprint(
+            render_manifest.get(chapter_name), book_title, book_author, chapter_images, profile,
+            *filter(None, ["captions" if captions else None]),
+        )
+        unchanged = (
+            profile == FULL_PROFILE
+            and chapter_name in render_manifest
+            and video_manifest.get(chapter_name) == video_key
+            and os.path.exists(output_path)
+        )
+        chapters.append(
+            (txt_file, chapter_name, chapter_title, output_path, chapter_images, video_key, unchanged)
+        )
+
+    # Totals for the chapters that will actually render, so the ETA is for
+    # the remaining work.
+    pending = [chapter for chapter in chapters if not chapter[-1]]
+    frames = 0
+    for txt_file, chapter_name, *_ in pending:
+        audio_path = os.path.join(audio_dir, f"{chapter_name}.wav")
+        if os.path.exists(audio_path):
+            duration = get_audio_duration(audio_path)
+            frames += int(min(duration, profile["max_seconds"] or duration) * profile["fps"])
+    tracker = get_tracker()
+    if not profile["placeholder_images"]:
+        tracker.start_stage("images", sum(chapter[4] for chapter in pending), "images")
+    tracker.start_stage("frames", frames, "frames")
+
+    for (
+        txt_file, chapter_name, chapter_title, output_path, chapter_images, video_key, unchanged
+    ) in chapters:
+        if unchanged:
+            print(f"Chapter unchanged, reusing video: {chapter_title}")
+            video_paths.append(output_path)
+            continue
+
+        video_path = render_chapter_video(
+            os.path.join(input_dir, txt_file),
+            audio_dir,
+            video_dir,
+            cover_path,
+            book_title,
+            book_author,
+            chapter_images,
+            plan_scenes=not num_images,
+            profile=profile,
+            segment_seconds=segment_seconds,
+            memory_limit_mb=memory_limit_mb,
+            captions=captions,
+        )
+        if video_path is None:
+            continue
+        video_paths.append(video_path)
+        if profile == FULL_PROFILE:
+            video_manifest[chapter_name] = video_key
+            save_manifest(video_manifest_path, video_manifest)
+
+    tracker.finish_stage("frames")
+    return video_paths
+
+
+def generate_intro_video(
+    book_title, book_author, book_image, audio_path, output_path=None, profile=None
+):
+    profile = profile or FULL_PROFILE
+    video_width, video_height = profile["width"], profile["height"]
+    scale = video_height / 1080
+    audio_clip = AudioFileClip(audio_path)
+    duration = audio_clip.duration
+    if profile["max_seconds"]:
+        duration = min(duration, profile["max_seconds"])
+        audio_clip = audio_clip.subclipped(0, duration)
+
+    image_clip = (
+        ImageClip(load_image(book_image, height=video_height))
+        .with_duration(duration)
+        .with_position((0, 0))
+    )
+
+    text_x = image_clip.w + int(40 * scale)
+
+    title_txt = TextClip(
+        text=book_title,
+        font_size=int(70 * scale),
+        color="white",
+        font="Rye.ttf",
+        size=(video_width - text_x - int(80 * scale), None),
+        method="caption",
+    )
+    title_txt = title_txt.with_position(
+        (text_x, video_height // 2 - int(100 * scale))
+    ).with_duration(duration)
+
+    author_txt = TextClip(
+        text=f"by {book_author}",
+        font_size=int(50 * scale),
+        color="white",
+        font="Montserrat.ttf",
+        method="caption",
+        size=(video_width - text_x - int(80 * scale), None),
+    )
+    author_txt = author_txt.with_position(
+        (text_x, video_height // 2 + int(20 * scale))
+    ).with_duration(duration)
+
+    # A solid bg_color avoids holding a full-frame ColorClip layer.
+    video = CompositeVideoClip(
+        [image_clip, title_txt, author_txt],
+        size=(video_width, video_height),
+        bg_color=(51, 51, 153),
+    )
+    video = video.with_duration(duration)
+    video = video.with_audio(audio_clip)
+
+    output_path = output_path or audio_path.replace(".wav", ".mp4")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    try:
+        video.write_videofile(
+            output_path,
+            fps=profile["fps"],
+            logger=None,
+            **encoder_options(profile),
+        )
+    finally:
+        close_clips(video, image_clip, title_txt, author_txt, audio_clip)
+
+    make_thumbnail(book_image, book_title, thumbnail_path(output_path))
     return output_path
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+from PIL import Image, ImageDraw, ImageFont
+from utils.image_assets import load_image
+
+THUMBNAIL_SIZE = (1280, 720)
+THUMBNAIL_FONT = "Montserrat.ttf"
+# YouTube only turns a description into chapters when the list starts at
+# 0:00, has at least three entries and every chapter lasts ten seconds.
+MIN_CHAPTERS = 3
+MIN_CHAPTER_SECONDS = 10
+
+
+def format_youtube_timestamp(seconds):
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+def chapter_marks(entries):
+    # Offsets are summed from the entries given, so a chapter left out of the
+    # merged video does not shift the ones after it.
+    marks, offset = [], 0.0
+    for entry in entries:
+        marks.append((entry.title, offset, offset + entry.duration))
+        offset += entry.duration
+    return marks
+
+
+def write_timestamps(entries, output_path):
+    marks = chapter_marks(entries)
+    short = [title for title, start, end in marks if end - start < MIN_CHAPTER_SECONDS]
+    if len(marks) < MIN_CHAPTERS or short:
+        print(
+            f"⚠️ YouTube may ignore these chapters: needs {MIN_CHAPTERS}+ chapters "
+            f"of {MIN_CHAPTER_SECONDS}s or more ({len(short)} too short)."
+        )
+    with open(output_path, "w", encoding="utf-8") as f:
+        for title, start, _ in marks:
+            f.write(f"{format_youtube_timestamp(start)} {title}\n")
+    return output_path
+
+
+def escape_ffmetadata(value):
+    for char in ("\\", "=", ";", "#", "\n"):
+        value = value.replace(char, f"\\{char}")
+    return value
+
+
+def write_ffmetadata(entries, output_path, title=None, artist=None):
+    lines = [";FFMETADATA1"]
+    if title:
+        lines.append(f"title={escape_ffmetadata(title)}")
+    if artist:
+        lines.append(f"artist={escape_ffmetadata(artist)}")
+    for chapter_title, start, end in chapter_marks(entries):
+        lines += [
+            "",
+            "[CHAPTER]",
+            "TIMEBASE=1/1000",
+            f"START={round(start * 1000)}",
+            f"END={round(end * 1000)}",
+            f"title={escape_ffmetadata(chapter_title)}",
+        ]
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return output_path
+
+
+def thumbnail_path(video_path):
+    return f"{os.path.splitext(video_path)[0]}.jpg"
+
+
+def make_thumbnail(image_path, title, output_path, size=THUMBNAIL_SIZE, font_path=THUMBNAIL_FONT):
+    # Made from the chapter's own image while it is still in the decode cache,
+    # so the rendered video is never read back.
+    frame = Image.fromarray(load_image(image_path, size)).convert("RGBA")
+    width, height = size
+    band = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(band)
+    draw.rectangle((0, int(height * 0.7), width, height), fill=(0, 0, 0, 170))
+
+    font_size = int(height * 0.12)
+    font = ImageFont.truetype(font_path, font_size)
+    while draw.textlength(title, font=font) > width * 0.9 and font_size > 12:
+        font_size -= 4
+        font = ImageFont.truetype(font_path, font_size)
+    text_width = draw.textlength(title, font=font)
+    draw.text(
+        ((width - text_width) // 2, int(height * 0.85) - font_size // 2),
+        title,
+        font=font,
+        fill="white",
+    )
+    Image.alpha_composite(frame, band).convert("RGB").save(output_path, quality=90)
+    return output_path
+
+
+def export_youtube_chapters(entries, book_dir, book_title=None, book_author=None):
+    timestamps_path = write_timestamps(entries, os.path.join(book_dir, "youtube_chapters.txt"))
+    metadata_path = write_ffmetadata(
+        entries, os.path.join(book_dir, "chapters.ffmeta"), book_title, book_author
+    )
+    print(f"📺 YouTube chapter list saved to: {timestamps_path}")
+    return timestamps_path, metadata_path